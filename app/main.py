@@ -1,17 +1,38 @@
+import asyncio
 import logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.utils.settings import get_settings
-from app.utils.db import get_session_factory, create_all, get_engine
+from app.utils.db import dispose_engine, get_session_factory, get_async_session_factory, ping_database, run_with_connection
+from app.utils.schema import SCHEMA_VERSION, ensure_schema
 from app.services.notification_service import NotificationService
+from app.services.async_notification_service import AsyncNotificationService, ThreadedNotificationService
+from app.services.notification_hub import NotificationHub
+from app.services.event_bus import UnixSocketEventBus, BrokerEventBus, load_broker_adapter
+from app.services.unread_counter import UnreadCounterCache
+from app.services.recent_notifications import RecentNotificationsCache
+from app.services.user_versions import UserVersions
+from app.services.idempotency_keys import IdempotencyKeyCache
+from app.services.templates import TemplateRegistry
+from app.services.delivery_acks import DeliveryAckBuffer
+from app.services.coalescer import NotificationCoalescer
+from app.services.ingestion_queue import IngestionQueue, IngestionFlusher
+from app.services.retention import RetentionPolicy, RetentionPurger, SubscriptionDeleteJobs
+from app.services.readiness import DatabaseReadiness
+from app.services.admission import AdmissionControl, ConcurrencyLimiter
 from app.resources.notifications import router as notifications_router
-from app.middleware.request_logging import RequestLoggingMiddleware
+from app.resources.metrics import router as metrics_router
+from app.resources.health import router as health_router
+from app.middleware.request_metrics import RequestMetricsMiddleware
+from app.utils.metrics_registry import get_metrics_registry
+from app.utils.access_log import create_access_logger
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("whatsub-notification")
 
 settings = get_settings()
+access_logger, access_log_listener = create_access_logger()
 
 app = FastAPI(title="Subscription Notification Service", version="0.0.1")
 
@@ -22,26 +43,280 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
-app.add_middleware(RequestLoggingMiddleware)
+app.add_middleware(RequestMetricsMiddleware, registry=get_metrics_registry(), access_logger=access_logger)
 
-# Database & Service Init
+def create_dispatcher(service):
+    # Imported here so workers without the dispatcher don't load the provider SDKs at startup
+    from app.services.dispatcher import DeliveryDispatcher
+    from app.services.providers import MailjetProvider, WebhookSmsProvider
+    from app.services.orm_models import NotificationType as ORMNotificationType
+
+    providers = {}
+    if settings.mailjet_api_key and settings.mailjet_api_secret:
+        providers[ORMNotificationType.email] = MailjetProvider(
+            settings.mailjet_api_key,
+            settings.mailjet_api_secret,
+            settings.mailjet_sender_email,
+            sender_name=settings.mailjet_sender_name,
+            api_url=settings.mailjet_api_url
+        )
+    if settings.sms_webhook_url:
+        providers[ORMNotificationType.sms] = WebhookSmsProvider(
+            settings.sms_webhook_url,
+            token=settings.sms_webhook_token
+        )
+    return DeliveryDispatcher(
+        service,
+        logger,
+        providers,
+        rate_limits={
+            ORMNotificationType.email: settings.mailjet_rate_limit,
+            ORMNotificationType.sms: settings.sms_rate_limit,
+        },
+        registry=get_metrics_registry(),
+        claim_size=settings.dispatch_claim_size,
+        lease_seconds=settings.dispatch_lease_seconds,
+        concurrency=settings.dispatch_concurrency,
+        max_attempts=settings.dispatch_max_attempts,
+        backoff_base=settings.dispatch_backoff_base_seconds,
+        backoff_max=settings.dispatch_backoff_max_seconds,
+        poll_interval=settings.dispatch_poll_interval_seconds
+    )
+
+def create_hub(unread_counter, recent_cache, versions) -> NotificationHub:
+    """The SSE hub, or an event bus that also carries events and cache invalidations between processes."""
+    if settings.event_bus == "inprocess":
+        return NotificationHub(
+            buffer_size=settings.sse_queue_size,
+            replay_size=settings.sse_replay_size,
+            replay_max_users=settings.sse_replay_max_users,
+            settle_seconds=settings.sse_settle_ms / 1000
+        )
+
+    def apply_remote_change(user_ids):
+        # Another process wrote for these users; drop what this one cached about them
+        versions.bump(user_ids, notify=False)
+        recent_cache.invalidate(user_ids)
+        unread_counter.invalidate(user_ids)
+
+    replay_restarts = set()
+
+    def apply_lost_changes():
+        # Some other process's writes went unseen; nothing cached about any user can be trusted
+        versions.new_epoch()
+        recent_cache.invalidate_all()
+        unread_counter.invalidate_all()
+        # The bus reset its replay buffer; resumes hit the DB until the floor is read again
+        task = asyncio.get_running_loop().create_task(restart_replay())
+        replay_restarts.add(task)
+        task.add_done_callback(replay_restarts.discard)
+
+    async def restart_replay():
+        try:
+            app.state.notification_hub.start_replay(await app.state.notification_service.latest_notification_id())
+        except Exception as e:
+            logger.error(f"Failed to restart SSE replay: {str(e)}")
+
+    if settings.event_bus == "unix":
+        bus = UnixSocketEventBus(
+            settings.event_bus_socket_dir, logger,
+            buffer_size=settings.sse_queue_size, on_remote_change=apply_remote_change,
+            replay_size=settings.sse_replay_size, replay_max_users=settings.sse_replay_max_users,
+            settle_seconds=settings.sse_settle_ms / 1000, on_lost_changes=apply_lost_changes,
+            sync_interval=settings.event_bus_sync_ms / 1000,
+            send_queue_size=settings.event_bus_send_queue_size
+        )
+    elif settings.event_bus == "broker":
+        bus = BrokerEventBus(
+            load_broker_adapter(settings.event_bus_broker_adapter, settings), logger,
+            buffer_size=settings.sse_queue_size, on_remote_change=apply_remote_change,
+            replay_size=settings.sse_replay_size, replay_max_users=settings.sse_replay_max_users,
+            settle_seconds=settings.sse_settle_ms / 1000, on_lost_changes=apply_lost_changes,
+            sync_interval=settings.event_bus_sync_ms / 1000,
+            send_queue_size=settings.event_bus_send_queue_size
+        )
+    else:
+        raise ValueError(f"Unknown event bus {settings.event_bus!r}")
+    versions.listeners.append(bus.users_changed)
+    app.state.event_bus = bus
+    return bus
+
+def create_versions() -> UserVersions:
+    """ETag versions; ETags are only served when writes in other workers reach this one."""
+    etags = settings.etags_enabled
+    if etags and settings.event_bus == "inprocess":
+        if settings.web_concurrency > 1:
+            logger.error(
+                f"ETags disabled: with WEB_CONCURRENCY={settings.web_concurrency} and EVENT_BUS=inprocess "
+                f"a worker would answer 304 after writes made by another; set EVENT_BUS=unix or broker"
+            )
+            etags = False
+        else:
+            logger.warning(
+                "ETags assume a single worker with EVENT_BUS=inprocess; for more workers set "
+                "EVENT_BUS=unix or broker, or ETAGS_ENABLED=false"
+            )
+    return UserVersions(max_users=settings.etag_versions_max_users, etags=etags)
+
+def create_admission_control() -> AdmissionControl:
+    def limiter(limit):
+        return ConcurrencyLimiter(limit, settings.admission_queue_size, settings.admission_max_wait_ms / 1000)
+
+    return AdmissionControl(
+        {
+            "writes": limiter(settings.admission_writes_limit),
+            "reads": limiter(settings.admission_reads_limit),
+            "counts": limiter(settings.admission_counts_limit),
+            "connects": limiter(settings.admission_connects_limit),
+        },
+        retry_after=settings.admission_retry_after_seconds,
+        reject_status=settings.admission_reject_status,
+        sse_max_connections=settings.sse_max_connections
+    )
+
+async def prepare_database():
+    """What the worker needs from the DB before it is ready: a current schema and the SSE replay floor."""
+    version = await run_with_connection(ensure_schema, settings.schema_auto_upgrade)
+    if version > SCHEMA_VERSION:
+        logger.warning(f"Database schema version {version} is newer than this build's {SCHEMA_VERSION}")
+    # Everything above the current latest id will be published to the (already listening) hub
+    app.state.notification_hub.start_replay(await app.state.notification_service.latest_notification_id())
+
+async def ping():
+    await run_with_connection(ping_database)
+
+# Service Init. Nothing here touches the DB (engines connect lazily), so a DB outage leaves the
+# worker up but not ready instead of half-initialized; configuration errors fail the start.
 @app.on_event("startup")
 def startup_event():
-    try:
-        engine = get_engine()
-        create_all(engine)
-        session_factory = get_session_factory()
-        app.state.notification_service = NotificationService(session_factory, logger)
-        logger.info("Service started and DB connected")
-    except Exception as e:
-        logger.error(f"Failed to start service: {e}")
-        # In production, might want to raise to fail fast, but for now allow startup
-        # raise e
-
-@app.get("/health")
-def health():
-    return {"status": "ok"}
+    unread_counter = UnreadCounterCache(
+        max_users=settings.unread_cache_max_users,
+        reconcile_seconds=settings.unread_cache_reconcile_seconds
+    )
+    recent_cache = RecentNotificationsCache(
+        max_users=settings.recent_cache_max_users,
+        depth=settings.recent_cache_depth,
+        ttl_seconds=settings.recent_cache_ttl_seconds
+    )
+    versions = create_versions()
+    idempotency_keys = IdempotencyKeyCache(max_keys=settings.idempotency_cache_max_keys)
+    templates = TemplateRegistry(cache_size=settings.template_render_cache_size)
+    app.state.unread_counter = unread_counter
+    app.state.recent_notifications = recent_cache
+    app.state.idempotency_keys = idempotency_keys
+    app.state.templates = templates
+    hub = create_hub(unread_counter, recent_cache, versions)
+    app.state.notification_hub = hub
+    if settings.db_async:
+        app.state.notification_service = AsyncNotificationService(
+            get_async_session_factory(), logger, hub=hub, unread_counter=unread_counter,
+            recent_cache=recent_cache, versions=versions, idempotency_keys=idempotency_keys,
+            templates=templates
+        )
+    else:
+        # Sync deployments: keep the routers async and run DB calls in the threadpool
+        app.state.notification_service = ThreadedNotificationService(
+            NotificationService(
+                get_session_factory(), logger, hub=hub, unread_counter=unread_counter,
+                recent_cache=recent_cache, versions=versions, idempotency_keys=idempotency_keys,
+                templates=templates
+            )
+        )
+    app.state.delivery_acks = DeliveryAckBuffer(
+        app.state.notification_service,
+        logger,
+        max_batch=settings.delivery_ack_batch_size,
+        flush_interval=settings.delivery_ack_flush_ms / 1000.0
+    )
+    if settings.coalesce_window_ms > 0:
+        app.state.coalescer = NotificationCoalescer(
+            app.state.notification_service,
+            logger,
+            window=settings.coalesce_window_ms / 1000.0,
+            max_group=settings.coalesce_max_group,
+            chunk_size=settings.notification_batch_chunk_size
+        )
+    if settings.ingestion_mode == "queued":
+        app.state.ingestion_queue = IngestionQueue(
+            settings.ingestion_queue_path,
+            synchronous=settings.ingestion_queue_synchronous
+        )
+        app.state.ingestion_flusher = IngestionFlusher(
+            app.state.ingestion_queue,
+            app.state.notification_service,
+            logger,
+            max_items=settings.ingestion_flush_max_items,
+            interval=settings.ingestion_flush_interval_ms / 1000.0
+        )
+    app.state.delete_jobs = SubscriptionDeleteJobs(
+        app.state.notification_service,
+        logger,
+        chunk_size=settings.subscription_delete_chunk_size
+    )
+    retention_policy = RetentionPolicy(settings.retention_ttl_days)
+    if retention_policy:
+        app.state.retention_purger = RetentionPurger(
+            app.state.notification_service,
+            logger,
+            retention_policy,
+            chunk_size=settings.retention_purge_chunk_size,
+            pause=settings.retention_purge_pause_ms / 1000.0,
+            interval=settings.retention_purge_interval_seconds
+        )
+    if settings.dispatcher_enabled:
+        app.state.delivery_dispatcher = create_dispatcher(app.state.notification_service)
+    app.state.admission = create_admission_control()
+    app.state.readiness = DatabaseReadiness(
+        ping,
+        logger,
+        prepare=prepare_database,
+        interval=settings.readiness_interval_seconds,
+        timeout=settings.readiness_timeout_seconds
+    )
+    logger.info("Service started")
+
+@app.on_event("startup")
+async def start_background_tasks():
+    access_log_listener.start()
+    if hasattr(app.state, "event_bus"):
+        await app.state.event_bus.start()
+    # Needs the running loop, so it can't live in the sync startup handler
+    if hasattr(app.state, "ingestion_flusher"):
+        app.state.ingestion_flusher.start()
+    if hasattr(app.state, "retention_purger"):
+        app.state.retention_purger.start()
+    if hasattr(app.state, "delivery_dispatcher"):
+        app.state.delivery_dispatcher.start()
+    # First check runs right away (schema, replay floor), then a ping every readiness_interval_seconds
+    app.state.readiness.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Report not ready first so load balancers stop routing here while we drain
+    await app.state.readiness.stop()
+    # Write notifications still waiting in a coalescing window
+    if hasattr(app.state, "coalescer"):
+        await app.state.coalescer.aclose()
+    # Don't lose buffered SSE delivery acks on deploys
+    if hasattr(app.state, "delivery_acks"):
+        await app.state.delivery_acks.aclose()
+    if hasattr(app.state, "retention_purger"):
+        await app.state.retention_purger.stop()
+    # An interrupted round's rows are re-claimed once their lease runs out
+    if hasattr(app.state, "delivery_dispatcher"):
+        await app.state.delivery_dispatcher.stop()
+    # Drain queued notifications; anything left is replayed on the next start
+    if hasattr(app.state, "ingestion_flusher"):
+        await app.state.ingestion_flusher.stop()
+        app.state.ingestion_queue.close()
+    if hasattr(app.state, "event_bus"):
+        await app.state.event_bus.stop()
+    await dispose_engine()
+    access_log_listener.stop()
 
+app.include_router(health_router)
 app.include_router(notifications_router)
+app.include_router(metrics_router)
@@ -0,0 +1,70 @@
+import logging
+import time
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.utils.metrics_registry import MetricsRegistry
+
+
+class RequestMetricsMiddleware:
+    """
+    Pure ASGI middleware that records per-route latency histograms, in-flight requests,
+    status counters and open SSE streams, and writes one access log line per request.
+
+    Unlike BaseHTTPMiddleware it doesn't run the endpoint in a separate task or buffer the
+    response, so streaming responses pass straight through. SSE streams are tracked by a gauge
+    and a separate duration histogram, so long-lived connections don't skew request latency.
+    """
+
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry, access_logger: logging.Logger = None):
+        self.app = app
+        self.access_logger = access_logger
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being handled")
+        self.requests = registry.counter("http_requests_total", "HTTP requests by method, route and status")
+        self.latency = registry.histogram(
+            "http_request_duration_seconds", "Time from request to last response byte, by method and route"
+        )
+        self.sse_open = registry.gauge("sse_connections_open", "Open server-sent event streams")
+        self.sse_duration = registry.histogram(
+            "sse_connection_duration_seconds",
+            "Lifetime of server-sent event streams",
+            buckets=(1.0, 10.0, 60.0, 300.0, 900.0, 1800.0, 3600.0)
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+        streaming = False
+        self.in_flight.inc()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, streaming
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                for name, value in message.get("headers", ()):
+                    if name.lower() == b"content-type" and value.startswith(b"text/event-stream"):
+                        streaming = True
+                        self.sse_open.inc()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            self.in_flight.dec()
+            # The route template (not the raw path) keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            self.requests.inc(method=method, route=path, status=str(status_code))
+            if streaming:
+                self.sse_open.dec()
+                self.sse_duration.observe(duration, route=path)
+            else:
+                self.latency.observe(duration, method=method, route=path)
+            if self.access_logger is not None:
+                self.access_logger.info(
+                    "%s %s -> %d in %.2fms", method, scope["path"], status_code, duration * 1000
+                )
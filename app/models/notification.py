@@ -1,6 +1,6 @@
 from enum import Enum
-from typing import Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field, model_validator
 from datetime import datetime
 
 class NotificationType(str, Enum):
@@ -19,12 +19,31 @@ class NotificationRequest(BaseModel):
     user_id: str = Field(..., description="User ID to send notification to")
     subscription_id: int = Field(..., description="Subscription ID this notification is about")
     subject: str = Field(..., description="Subject/title of the notification")
-    body: str = Field(..., description="Body content of the notification")
+    body: Optional[str] = Field(default=None, description="Body content of the notification; omit when template_id is set")
+    template_id: Optional[str] = Field(
+        default=None,
+        max_length=64,
+        description="Registered body template, e.g. payment_due; stored with template_params and rendered on read"
+    )
+    template_params: Optional[Dict[str, Any]] = Field(default=None, description="Values for the template's placeholders")
     notification_type: NotificationType = Field(default=NotificationType.push, description="Type of notification")
     # Optional fields for specific notification types
     recipient_email: Optional[str] = Field(default=None, description="Email address (for email notifications)")
     device_token: Optional[str] = Field(default=None, description="Device token (for push notifications)")
+    recipient_phone: Optional[str] = Field(default=None, description="Phone number in E.164 format (for SMS notifications)")
     metadata: Optional[Dict[str, Any]] = Field(default=None, description="Additional metadata")
+    dedup_key: Optional[str] = Field(
+        default=None,
+        min_length=1,
+        max_length=64,
+        description="Idempotency key; repeating a request with the same key returns the original notification"
+    )
+
+    @model_validator(mode="after")
+    def check_body(self):
+        if (self.body is None) == (self.template_id is None):
+            raise ValueError("Exactly one of body and template_id is required")
+        return self
 
 class NotificationRead(BaseModel):
     """Model for reading notification data."""
@@ -38,10 +57,70 @@ class NotificationRead(BaseModel):
     read_at: Optional[datetime] = Field(None, description="When notification was read")
     delivered_at: Optional[datetime] = Field(None, description="When notification was delivered")
     created_at: datetime = Field(..., description="When notification was created")
+    details: Optional[List[Dict[str, Any]]] = Field(None, description="Items merged into this digest notification")
+    metadata: Optional[Dict[str, Any]] = Field(None, description="Metadata sent with the notification request")
+
+class NotificationReadFields(BaseModel):
+    """
+    A notification listed with fields=: id and created_at (always returned, they make the
+    cursor) plus the selected fields. A field that wasn't selected is left out of the JSON.
+    """
+    id: int = Field(..., description="Notification ID")
+    created_at: datetime = Field(..., description="When notification was created")
+    subscription_id: Optional[int] = Field(None, description="Subscription ID")
+    user_id: Optional[str] = Field(None, description="User ID")
+    notification_type: Optional[NotificationType] = Field(None, description="Type of notification")
+    subject: Optional[str] = Field(None, description="Subject/title")
+    message: Optional[str] = Field(None, description="Message body")
+    status: Optional[NotificationStatus] = Field(None, description="Current status")
+    read_at: Optional[datetime] = Field(None, description="When notification was read")
+    delivered_at: Optional[datetime] = Field(None, description="When notification was delivered")
+    details: Optional[List[Dict[str, Any]]] = Field(None, description="Items merged into this digest notification")
+    metadata: Optional[Dict[str, Any]] = Field(None, description="Metadata sent with the notification request")
 
 class NotificationResponse(BaseModel):
     """Response model for notification creation."""
     id: int = Field(..., description="Notification ID")
     status: NotificationStatus = Field(..., description="Status of the notification")
     timestamp: datetime = Field(default_factory=datetime.utcnow)
+    duplicate: bool = Field(False, description="The request was a repeat; id is the original notification")
+
+class NotificationAcceptedResponse(BaseModel):
+    """Response model for a notification accepted into the ingestion queue but not stored yet."""
+    ingest_key: str = Field(..., description="Key the notification will be stored under")
+    status: str = Field(default="accepted")
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+
+class NotificationBulkReadRequest(BaseModel):
+    """Request model for marking several notifications as read."""
+    notification_ids: List[int] = Field(..., min_length=1, max_length=1000, description="Notification IDs to mark as read")
+
+class NotificationBatchRequest(BaseModel):
+    """Request model for creating many notifications in one call."""
+    notifications: List[NotificationRequest] = Field(..., min_length=1, description="Notifications to create, in order")
+
+class NotificationBatchItemResult(BaseModel):
+    """Outcome of a single item in a batch create."""
+    index: int = Field(..., description="Position of the item in the request")
+    id: Optional[int] = Field(None, description="Notification ID, if the item was created")
+    status: Optional[NotificationStatus] = Field(None, description="Status of the created notification")
+    error: Optional[str] = Field(None, description="Why the item could not be created")
+    duplicate: bool = Field(False, description="The item was already stored; id is the existing notification")
+
+class NotificationBatchResponse(BaseModel):
+    """Response model for batch notification creation."""
+    created: int = Field(..., description="Number of notifications created")
+    duplicates: int = Field(0, description="Number of items that were already stored (or repeated in the batch)")
+    failed: int = Field(..., description="Number of items that could not be created")
+    results: List[NotificationBatchItemResult] = Field(..., description="Per-item results, in request order")
 
+class DeleteJobStatus(BaseModel):
+    """Progress of a background subscription delete."""
+    job_id: str = Field(..., description="Job ID to poll")
+    subscription_id: int = Field(..., description="Subscription whose notifications are being deleted")
+    status: str = Field(default="running", description="running, completed or failed")
+    deleted: int = Field(default=0, description="Notifications deleted so far")
+    error: Optional[str] = Field(None, description="Why the job failed")
+    started_at: datetime = Field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = Field(None)
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Request, status
+from fastapi.responses import JSONResponse
+
+router = APIRouter()
+
+@router.get("/livez")
+def livez():
+    """Liveness: the process is up and serving. Never touches the DB."""
+    return {"status": "ok"}
+
+@router.get("/health")
+def health():
+    """Same as /livez, kept for existing health checks."""
+    return {"status": "ok"}
+
+@router.get("/readyz")
+def readyz(request: Request):
+    """
+    Readiness: the DB schema has been checked and the latest background DB ping succeeded.
+    Answers from the cached result, so probes cost no DB round trip; 503 until then and
+    while shutting down.
+    """
+    readiness = getattr(request.app.state, "readiness", None)
+    if readiness is None:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"ready": False, "database": None}
+        )
+    result = readiness.status()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if result["ready"] else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=result
+    )
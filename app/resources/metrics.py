@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException, Request, status
+from fastapi.responses import PlainTextResponse
+from app.utils.db import get_pool_stats
+from app.utils.metrics_registry import get_metrics_registry
+
+router = APIRouter()
+
+# Pool figures copied into the registry on every scrape
+POOL_GAUGES = ("pool_size", "checked_out", "checked_in", "overflow", "checkouts_total", "timeouts_total", "wait_seconds_total")
+
+# In-process caches and buffers on app.state whose stats() are copied into the registry on every scrape
+CACHE_GAUGES = {
+    "unread_counter": "unread_cache",
+    "recent_notifications": "recent_cache",
+    "idempotency_keys": "idempotency_cache",
+    "templates": "template_render",
+    "coalescer": "coalescer",
+    "ingestion_flusher": "ingestion",
+    "event_bus": "event_bus",
+    "readiness": "readiness",
+    "admission": "admission",
+}
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request):
+    """
+    Request, SSE, cache and connection pool metrics for this worker in the Prometheus text format.
+    """
+    registry = get_metrics_registry()
+    for attr, prefix in CACHE_GAUGES.items():
+        cache = getattr(request.app.state, attr, None)
+        if cache is not None:
+            for name, value in cache.stats().items():
+                registry.gauge(f"{prefix}_{name}", f"{prefix.replace('_', ' ')} {name.replace('_', ' ')}").set(value)
+    hub = getattr(request.app.state, "notification_hub", None)
+    if hub is not None:
+        for name, value in hub.replay_stats().items():
+            registry.gauge(f"sse_replay_{name}", f"SSE replay buffer {name}").set(value)
+    try:
+        pool_stats = get_pool_stats()
+        for name in POOL_GAUGES:
+            registry.gauge(f"db_pool_{name}", f"Connection pool {name.replace('_', ' ')}").set(pool_stats[name])
+    except Exception:
+        # Still serve request metrics when the DB engine couldn't be created
+        pass
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+@router.get("/metrics/db-pool")
+def get_db_pool_metrics():
+    """
+    Connection pool telemetry for this worker: checked-out connections, overflow,
+    checkout wait times and timeouts.
+    """
+    try:
+        return get_pool_stats()
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to read pool metrics: {str(e)}"
+        )
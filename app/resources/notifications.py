@@ -1,15 +1,28 @@
-from fastapi import APIRouter, HTTPException, status, Request, Query, Path
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response, Query, Path, Header
+from fastapi.responses import StreamingResponse, JSONResponse, ORJSONResponse
+from starlette.concurrency import run_in_threadpool
 from app.models.notification import (
     NotificationRequest, 
     NotificationResponse, 
+    NotificationAcceptedResponse,
     NotificationRead,
-    NotificationStatus
+    NotificationReadFields,
+    NotificationStatus,
+    NotificationBatchRequest,
+    NotificationBatchResponse,
+    NotificationBulkReadRequest,
+    DeleteJobStatus
 )
-from typing import List
+from app.services.admission import AdmissionRejected, AdmissionSlot
+from app.services.notification_hub import DeliveredIds
+from app.utils.settings import get_settings
+from app.utils.pagination import encode_cursor, decode_cursor
+from typing import List, Optional, Union
 import json
 import asyncio
-from datetime import datetime
+import random
+from contextlib import aclosing
+from datetime import datetime, timezone
 
 router = APIRouter()
 
@@ -22,21 +35,141 @@ def get_notification_service(request: Request):
         )
     return request.app.state.notification_service
 
-@router.post("/notifications", response_model=NotificationResponse, status_code=status.HTTP_201_CREATED)
-def create_notification(payload: NotificationRequest, request: Request):
+def get_delivery_acks(request: Request):
+    """Helper to get the shared delivery ack buffer from app state."""
+    if not hasattr(request.app.state, "delivery_acks"):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Delivery ack buffer not initialized"
+        )
+    return request.app.state.delivery_acks
+
+def get_delete_jobs(request: Request):
+    """Helper to get the background subscription delete jobs from app state."""
+    if not hasattr(request.app.state, "delete_jobs"):
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Delete jobs not initialized"
+        )
+    return request.app.state.delete_jobs
+
+def check_etag(request: Request, service, user_id: str):
+    """
+    Response headers with the ETag for user_id's current version of this URL, and whether the
+    request's If-None-Match already has it. Uses only the in-process version tracker, never
+    the notifications table. Without ETags (see UserVersions.etags) nothing is ever 304.
+    """
+    headers = dict(ETAG_HEADERS)
+    if not service.versions.etags:
+        return headers, False
+    etag = service.versions.etag(user_id, f"{request.url.path}?{request.url.query}")
+    headers["ETag"] = etag
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return headers, False
+    # Weak comparison, as for GET revalidation
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return headers, "*" in candidates or etag.removeprefix("W/") in candidates
+
+def check_template(service, payload: NotificationRequest, item: Optional[int] = None):
+    """400 unless a templated payload names a registered template and gives all its params."""
+    if payload.template_id is None:
+        return
+    try:
+        service.templates.validate(payload.template_id, payload.template_params)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e) if item is None else f"Item {item}: {str(e)}"
+        )
+
+def admit(endpoint_class: str):
+    """
+    Dependency holding one of the worker's admission slots for endpoint_class while the
+    request runs. Refused requests fail fast with 503 (or the configured status) and Retry-After.
+    Routes that take the AdmissionSlot it yields may release it before they finish.
+    """
+    async def dependency(request: Request):
+        admission = getattr(request.app.state, "admission", None)
+        if admission is not None:
+            try:
+                await admission.acquire(endpoint_class)
+            except AdmissionRejected as e:
+                raise HTTPException(
+                    status_code=admission.reject_status,
+                    detail=str(e),
+                    headers={"Retry-After": str(e.retry_after)}
+                )
+        slot = AdmissionSlot(admission, endpoint_class)
+        try:
+            yield slot
+        finally:
+            slot.release()
+    return dependency
+
+# Clients may store responses but have to revalidate them on every poll
+ETAG_HEADERS = {"Cache-Control": "private, no-cache"}
+
+@router.post(
+    "/notifications",
+    response_model=NotificationResponse,
+    status_code=status.HTTP_201_CREATED,
+    responses={status.HTTP_202_ACCEPTED: {"model": NotificationAcceptedResponse}}
+)
+async def create_notification(
+    payload: NotificationRequest,
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=64),
+    slot: AdmissionSlot = Depends(admit("writes"))
+):
     """
     Create a push notification and save to database.
     This endpoint is called by the Cloud Function when processing Pub/Sub events.
+    An Idempotency-Key header (or dedup_key field) makes retries safe: a repeat creates
+    nothing and returns the original notification's id with duplicate=true.
+    With a coalescing window configured, push notifications for the same user that arrive
+    close together are stored as one digest, and the response carries the digest's id.
+    With INGESTION_MODE=queued the notification is made durable in the local ingestion
+    queue and 202 is returned; it is written to the database by the next group commit.
+    Instead of a body, a template_id and template_params may be given: the row then stores
+    just those, and the body is rendered when the notification is read.
     """
+    if idempotency_key is not None:
+        payload = payload.model_copy(update={"dedup_key": idempotency_key})
     service = get_notification_service(request)
+    check_template(service, payload)
+    
+    ingestion_queue = getattr(request.app.state, "ingestion_queue", None)
+    if ingestion_queue is not None:
+        # A recently stored repeat can be answered for real; anything else goes to the queue
+        original_id = service.idempotency_keys.get(payload.dedup_key) if payload.dedup_key else None
+        if original_id is not None:
+            return NotificationResponse(id=original_id, status=NotificationStatus.sent, duplicate=True)
+        try:
+            ingest_key = await run_in_threadpool(ingestion_queue.append, payload)
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to queue notification: {str(e)}"
+            )
+        accepted = NotificationAcceptedResponse(ingest_key=ingest_key)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=accepted.model_dump(mode="json"))
     
+    coalescer = getattr(request.app.state, "coalescer", None)
     try:
-        notification_id = service.create_notification(payload)
+        if coalescer is not None:
+            # Most of the wait is for the group's window; the coalescer's single writer does the
+            # DB work, so the writes slot would only keep other requests out meanwhile
+            slot.release()
+            notification_id, duplicate = await coalescer.submit(payload)
+        else:
+            notification_id, duplicate = await service.create_notification(payload)
         
         return NotificationResponse(
             id=notification_id,
             status=NotificationStatus.sent,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.utcnow(),
+            duplicate=duplicate
         )
     except Exception as e:
         raise HTTPException(
@@ -44,54 +177,141 @@ def create_notification(payload: NotificationRequest, request: Request):
             detail=f"Failed to create notification: {str(e)}"
         )
 
-@router.get("/notifications", response_model=List[NotificationRead])
-def get_notifications(
+@router.post("/notifications/batch", response_model=NotificationBatchResponse)
+async def create_notifications_batch(
+    payload: NotificationBatchRequest,
+    request: Request,
+    slot: AdmissionSlot = Depends(admit("writes"))
+):
+    """
+    Create many notifications in one call, e.g. for a billing run.
+    Items are inserted in a single transaction; each item reports its own id or error.
+    """
+    service = get_notification_service(request)
+    settings = get_settings()
+    
+    if len(payload.notifications) > settings.notification_batch_max_items:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Batch exceeds {settings.notification_batch_max_items} notifications"
+        )
+    for index, item in enumerate(payload.notifications):
+        check_template(service, item, index)
+    
+    coalescer = getattr(request.app.state, "coalescer", None)
+    try:
+        if coalescer is not None:
+            # As in create_notification, don't hold the slot through the coalescing window
+            slot.release()
+            results = await coalescer.submit_many(payload.notifications)
+        else:
+            results = await service.create_notifications(
+                payload.notifications,
+                chunk_size=settings.notification_batch_chunk_size
+            )
+        return NotificationBatchResponse(
+            created=sum(1 for r in results if r.id is not None and not r.duplicate),
+            duplicates=sum(1 for r in results if r.duplicate),
+            failed=sum(1 for r in results if r.error is not None),
+            results=results
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create notification batch: {str(e)}"
+        )
+
+@router.get(
+    "/notifications",
+    response_model=List[Union[NotificationRead, NotificationReadFields]],
+    dependencies=[Depends(admit("reads"))]
+)
+async def get_notifications(
     user_id: str = Query(..., description="User ID to get notifications for"),
     unread_only: bool = Query(False, description="Filter to unread notifications only"),
     limit: int = Query(50, ge=1, le=100, description="Maximum number of notifications to return"),
-    offset: int = Query(0, ge=0, description="Offset for pagination"),
+    offset: int = Query(0, ge=0, description="Offset for pagination (ignored when cursor is set)"),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header of the previous page"),
+    fields: Optional[str] = Query(
+        None,
+        description="Comma-separated NotificationRead fields to return, e.g. id,subject,read_at; "
+                    "id and created_at are always included"
+    ),
     request: Request = None
 ):
     """
     Get notifications for a user.
+    When a full page is returned, the X-Next-Cursor response header holds the cursor for the next page.
+    Rows are serialized straight to JSON bytes; the response_model only documents the schema:
+    NotificationRead items, or NotificationReadFields items (only the selected fields) with fields=.
+    Supports If-None-Match: if nothing changed for the user, 304 is returned without any query.
     """
     service = get_notification_service(request)
     
     try:
-        notifications = service.get_user_notifications(
+        decoded_cursor = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    selected_fields = None
+    if fields:
+        selected_fields = list(dict.fromkeys(["id", "created_at"] + [f.strip() for f in fields.split(",") if f.strip()]))
+        unknown = [f for f in selected_fields if f not in NotificationRead.model_fields]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+    
+    headers, not_modified = check_etag(request, service, user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    try:
+        rows = await service.get_user_notification_rows(
             user_id=user_id,
             unread_only=unread_only,
             limit=limit,
-            offset=offset
+            offset=offset,
+            cursor=decoded_cursor,
+            fields=selected_fields
         )
-        return notifications
+        if len(rows) == limit:
+            last = rows[-1]
+            headers["X-Next-Cursor"] = encode_cursor(last["created_at"], last["id"])
+        return ORJSONResponse(rows, headers=headers)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get notifications: {str(e)}"
         )
 
-@router.get("/notifications/unread-count")
-def get_unread_count(
+@router.get("/notifications/unread-count", dependencies=[Depends(admit("counts"))])
+async def get_unread_count(
     user_id: str = Query(..., description="User ID to get unread count for"),
     request: Request = None
 ):
     """
     Get count of unread notifications for a user.
+    Supports If-None-Match: an unchanged count is answered with 304 without any query.
     """
     service = get_notification_service(request)
     
+    headers, not_modified = check_etag(request, service, user_id)
+    if not_modified:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
     try:
-        count = service.get_unread_count(user_id)
-        return {"user_id": user_id, "unread_count": count}
+        count = await service.get_unread_count(user_id)
+        return JSONResponse({"user_id": user_id, "unread_count": count}, headers=headers)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get unread count: {str(e)}"
         )
 
-@router.patch("/notifications/{notification_id}/read")
-def mark_notification_read(
+@router.patch("/notifications/{notification_id}/read", dependencies=[Depends(admit("writes"))])
+async def mark_notification_read(
     notification_id: int,
     user_id: str = Query(..., description="User ID (for security validation)"),
     request: Request = None
@@ -102,7 +322,7 @@ def mark_notification_read(
     service = get_notification_service(request)
     
     try:
-        success = service.mark_notification_read(notification_id, user_id)
+        success = await service.mark_notification_read(notification_id, user_id)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -117,19 +337,79 @@ def mark_notification_read(
             detail=f"Failed to mark notification as read: {str(e)}"
         )
 
-@router.delete("/notifications/subscription/{subscription_id}")
-def delete_notifications_by_subscription(
+@router.patch("/notifications/read", dependencies=[Depends(admit("writes"))])
+async def mark_notifications_read(
+    payload: NotificationBulkReadRequest,
+    user_id: str = Query(..., description="User ID (for security validation)"),
+    request: Request = None
+):
+    """
+    Mark several notifications as read in one call.
+    Ids that are unknown, already read or belong to another user are ignored.
+    """
+    service = get_notification_service(request)
+    
+    try:
+        updated_count = await service.mark_notifications_read(user_id, payload.notification_ids)
+        return {"message": "Notifications marked as read", "user_id": user_id, "updated_count": updated_count}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to mark notifications as read: {str(e)}"
+        )
+
+@router.patch("/notifications/read-all", dependencies=[Depends(admit("writes"))])
+async def mark_all_notifications_read(
+    user_id: str = Query(..., description="User ID to mark notifications read for"),
+    before: Optional[datetime] = Query(None, description="Only mark notifications created at or before this time"),
+    request: Request = None
+):
+    """
+    Mark all of a user's unread notifications as read.
+    """
+    service = get_notification_service(request)
+    
+    if before is not None and before.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        before = before.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    try:
+        updated_count = await service.mark_all_read(user_id, before)
+        return {"message": "Notifications marked as read", "user_id": user_id, "updated_count": updated_count}
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to mark notifications as read: {str(e)}"
+        )
+
+@router.delete(
+    "/notifications/subscription/{subscription_id}",
+    responses={status.HTTP_202_ACCEPTED: {"model": DeleteJobStatus}},
+    dependencies=[Depends(admit("writes"))]
+)
+async def delete_notifications_by_subscription(
     subscription_id: int = Path(..., description="Subscription ID to delete notifications for"),
+    background: bool = Query(False, description="Delete in the background and return a job to poll"),
     request: Request = None
 ):
     """
     Delete all notifications associated with a subscription.
     This endpoint is called when a subscription is deleted to maintain data consistency.
+    Rows are deleted in chunks, one transaction each. With background=true the call returns
+    202 right away; poll GET /notifications/delete-jobs/{job_id} for progress.
     """
+    if background:
+        job = get_delete_jobs(request).start(subscription_id)
+        return JSONResponse(status_code=status.HTTP_202_ACCEPTED, content=job.model_dump(mode="json"))
+    
     service = get_notification_service(request)
+    settings = get_settings()
     
     try:
-        deleted_count = service.delete_notifications_by_subscription_id(subscription_id)
+        deleted_count = await service.delete_notifications_by_subscription_id(
+            subscription_id,
+            chunk_size=settings.subscription_delete_chunk_size
+        )
         return {
             "message": f"Deleted {deleted_count} notifications for subscription {subscription_id}",
             "subscription_id": subscription_id,
@@ -141,67 +421,173 @@ def delete_notifications_by_subscription(
             detail=f"Failed to delete notifications for subscription {subscription_id}: {str(e)}"
         )
 
+@router.get("/notifications/delete-jobs/{job_id}", response_model=DeleteJobStatus)
+async def get_delete_job(
+    job_id: str = Path(..., description="Job ID returned by a background subscription delete"),
+    request: Request = None
+):
+    """Progress of a background subscription delete started by this worker."""
+    job = get_delete_jobs(request).get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Delete job {job_id} not found"
+        )
+    return job
+
 @router.get("/notifications/stream")
 async def stream_notifications(
     user_id: str = Query(..., description="User ID to stream notifications for"),
-    request: Request = None
+    request: Request = None,
+    last_event_id: Optional[str] = Header(None)
 ):
     """
     Server-Sent Events (SSE) endpoint for real-time notification delivery.
     Frontend connects to this endpoint to receive push notifications.
+    New notifications are pushed through the hub (or event bus, with several workers) instead
+    of polling the DB. Each event's id is a resume point, the highest notification id up to
+    which the client has everything (the data's id is the notification's own), so a client
+    reconnecting with Last-Event-ID is first sent the notifications it missed: from the hub's
+    replay buffer when it covers them, otherwise with an id range query. Near notifications
+    that commit out of id order the resume point trails behind, and a resume can repeat a few.
+
+    EventSource gives up for good on any non-200 answer, so streams over the worker's cap, or
+    whose DB catch-up isn't admitted, get a 200 that only tells the client to reconnect later.
     """
     service = get_notification_service(request)
+    acks = get_delivery_acks(request)
+    hub = service.hub
+    settings = get_settings()
+    admission = getattr(request.app.state, "admission", None)
+    # Browsers echo back whatever id they last saw; anything else just starts a fresh stream
+    resume_after = int(last_event_id) if last_event_id is not None and last_event_id.isdigit() else None
+    
+    def reconnect_later(retry_after: int) -> str:
+        # Jittered so shed clients don't all come back together; Last-Event-ID is kept
+        return f"retry: {random.randint(retry_after * 1000, 2 * retry_after * 1000)}\n: overloaded, reconnect later\n\n"
+    
+    if admission is not None and not admission.admit_stream(hub.connection_count()):
+        async def refused():
+            yield reconnect_later(admission.retry_after)
+        return StreamingResponse(
+            refused(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "Retry-After": str(admission.retry_after)}
+        )
+    
+    def format_event(notification: NotificationRead, resume_id: int) -> str:
+        event_data = {
+            "id": notification.id,
+            "subscription_id": notification.subscription_id,
+            "subject": notification.subject,
+            "message": notification.message,
+            "created_at": notification.created_at.isoformat()
+        }
+        return f"id: {resume_id}\ndata: {json.dumps(event_data)}\n\n"
+    
+    async def missed_since(after_id: int, since: Optional[datetime]):
+        """Notifications after after_id that the stream hasn't sent, oldest first."""
+        if since is None:
+            replayed = hub.replay(user_id, after_id)
+            if replayed is not None:
+                for notification in replayed:
+                    yield notification
+                return
+        if admission is not None:
+            await admission.acquire("connects")
+        try:
+            while True:
+                notifications = await service.get_notifications_after(
+                    user_id=user_id,
+                    after_id=after_id,
+                    since=since,
+                    limit=hub.buffer_size
+                )
+                for notification in notifications:
+                    after_id = notification.id
+                    yield notification
+                if len(notifications) < hub.buffer_size:
+                    return
+        finally:
+            if admission is not None:
+                admission.release("connects")
     
     async def event_generator():
         """Generate SSE events for new notifications."""
-        last_check = datetime.utcnow()
+        # Subscribe before anything else so nothing published from now on is missed
+        subscription = hub.subscribe(user_id)
+        connected_at = datetime.utcnow()
+        # The id the client resumes from: every notification of the user up to it has been sent
+        # (or, for a new stream, came before it). Only moves up to the hub's settled id, so
+        # notifications that commit out of id order are never skipped by a resume
+        resume_id = resume_after if resume_after is not None else subscription.watermark
+        catching_up = resume_after is not None
+        # Ids that reach the stream both from a catch-up and from its queue are sent once; the
+        # queue holds at most buffer_size of them
+        delivered = DeliveredIds(2 * hub.buffer_size)
         
-        while True:
-            try:
-                # Check for new notifications since last check
-                # We'll check for notifications created after last_check
-                # For simplicity, we'll check unread notifications
-                notifications = service.get_user_notifications(
-                    user_id=user_id,
-                    unread_only=True,
-                    limit=10
-                )
-                
-                # Filter to only notifications created after last_check
-                new_notifications = [
-                    n for n in notifications 
-                    if n.created_at > last_check
-                ]
-                
-                for notification in new_notifications:
-                    # Mark as delivered
-                    service.mark_notification_delivered(notification.id)
+        def advance(settled: Optional[int]) -> None:
+            nonlocal resume_id
+            if settled is not None:
+                resume_id = settled if resume_id is None else max(resume_id, settled)
+        
+        try:
+            # Spread reconnects of clients that were dropped together
+            retry = f"retry: {random.randint(settings.sse_retry_ms, 2 * settings.sse_retry_ms)}\n"
+            if resume_after is None and resume_id is not None:
+                # A new stream starts from now; give the client an id to resume from even if
+                # it never receives an event
+                retry += f"id: {resume_id}\n"
+            yield retry + "\n"
+            while True:
+                try:
+                    if subscription.overflowed:
+                        # Our buffer overflowed and was dropped; catch up like a resuming client
+                        subscription.overflowed = False
+                        catching_up = True
+                    if catching_up:
+                        # Everything up to the settled id has committed, so the catch-up below
+                        # returns all of the user's notifications up to it
+                        settled = hub.replay_watermark()
+                        async with aclosing(missed_since(resume_id or 0, None if resume_id else connected_at)) as missed:
+                            async for notification in missed:
+                                if not delivered.add(notification.id):
+                                    continue
+                                acks.ack(notification.id)
+                                # Caught up through this id, but not past what had settled
+                                advance(notification.id if settled is None else min(notification.id, settled))
+                                yield format_event(notification, resume_id)
+                        catching_up = False
+                    
+                    notification = await subscription.get(timeout=settings.sse_heartbeat_seconds)
+                    if notification is None:
+                        # Keep connection alive with heartbeat
+                        yield ": heartbeat\n\n"
+                        continue
+                    
+                    if not delivered.add(notification.id):
+                        continue
+                    
+                    # Mark as delivered (buffered and written in bulk)
+                    acks.ack(notification.id)
+                    # Without a settled id (before start_replay) the notification id is the best there is
+                    advance(notification.id if subscription.watermark is None else subscription.watermark)
                     
                     # Send SSE event
-                    event_data = {
-                        "id": notification.id,
-                        "subscription_id": notification.subscription_id,
-                        "subject": notification.subject,
-                        "message": notification.message,
-                        "created_at": notification.created_at.isoformat()
-                    }
-                    yield f"data: {json.dumps(event_data)}\n\n"
-                
-                # Update last check time
-                last_check = datetime.utcnow()
-                
-                # Keep connection alive with heartbeat
-                yield ": heartbeat\n\n"
-                
-                # Wait before next check (polling interval)
-                await asyncio.sleep(2)  # Check every 2 seconds
-                
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                error_data = {"error": str(e)}
-                yield f"data: {json.dumps(error_data)}\n\n"
-                await asyncio.sleep(5)  # Wait longer on error
+                    yield format_event(notification, resume_id)
+                    
+                except asyncio.CancelledError:
+                    break
+                except AdmissionRejected as e:
+                    # The client resumes from the last event it got once it reconnects
+                    yield reconnect_later(e.retry_after)
+                    break
+                except Exception as e:
+                    error_data = {"error": str(e)}
+                    yield f"data: {json.dumps(error_data)}\n\n"
+                    await asyncio.sleep(5)  # Wait longer on error
+        finally:
+            hub.unsubscribe(subscription)
     
     return StreamingResponse(
         event_generator(),
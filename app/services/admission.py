@@ -0,0 +1,139 @@
+import asyncio
+from collections import deque
+from typing import Deque, Dict, Optional
+
+
+class AdmissionRejected(RuntimeError):
+    """Raised when a request can't be admitted; routers turn it into a fast 503/429 with Retry-After."""
+
+    def __init__(self, endpoint_class: str, retry_after: int):
+        super().__init__(f"Too many concurrent {endpoint_class} requests, retry in {retry_after}s")
+        self.endpoint_class = endpoint_class
+        self.retry_after = retry_after
+
+
+class ConcurrencyLimiter:
+    """
+    Admits at most `limit` requests at a time. Up to `max_waiting` more wait in FIFO order for
+    at most `max_wait` seconds; anything beyond that is refused at once instead of queueing on
+    the threadpool and the connection pool. A released slot goes straight to the oldest waiter.
+    Must be used from one event loop.
+    """
+
+    def __init__(self, limit: int, max_waiting: int = 0, max_wait: float = 0.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    async def acquire(self) -> bool:
+        """Take a slot, waiting a little if allowed. False if the request should be shed."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected += 1
+            return False
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() hands its slot over by resolving the future, so in_flight is unchanged
+            await asyncio.wait_for(waiter, timeout=self.max_wait)
+            self.admitted += 1
+            return True
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return False
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Handed a slot just as the client went away
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "admitted": self.admitted,
+            "rejected": self.rejected + self.timed_out,
+        }
+
+
+class AdmissionSlot:
+    """
+    An admitted request's slot. `release` may be called early, by a route that has finished
+    with the resources the slot stands for; later calls do nothing.
+    """
+
+    def __init__(self, admission: Optional["AdmissionControl"], endpoint_class: str):
+        self.admission = admission
+        self.endpoint_class = endpoint_class
+        self.released = admission is None
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.admission.release(self.endpoint_class)
+
+
+class AdmissionControl:
+    """
+    Per-worker concurrency limits by endpoint class ("writes", "reads", "counts", "connects"),
+    so a slow DB backs up one class of requests without taking latency up for the others.
+    Classes without a limiter (limit 0) are always admitted. SSE streams are also capped at
+    `sse_max_connections` per worker (0 = unlimited).
+    """
+
+    def __init__(
+        self,
+        limiters: Dict[str, ConcurrencyLimiter],
+        retry_after: int = 1,
+        reject_status: int = 503,
+        sse_max_connections: int = 0
+    ):
+        self.limiters = {name: limiter for name, limiter in limiters.items() if limiter.limit > 0}
+        self.retry_after = retry_after
+        self.reject_status = reject_status
+        self.sse_max_connections = sse_max_connections
+        self.streams_refused = 0
+
+    async def acquire(self, endpoint_class: str) -> None:
+        """Take a slot for endpoint_class or raise AdmissionRejected."""
+        limiter = self.limiters.get(endpoint_class)
+        if limiter is not None and not await limiter.acquire():
+            raise AdmissionRejected(endpoint_class, self.retry_after)
+
+    def release(self, endpoint_class: str) -> None:
+        limiter = self.limiters.get(endpoint_class)
+        if limiter is not None:
+            limiter.release()
+
+    def admit_stream(self, open_streams: int) -> bool:
+        """Whether another SSE stream may open on a worker that already has open_streams."""
+        if self.sse_max_connections and open_streams >= self.sse_max_connections:
+            self.streams_refused += 1
+            return False
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        figures = {"streams_refused": self.streams_refused}
+        for name, limiter in self.limiters.items():
+            figures.update({f"{name}_{key}": value for key, value in limiter.stats().items()})
+        return figures
+
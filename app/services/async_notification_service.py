@@ -0,0 +1,85 @@
+from app.services.notification_hub import NotificationHub
+from app.services.unread_counter import UnreadCounterCache
+from app.services.recent_notifications import RecentNotificationsCache
+from app.services.user_versions import UserVersions
+from app.services.idempotency_keys import IdempotencyKeyCache
+from app.services.templates import TemplateRegistry
+from app.services.notification_service import NotificationService
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Callable, Optional
+import copy
+
+class AsyncNotificationService:
+    """
+    NotificationService on SQLAlchemy's asyncio extension, for deployments with an async DB
+    driver. The service logic is NotificationService's own: every call opens an AsyncSession
+    and runs the method through AsyncSession.run_sync, with that session's sync Session
+    serving each session the method opens, so each DB round trip is awaited on the event loop
+    instead of blocking a thread. An AsyncSession connects on first use, so a call served
+    from the in-memory caches never checks out a connection. Every public method is a
+    coroutine. The session factory must be created with expire_on_commit=False.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        logger,
+        hub: Optional[NotificationHub] = None,
+        unread_counter: Optional[UnreadCounterCache] = None,
+        recent_cache: Optional[RecentNotificationsCache] = None,
+        versions: Optional[UserVersions] = None,
+        idempotency_keys: Optional[IdempotencyKeyCache] = None,
+        templates: Optional[TemplateRegistry] = None
+    ):
+        self.session_factory = session_factory
+        # No sessions of its own: each call gets a copy bound to that call's session
+        self.service = NotificationService(
+            None, logger, hub=hub, unread_counter=unread_counter, recent_cache=recent_cache,
+            versions=versions, idempotency_keys=idempotency_keys, templates=templates
+        )
+
+    def _bound(self, session: Session) -> NotificationService:
+        # The copy shares the caches, hub and templates. Methods open their sessions one after
+        # another, never nested, and a Session can be used again after the close on leaving `with`
+        service = copy.copy(self.service)
+        service.session_factory = lambda: session
+        return service
+
+    def __getattr__(self, name):
+        attr = getattr(self.service, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        async def awaited(*args, **kwargs):
+            async with self.session_factory() as session:
+                return await session.run_sync(
+                    lambda sync_session: getattr(self._bound(sync_session), name)(*args, **kwargs)
+                )
+
+        awaited.__name__ = name
+        awaited.__doc__ = attr.__doc__
+        return awaited
+
+
+class ThreadedNotificationService:
+    """
+    Async facade over the sync NotificationService for deployments without an async DB driver.
+    Every public method is offloaded to the threadpool, so callers can always `await` the service.
+    """
+
+    def __init__(self, service: NotificationService):
+        self.service = service
+
+    def __getattr__(self, name):
+        attr = getattr(self.service, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+
+        async def offloaded(*args, **kwargs):
+            return await run_in_threadpool(attr, *args, **kwargs)
+
+        offloaded.__name__ = name
+        offloaded.__doc__ = attr.__doc__
+        return offloaded
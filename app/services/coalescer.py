@@ -0,0 +1,228 @@
+import asyncio
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.models.notification import NotificationBatchItemResult, NotificationRequest, NotificationType
+from app.services.notification_queries import digest_subject
+from app.services.templates import TemplateRegistry
+
+# (payload, future resolved with (notification_id, duplicate))
+_Item = Tuple[NotificationRequest, asyncio.Future]
+
+
+class _Group:
+    def __init__(self, deadline: float):
+        self.deadline = deadline
+        self.items: List[_Item] = []
+        self.keys: Dict[str, asyncio.Future] = {}
+
+
+class NotificationCoalescer:
+    """
+    Merges push notifications for the same user that arrive within `window` seconds of the
+    first one into a single digest notification (one row, one SSE event) that lists the
+    merged items in `details`. A group is written once its window closes or it reaches
+    `max_group` items; every group due at that moment goes into one create_notifications
+    transaction. Other notification types are not merged but share that transaction.
+
+    Callers wait for their group to be written and get the id of the row that holds their
+    notification, so a create takes up to `window` longer. Dedup keys of merged items are
+    checked against the table before writing and stored with the digest, along with each
+    item's subscription (in notification_digest_items), so a repeat of a merged item gets the
+    digest's id back and a subscription delete removes just that subscription's items. Must
+    be used from the event loop; `aclose()` writes whatever is pending and must be awaited
+    on shutdown. stats() may be called from any thread.
+    """
+
+    def __init__(self, service, logger, window: float = 2.0, max_group: int = 20, chunk_size: int = 500):
+        self.service = service
+        self.logger = logger
+        self.window = window
+        self.max_group = max_group
+        self.chunk_size = chunk_size
+        # Open groups by user; a constant window keeps them in deadline order
+        self._groups: "OrderedDict[str, _Group]" = OrderedDict()
+        self._ready: List[_Group] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        # Items in _groups and _ready, counted as they come and go because /metrics calls
+        # stats() from a worker thread while the loop changes the groups
+        self._pending = 0
+        self.submitted = 0
+        self.rows_written = 0
+        self.digests = 0
+
+    async def submit(self, payload: NotificationRequest) -> Tuple[int, bool]:
+        """Create a notification, possibly merged with others. Returns (notification_id, duplicate)."""
+        if self._closed:
+            raise RuntimeError("Notification coalescer is closed")
+        if payload.dedup_key is not None:
+            original_id = self.service.idempotency_keys.get(payload.dedup_key)
+            if original_id is not None:
+                return original_id, True
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self.submitted += 1
+
+        loop = asyncio.get_running_loop()
+        if payload.notification_type != NotificationType.push:
+            group = _Group(loop.time())
+            self._ready.append(group)
+            self._wakeup.set()
+        else:
+            group = self._groups.get(payload.user_id)
+            if group is None:
+                group = self._groups[payload.user_id] = _Group(loop.time() + self.window)
+                if len(self._groups) == 1:
+                    self._wakeup.set()
+            elif payload.dedup_key in group.keys:
+                # A redelivery while the original is still waiting in the same group
+                notification_id, _ = await asyncio.shield(group.keys[payload.dedup_key])
+                return notification_id, True
+
+        future = loop.create_future()
+        group.items.append((payload, future))
+        self._pending += 1
+        if payload.dedup_key is not None:
+            group.keys[payload.dedup_key] = future
+        if payload.notification_type == NotificationType.push and len(group.items) >= self.max_group:
+            del self._groups[payload.user_id]
+            self._ready.append(group)
+            self._wakeup.set()
+        return await asyncio.shield(future)
+
+    async def submit_many(self, payloads: List[NotificationRequest]) -> List[NotificationBatchItemResult]:
+        """submit() every payload; results in request order, each with its own id or error."""
+        outcomes = await asyncio.gather(*(self.submit(payload) for payload in payloads), return_exceptions=True)
+        return [
+            NotificationBatchItemResult(index=i, error=str(outcome)) if isinstance(outcome, Exception)
+            else NotificationBatchItemResult(index=i, id=outcome[0], duplicate=outcome[1])
+            for i, outcome in enumerate(outcomes)
+        ]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            timeout = None
+            if self._groups:
+                timeout = max(0.0, next(iter(self._groups.values())).deadline - loop.time())
+            if not self._ready:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+            self._wakeup.clear()
+            await self.flush(due_only=True)
+
+    async def flush(self, due_only: bool = False) -> int:
+        """Write ready groups and those whose window has closed (all open groups unless due_only)."""
+        now = asyncio.get_running_loop().time()
+        groups, self._ready = self._ready, []
+        while self._groups:
+            user_id, group = next(iter(self._groups.items()))
+            if due_only and group.deadline > now:
+                break
+            del self._groups[user_id]
+            groups.append(group)
+        if not groups:
+            return 0
+        self._pending -= sum(len(group.items) for group in groups)
+        try:
+            return await self._write(groups)
+        except Exception as e:
+            self.logger.error(f"Failed to write {len(groups)} coalesced notification groups: {str(e)}")
+            for group in groups:
+                for _, future in group.items:
+                    if not future.done():
+                        future.set_exception(RuntimeError(str(e)))
+            return 0
+
+    async def _write(self, groups: List[_Group]) -> int:
+        keys = [payload.dedup_key for group in groups for payload, _ in group.items if payload.dedup_key is not None]
+        existing = await self.service.find_by_dedup_keys(keys) if keys else {}
+
+        payloads: List[NotificationRequest] = []
+        dedup_keys: List[Optional[str]] = []
+        details: List[Optional[List[Dict[str, Any]]]] = []
+        merged_keys: List[Optional[List[Optional[str]]]] = []
+        owners: List[List[_Item]] = []
+        for group in groups:
+            items = []
+            for payload, future in group.items:
+                if payload.dedup_key in existing:
+                    if not future.done():
+                        future.set_result((existing[payload.dedup_key], True))
+                else:
+                    items.append((payload, future))
+            if not items:
+                continue
+            if len(items) == 1:
+                payloads.append(items[0][0])
+                dedup_keys.append(items[0][0].dedup_key)
+                details.append(None)
+                merged_keys.append(None)
+            else:
+                payloads.append(digest_request([payload for payload, _ in items]))
+                dedup_keys.append(None)
+                details.append([digest_item(payload, self.service.templates) for payload, _ in items])
+                merged_keys.append([payload.dedup_key for payload, _ in items])
+            owners.append(items)
+        if not payloads:
+            return 0
+
+        results = await self.service.create_notifications(
+            payloads, chunk_size=self.chunk_size, dedup_keys=dedup_keys, details=details, merged_keys=merged_keys
+        )
+        for result, items in zip(results, owners):
+            if result.error is None and not result.duplicate:
+                self.rows_written += 1
+                self.digests += len(items) > 1
+            for _, future in items:
+                if future.done():
+                    continue
+                if result.error is not None:
+                    future.set_exception(RuntimeError(result.error))
+                else:
+                    future.set_result((result.id, result.duplicate and len(items) == 1))
+        return len(payloads)
+
+    def stats(self) -> Dict[str, int]:
+        return {"submitted": self.submitted, "rows_written": self.rows_written, "digests": self.digests, "pending": self._pending}
+
+    async def aclose(self) -> None:
+        """Stop the background writer and write every pending group."""
+        self._closed = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+
+def digest_request(payloads: List[NotificationRequest]) -> NotificationRequest:
+    """
+    One push notification summarizing several for the same user, filed under the first one's
+    subscription; digest_item() records every item's own.
+    """
+    return NotificationRequest(
+        user_id=payloads[0].user_id,
+        subscription_id=payloads[0].subscription_id,
+        subject=digest_subject([payload.subject for payload in payloads]),
+        body="\n".join(payload.subject for payload in payloads),
+        notification_type=NotificationType.push
+    )
+
+
+def digest_item(payload: NotificationRequest, templates: TemplateRegistry) -> Dict[str, Any]:
+    message = payload.body
+    if payload.template_id is not None:
+        message = templates.render(payload.template_id, templates.pack(payload.template_id, payload.template_params))
+    return {
+        "subscription_id": payload.subscription_id,
+        "subject": payload.subject,
+        "message": message,
+        "metadata": payload.metadata,
+    }
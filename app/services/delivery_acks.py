@@ -0,0 +1,70 @@
+import asyncio
+from typing import Optional, Set
+
+
+class DeliveryAckBuffer:
+    """
+    Collects SSE delivery acknowledgements from every stream on this worker and writes them
+    as one bulk UPDATE, either once `max_batch` ids are pending or every `flush_interval` seconds.
+    Ids of a write that fails stay pending for the next one. `aclose()` waits for a write in
+    progress, flushes whatever is left and must be awaited on shutdown.
+    """
+
+    def __init__(self, service, logger, max_batch: int = 500, flush_interval: float = 0.25):
+        self.service = service
+        self.logger = logger
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._pending: Set[int] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+        self.flushes = 0
+        self.acked = 0
+
+    def ack(self, notification_id: int) -> None:
+        """Record a delivery. Must be called from the event loop; never blocks."""
+        if self._closed:
+            raise RuntimeError("Delivery ack buffer is closed")
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._pending.add(notification_id)
+        if len(self._pending) >= self.max_batch:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write all pending acks now. Returns the number of rows updated."""
+        if not self._pending:
+            return 0
+        notification_ids, self._pending = sorted(self._pending), set()
+        try:
+            updated = await self.service.mark_notifications_delivered(notification_ids)
+        except Exception as e:
+            # Retried with the next flush
+            self._pending.update(notification_ids)
+            self.logger.error(f"Failed to flush {len(notification_ids)} delivery acks: {str(e)}")
+            return 0
+        self.flushes += 1
+        self.acked += len(notification_ids)
+        return updated
+
+    async def aclose(self) -> None:
+        """Stop the background flusher and write any remaining acks."""
+        self._closed = True
+        if self._task is not None:
+            # Not cancelled: that could interrupt a flush whose ids are out of _pending
+            self._wakeup.set()
+            await self._task
+        await self.flush()
+        if self._pending:
+            self.logger.error(f"{len(self._pending)} delivery acks not written on shutdown")
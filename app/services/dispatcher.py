@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from starlette.concurrency import run_in_threadpool
+from app.services.orm_models import NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
+from app.services.providers import DeliveryOutcome
+from app.utils.metrics_registry import MetricsRegistry
+
+# Queue lag runs from seconds (idle dispatcher) to hours (provider outage)
+LAG_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0, 14400.0)
+
+RECIPIENT_FIELDS = {
+    ORMNotificationType.email: "recipient_email",
+    ORMNotificationType.sms: "recipient_phone",
+}
+
+
+class TokenBucket:
+    """Allows `rate` messages per second on average with bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float) -> None:
+        # Waiters are served in order, so one large batch can't be starved by small ones
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+class DeliveryDispatcher:
+    """
+    Background task that sends queued email and SMS notifications.
+
+    Each round claims up to claim_size due rows (leasing them for lease_seconds, so another
+    dispatcher or a restart picks them up only if this one dies), splits them into provider
+    batches of up to provider.max_batch, and sends at most `concurrency` batches at a time,
+    each provider held to its own rate limit. Outcomes are written back in one transaction:
+    sent rows are marked delivered in bulk, failed ones are re-queued with exponential
+    backoff until max_attempts and then marked failed.
+    """
+
+    def __init__(
+        self,
+        service,
+        logger,
+        providers: Dict[ORMNotificationType, Any],
+        rate_limits: Dict[ORMNotificationType, float],
+        registry: MetricsRegistry,
+        claim_size: int = 500,
+        lease_seconds: float = 300.0,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        backoff_base: float = 30.0,
+        backoff_max: float = 3600.0,
+        poll_interval: float = 1.0
+    ):
+        self.service = service
+        self.logger = logger
+        self.providers = providers
+        self.buckets = {
+            # Bursts of one batch: a full second's worth on top of the steady rate would overshoot
+            # a provider that counts over a sliding window
+            notification_type: TokenBucket(rate, providers[notification_type].max_batch)
+            for notification_type, rate in rate_limits.items()
+            if notification_type in providers and rate > 0
+        }
+        self.claim_size = claim_size
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_interval = poll_interval
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self.sent_total = registry.counter("dispatch_sent_total", "Notifications handed to a provider successfully.")
+        self.failed_total = registry.counter("dispatch_failed_total", "Notifications given up on and marked failed.")
+        self.retried_total = registry.counter("dispatch_retried_total", "Failed send attempts re-queued for retry.")
+        self.queue_lag = registry.histogram(
+            "dispatch_queue_lag_seconds", "Time from creation to first send attempt.", buckets=LAG_BUCKETS
+        )
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                claimed = await self.dispatch_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Claimed rows come back when their lease runs out
+                self.logger.error(f"Notification dispatch failed: {str(e)}")
+                claimed = 0
+            # Keep going while there is a backlog, poll when caught up
+            if claimed < self.claim_size:
+                await asyncio.sleep(self.poll_interval)
+
+    async def dispatch_once(self) -> int:
+        """Claim, send and record one round. Returns the number of notifications claimed."""
+        claimed = await self.service.claim_for_dispatch(list(self.providers), self.claim_size, self.lease_seconds)
+        if not claimed:
+            return 0
+        now = datetime.utcnow()
+        batches = []
+        outcomes: Dict[int, DeliveryOutcome] = {}
+        for notification_type, provider in self.providers.items():
+            messages = []
+            for message in claimed:
+                if message["notification_type"] != notification_type:
+                    continue
+                if message["attempts"] == 1 and message["created_at"] is not None:
+                    self.queue_lag.observe((now - message["created_at"]).total_seconds(), type=notification_type.value)
+                if not message[RECIPIENT_FIELDS[notification_type]]:
+                    outcomes[message["id"]] = DeliveryOutcome(False, "no recipient", retryable=False)
+                else:
+                    messages.append(message)
+            batches.extend(
+                (notification_type, messages[i:i + provider.max_batch])
+                for i in range(0, len(messages), provider.max_batch)
+            )
+        for batch_outcomes in await asyncio.gather(*(self._send(t, batch) for t, batch in batches)):
+            outcomes.update(batch_outcomes)
+        await self._record(claimed, outcomes)
+        return len(claimed)
+
+    async def _send(self, notification_type: ORMNotificationType, messages: List[Dict[str, Any]]) -> Dict[int, DeliveryOutcome]:
+        async with self._semaphore:
+            if notification_type in self.buckets:
+                await self.buckets[notification_type].acquire(len(messages))
+            provider = self.providers[notification_type]
+            try:
+                results = await run_in_threadpool(provider.send, messages)
+            except Exception as e:
+                results = [DeliveryOutcome(False, f"{provider.name}: {str(e)}")] * len(messages)
+        return {message["id"]: outcome for message, outcome in zip(messages, results)}
+
+    async def _record(self, claimed: List[Dict[str, Any]], outcomes: Dict[int, DeliveryOutcome]) -> None:
+        now = datetime.utcnow()
+        delivered_ids, failed_attempts = [], []
+        for message in claimed:
+            # A provider that returns fewer results than messages leaves the rest to retry
+            outcome = outcomes.get(message["id"], DeliveryOutcome(False, "no result from provider"))
+            labels = {"type": message["notification_type"].value}
+            if outcome.ok:
+                delivered_ids.append(message["id"])
+                self.sent_total.inc(**labels)
+                continue
+            if outcome.retryable and message["attempts"] < self.max_attempts:
+                status, next_attempt_at = ORMNotificationStatus.queued, now + timedelta(seconds=self.backoff(message["attempts"]))
+                self.retried_total.inc(**labels)
+            else:
+                status, next_attempt_at = ORMNotificationStatus.failed, None
+                self.failed_total.inc(**labels)
+            failed_attempts.append({
+                "b_id": message["id"],
+                "b_status": status,
+                "b_next_attempt_at": next_attempt_at,
+                "b_error": (outcome.error or "")[:500],
+            })
+        await self.service.complete_dispatch(delivered_ids, failed_attempts)
+
+    def backoff(self, attempts: int) -> float:
+        """Seconds before retry number `attempts`, doubling each time with jitter so failed batches don't retry in lockstep."""
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (attempts - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
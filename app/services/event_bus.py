@@ -0,0 +1,351 @@
+import abc
+import asyncio
+import importlib
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import orjson
+from starlette.concurrency import run_in_threadpool
+from app.models.notification import NotificationRead
+from app.services.notification_hub import NotificationHub
+
+
+class EventBus(NotificationHub, abc.ABC):
+    """
+    A NotificationHub whose events also reach the hubs of other processes, for running more
+    than one worker (or VM). Local streams subscribe exactly as with the in-process hub;
+    `publish` delivers locally and forwards the notification to every peer, which hands it
+    to its own streams.
+
+    Peers are also told which users changed (`users_changed`, hooked to UserVersions.bump)
+    so they can drop per-process cached state for them via `on_remote_change`. Subclasses
+    provide the transport: `_send`, `start` and `stop`, and feed what they receive to
+    `_receive` on the event loop.
+
+    publish and users_changed run wherever the service does, which is the event loop with
+    DB_ASYNC, so they only queue the message (up to `send_queue_size` of them); a sender
+    thread hands them to `_send`, which may block. When the queue is full the message is
+    dropped and counted, and peers see the gap like any other lost event.
+
+    Transports may drop events, so each process numbers what it sends and every
+    `sync_interval` seconds sends its latest number, which also exposes a loss at the end.
+    A receiver that finds a gap can't tell which users it missed changes for: it calls
+    `on_lost_changes` to drop all per-user cached state, and resets its replay buffer so
+    its streams and resumes catch up from the DB.
+    """
+
+    def __init__(
+        self,
+        logger,
+        buffer_size: int = 100,
+        on_remote_change: Optional[Callable[[List[str]], None]] = None,
+        replay_size: int = 0,
+        replay_max_users: int = 10000,
+        settle_seconds: float = 5.0,
+        on_lost_changes: Optional[Callable[[], None]] = None,
+        sync_interval: float = 1.0,
+        send_queue_size: int = 1000
+    ):
+        super().__init__(
+            buffer_size=buffer_size, replay_size=replay_size, replay_max_users=replay_max_users,
+            settle_seconds=settle_seconds
+        )
+        self.logger = logger
+        self.on_remote_change = on_remote_change
+        self.on_lost_changes = on_lost_changes
+        self.sync_interval = sync_interval
+        self.origin = uuid.uuid4().hex
+        self._sequence = 0
+        self._sequence_lock = threading.Lock()
+        # Highest sequence number received from each origin
+        self._received_through: Dict[str, int] = {}
+        self._sync_task: Optional[asyncio.Task] = None
+        # Messages for the sender thread; None tells it to stop
+        self._outbox: "queue.Queue[Optional[bytes]]" = queue.Queue(maxsize=send_queue_size)
+        self._sender: Optional[threading.Thread] = None
+        self.sent = 0
+        self.received = 0
+        self.lost = 0
+        self.dropped = 0
+
+    def publish(self, user_id: str, notification: NotificationRead) -> int:
+        reached = super().publish(user_id, notification)
+        self._emit({"kind": "notification", "user_id": user_id, "notification": notification.model_dump(mode="json")})
+        return reached
+
+    def users_changed(self, user_ids: Iterable[str]) -> None:
+        user_ids = list(user_ids)
+        if user_ids:
+            self._emit({"kind": "changed", "user_ids": user_ids})
+
+    def _emit(self, event: Dict[str, Any]) -> None:
+        with self._sequence_lock:
+            self._sequence += 1
+            # Numbered and queued under the lock so peers receive them in order
+            self._enqueue(orjson.dumps({"origin": self.origin, "seq": self._sequence, **event}))
+
+    def _sync(self) -> None:
+        with self._sequence_lock:
+            if self._sequence:
+                self._enqueue(orjson.dumps({"origin": self.origin, "seq": self._sequence, "kind": "sync"}))
+
+    def _enqueue(self, data: bytes) -> None:
+        try:
+            self._outbox.put_nowait(data)
+        except queue.Full:
+            self.dropped += 1
+            self.logger.warning("Event bus send queue is full, dropped an event")
+
+    def _send_queued(self) -> None:
+        # The sender thread
+        while True:
+            data = self._outbox.get()
+            if data is None:
+                return
+            try:
+                self._send(data)
+            except Exception as e:
+                self.logger.error(f"Failed to send event bus message: {str(e)}")
+
+    def _receive(self, data: bytes) -> None:
+        try:
+            event = orjson.loads(data)
+            if event["origin"] == self.origin:
+                return
+            self._check_sequence(event["origin"], event["seq"], counted=event["kind"] != "sync")
+            if event["kind"] == "notification":
+                self.received += 1
+                NotificationHub.publish(self, event["user_id"], NotificationRead.model_validate(event["notification"]))
+            elif event["kind"] == "changed":
+                self.received += 1
+                if self.on_remote_change is not None:
+                    self.on_remote_change(event["user_ids"])
+        except Exception as e:
+            self.logger.error(f"Dropping malformed event bus message: {str(e)}")
+
+    def _check_sequence(self, origin: str, sequence: int, counted: bool) -> None:
+        # A sync carries the number of the origin's last event, which we should already have
+        expected = self._received_through.get(origin, 0) + (1 if counted else 0)
+        if sequence > expected:
+            # Also the case for the first event from a peer that sent before it knew about us
+            self.lost += 1
+            self.logger.warning(
+                f"Event bus lost {sequence - expected} events from {origin[:8]}; "
+                f"dropping cached per-user state and catching streams up from the DB"
+            )
+            if self.on_lost_changes is not None:
+                self.on_lost_changes()
+            self.reset_replay()
+        self._received_through[origin] = max(self._received_through.get(origin, 0), sequence)
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            self._sync()
+
+    def _start_sending(self) -> None:
+        # For subclasses' start(), once _send works
+        self._sender = threading.Thread(target=self._send_queued, name="event-bus-sender", daemon=True)
+        self._sender.start()
+        self._sync_task = asyncio.get_running_loop().create_task(self._sync_periodically())
+
+    async def _stop_sending(self) -> None:
+        # For subclasses' stop(), before _send stops working: sends what is queued first
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            try:
+                await self._sync_task
+            except asyncio.CancelledError:
+                pass
+            self._sync_task = None
+        if self._sender is not None:
+            await run_in_threadpool(self._outbox.put, None)
+            await run_in_threadpool(self._sender.join)
+            self._sender = None
+
+    @abc.abstractmethod
+    def _send(self, data: bytes) -> None:
+        """Send one message to every peer. Called from the sender thread only; may block."""
+
+    @abc.abstractmethod
+    async def start(self) -> None:
+        """Start receiving (and call _start_sending)."""
+
+    @abc.abstractmethod
+    async def stop(self) -> None:
+        """Stop receiving (and await _stop_sending)."""
+
+    def stats(self):
+        return {
+            "sent": self.sent, "received": self.received, "lost": self.lost, "dropped": self.dropped,
+            "queued": self._outbox.qsize(), "connections": self.connection_count()
+        }
+
+
+class UnixSocketEventBus(EventBus):
+    """
+    Event bus between worker processes on one machine. Every process binds a Unix datagram
+    socket in `socket_dir` and sends each event to all the other sockets there, so workers
+    find each other without a coordinator. Sockets of dead workers refuse datagrams and are
+    removed; the directory listing is re-read every `peer_refresh` seconds to see new workers.
+    The sender thread waits up to `send_timeout` seconds for room in a busy peer's queue (Linux
+    queues only a few datagrams per socket by default); a peer that stays full drops the event
+    (logged), which it notices from the sequence numbers.
+    """
+
+    def __init__(
+        self,
+        socket_dir: str,
+        logger,
+        buffer_size: int = 100,
+        on_remote_change: Optional[Callable[[List[str]], None]] = None,
+        peer_refresh: float = 1.0,
+        send_timeout: float = 0.05,
+        replay_size: int = 0,
+        replay_max_users: int = 10000,
+        settle_seconds: float = 5.0,
+        on_lost_changes: Optional[Callable[[], None]] = None,
+        sync_interval: float = 1.0,
+        send_queue_size: int = 1000
+    ):
+        super().__init__(
+            logger, buffer_size=buffer_size, on_remote_change=on_remote_change,
+            replay_size=replay_size, replay_max_users=replay_max_users, settle_seconds=settle_seconds,
+            on_lost_changes=on_lost_changes, sync_interval=sync_interval, send_queue_size=send_queue_size
+        )
+        self.socket_dir = socket_dir
+        self.path = os.path.join(socket_dir, f"{os.getpid()}-{self.origin[:8]}.sock")
+        self.peer_refresh = peer_refresh
+        self.send_timeout = send_timeout
+        self._sock: Optional[socket.socket] = None
+        # Sends happen on the sender thread and may wait, so they get their own blocking socket
+        self._send_sock: Optional[socket.socket] = None
+        self._peers: List[str] = []
+        self._peers_read_at = 0.0
+        self._peers_lock = threading.Lock()
+
+    async def start(self) -> None:
+        os.makedirs(self.socket_dir, exist_ok=True)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._sock.setblocking(False)
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._send_sock.settimeout(self.send_timeout)
+        asyncio.get_running_loop().add_reader(self._sock.fileno(), self._on_readable)
+        self._start_sending()
+
+    def _on_readable(self) -> None:
+        while True:
+            try:
+                data = self._sock.recv(1 << 20)
+            except (BlockingIOError, InterruptedError):
+                return
+            self._receive(data)
+
+    def _current_peers(self) -> List[str]:
+        with self._peers_lock:
+            if time.monotonic() - self._peers_read_at > self.peer_refresh:
+                self._peers = [
+                    entry.path for entry in os.scandir(self.socket_dir)
+                    if entry.name.endswith(".sock") and entry.path != self.path
+                ]
+                self._peers_read_at = time.monotonic()
+            return list(self._peers)
+
+    def _forget(self, path: str) -> None:
+        with self._peers_lock:
+            if path in self._peers:
+                self._peers.remove(path)
+
+    def _send(self, data: bytes) -> None:
+        send_sock = self._send_sock
+        if send_sock is None:
+            return
+        for path in self._current_peers():
+            try:
+                send_sock.sendto(data, path)
+                self.sent += 1
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker behind it is gone
+                self._forget(path)
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            except (socket.timeout, BlockingIOError):
+                self.logger.warning(f"Event bus peer {path} is not keeping up, dropped an event")
+            except OSError as e:
+                self.logger.error(f"Failed to send event bus message to {path}: {str(e)}")
+
+    async def stop(self) -> None:
+        await self._stop_sending()
+        if self._sock is None:
+            return
+        asyncio.get_running_loop().remove_reader(self._sock.fileno())
+        self._sock.close()
+        self._send_sock.close()
+        self._sock = self._send_sock = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class BrokerEventBus(EventBus):
+    """
+    Event bus over an external broker (Redis pub/sub, NATS, Google Pub/Sub...), for workers
+    on several machines. The adapter provides:
+
+        publish(data: bytes) -> None            called from the bus's sender thread
+        async start(on_message) -> None         call on_message(data) on the event loop
+        async stop() -> None
+
+    Every process receives its own events back from most brokers; they are skipped by origin.
+    """
+
+    def __init__(
+        self,
+        adapter,
+        logger,
+        buffer_size: int = 100,
+        on_remote_change: Optional[Callable[[List[str]], None]] = None,
+        replay_size: int = 0,
+        replay_max_users: int = 10000,
+        settle_seconds: float = 5.0,
+        on_lost_changes: Optional[Callable[[], None]] = None,
+        sync_interval: float = 1.0,
+        send_queue_size: int = 1000
+    ):
+        super().__init__(
+            logger, buffer_size=buffer_size, on_remote_change=on_remote_change,
+            replay_size=replay_size, replay_max_users=replay_max_users, settle_seconds=settle_seconds,
+            on_lost_changes=on_lost_changes, sync_interval=sync_interval, send_queue_size=send_queue_size
+        )
+        self.adapter = adapter
+
+    def _send(self, data: bytes) -> None:
+        try:
+            self.adapter.publish(data)
+            self.sent += 1
+        except Exception as e:
+            self.logger.error(f"Failed to publish event bus message: {str(e)}")
+
+    async def start(self) -> None:
+        await self.adapter.start(self._receive)
+        self._start_sending()
+
+    async def stop(self) -> None:
+        await self._stop_sending()
+        await self.adapter.stop()
+
+
+def load_broker_adapter(spec: str, settings):
+    """Build the adapter named by "package.module:factory"; the factory is called with the settings."""
+    module_name, _, factory_name = spec.partition(":")
+    if not factory_name:
+        raise ValueError(f"Invalid broker adapter {spec!r}, expected 'package.module:factory'")
+    return getattr(importlib.import_module(module_name), factory_name)(settings)
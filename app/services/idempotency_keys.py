@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+class IdempotencyKeyCache:
+    """
+    Bounded LRU of recently used dedup keys and the id of the notification each one created,
+    so hot duplicates (Pub/Sub redeliveries, client retries) are answered without a DB round
+    trip. The unique index on dedup_key stays the source of truth: a key that is not cached
+    only costs the INSERT the index then rejects. Keys are only added after their row is
+    committed, and deletes forget the keys of the rows they remove, so a key whose row is gone
+    creates it again like it would in the database.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+        # notification_id -> its cached keys (a digest has one per merged item)
+        self._keys: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[int]:
+        with self._lock:
+            notification_id = self._ids.get(key)
+            if notification_id is None:
+                self.misses += 1
+                return None
+            self._ids.move_to_end(key)
+            self.hits += 1
+            return notification_id
+
+    def put_many(self, items: Iterable[Tuple[str, int]]) -> None:
+        if not self.max_keys:
+            return
+        with self._lock:
+            for key, notification_id in items:
+                self._unlink(key, self._ids.get(key))
+                self._ids[key] = notification_id
+                self._ids.move_to_end(key)
+                self._keys.setdefault(notification_id, set()).add(key)
+            while len(self._ids) > self.max_keys:
+                key, notification_id = self._ids.popitem(last=False)
+                self._unlink(key, notification_id)
+
+    def forget(self, notification_ids: Iterable[int]) -> None:
+        """Drop the keys of deleted notifications."""
+        if not self.max_keys:
+            return
+        with self._lock:
+            for notification_id in notification_ids:
+                for key in self._keys.pop(notification_id, ()):
+                    del self._ids[key]
+
+    def _unlink(self, key: str, notification_id: Optional[int]) -> None:
+        keys = self._keys.get(notification_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[notification_id]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"keys": len(self._ids), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,193 @@
+import asyncio
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+from starlette.concurrency import run_in_threadpool
+from app.models.notification import NotificationRequest
+
+
+class IngestionQueue:
+    """
+    Durable local queue of accepted notification requests that have not been written to the
+    notifications table yet. Backed by an append-only SQLite table in WAL mode, so an entry
+    survives a crash once append() returns. Each entry carries a unique ingest key that is
+    stored as the row's dedup_key, which makes replaying an entry after a crash idempotent.
+    Entries the database rejects are moved to the `failed` table with the error, where they
+    stay for inspection (or retry_failed()).
+    """
+
+    def __init__(self, path: str, synchronous: str = "NORMAL"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL survives a process crash; FULL also survives power loss at the cost of an fsync per append
+        self._conn.execute(f"PRAGMA synchronous={synchronous}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " ingest_key TEXT NOT NULL UNIQUE,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS failed ("
+            " seq INTEGER PRIMARY KEY,"
+            " ingest_key TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " enqueued_at REAL NOT NULL,"
+            " error TEXT NOT NULL,"
+            " failed_at REAL NOT NULL)"
+        )
+
+    def append(self, payload: NotificationRequest) -> str:
+        """
+        Persist a validated request and return its ingest key: the request's own dedup_key if
+        it has one (a repeat that is still pending is not queued twice), else a random one.
+        """
+        ingest_key = payload.dedup_key or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO pending (ingest_key, payload, enqueued_at) VALUES (?, ?, ?)",
+                (ingest_key, payload.model_dump_json(), time.time())
+            )
+        return ingest_key
+
+    def peek(self, limit: int) -> List[Tuple[int, str, NotificationRequest]]:
+        """Oldest entries first, without removing them."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, ingest_key, payload FROM pending ORDER BY seq LIMIT ?", (limit,)
+            ).fetchall()
+        return [(seq, key, NotificationRequest.model_validate_json(payload)) for seq, key, payload in rows]
+
+    def remove_through(self, seq: int, failed: Optional[Dict[int, str]] = None) -> None:
+        """
+        Drop every entry up to and including seq, once they are safely in the database.
+        Entries in failed (seq -> error) are moved to the failed table instead, in the same
+        transaction.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if failed:
+                    now = time.time()
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO failed (seq, ingest_key, payload, enqueued_at, error, failed_at)"
+                        " SELECT seq, ingest_key, payload, enqueued_at, ?, ? FROM pending WHERE seq = ?",
+                        [(error, now, failed_seq) for failed_seq, error in failed.items()]
+                    )
+                self._conn.execute("DELETE FROM pending WHERE seq <= ?", (seq,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def retry_failed(self) -> int:
+        """Move every failed entry back to the end of the queue. Returns how many were moved."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                moved = self._conn.execute(
+                    "INSERT OR IGNORE INTO pending (ingest_key, payload, enqueued_at)"
+                    " SELECT ingest_key, payload, enqueued_at FROM failed ORDER BY seq"
+                ).rowcount
+                self._conn.execute("DELETE FROM failed")
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return moved
+
+    def depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def failed_depth(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM failed").fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class IngestionFlusher:
+    """
+    Background task that drains the ingestion queue into the notifications table in group
+    commits: everything pending (up to max_items) goes in one create_notifications transaction.
+    Entries left over from a previous process are replayed on start; those already written
+    before it stopped come back as duplicates of their rows. Entries the database rejects
+    are moved to the queue's failed table.
+    """
+
+    def __init__(self, queue: IngestionQueue, service, logger, max_items: int = 500, interval: float = 0.05):
+        self.queue = queue
+        self.service = service
+        self.logger = logger
+        self.max_items = max_items
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        depth = self.queue.depth()
+        if depth:
+            self.logger.info(f"Replaying {depth} unflushed notifications from {self.queue.path}")
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                if await self.flush() < self.max_items:
+                    await asyncio.sleep(self.interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Entries stay queued and are retried on the next pass
+                self.logger.error(f"Ingestion flush failed: {str(e)}")
+                await asyncio.sleep(max(self.interval, 1.0))
+
+    async def flush(self) -> int:
+        """Write one group of pending entries. Returns how many entries were flushed."""
+        entries = await run_in_threadpool(self.queue.peek, self.max_items)
+        if not entries:
+            return 0
+        results = await self.service.create_notifications(
+            [payload for _, _, payload in entries],
+            dedup_keys=[key for _, key, _ in entries]
+        )
+        failed = {}
+        for result in results:
+            if result.error is not None:
+                # The request was already accepted; keep it for inspection rather than lose it
+                seq, ingest_key, _ = entries[result.index]
+                failed[seq] = result.error
+                self.logger.error(f"Queued notification {ingest_key} failed, moved to the failed table: {result.error}")
+        await run_in_threadpool(self.queue.remove_through, entries[-1][0], failed)
+        self.flushed += len(entries) - len(failed)
+        self.failed += len(failed)
+        return len(entries)
+
+    def stats(self):
+        return {
+            "flushed": self.flushed, "failed": self.failed,
+            "pending": self.queue.depth(), "dead_letters": self.queue.failed_depth()
+        }
+
+    async def stop(self) -> None:
+        """Stop the background task and try to drain what is left."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        try:
+            while await self.flush():
+                pass
+        except Exception as e:
+            self.logger.error(f"Ingestion queue not fully drained on shutdown, will replay on start: {str(e)}")
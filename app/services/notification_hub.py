@@ -0,0 +1,274 @@
+import asyncio
+import bisect
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+from app.models.notification import NotificationRead
+
+
+class HubSubscription:
+    """
+    A single SSE connection's view of the hub.
+    Holds a bounded queue on the subscriber's event loop; if the queue fills up
+    the backlog is dropped and `overflowed` is set so the stream can catch up from the DB.
+
+    `watermark` is the hub's settled id (see NotificationHub) as of the last notification
+    taken from the queue, or as of subscribing: every notification of the user up to it was
+    published before that one, so it has been taken from the queue already (or was published
+    before the stream subscribed).
+    """
+
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop, maxsize: int, watermark: Optional[int]):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+        self.watermark = watermark
+
+    def _put(self, notification: NotificationRead, watermark: Optional[int]) -> None:
+        # Always runs on self.loop
+        try:
+            self.queue.put_nowait((notification, watermark))
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.overflowed = True
+
+    def _resync(self) -> None:
+        # Always runs on self.loop; a None entry wakes get() so the stream sees the flag now
+        self.overflowed = True
+        try:
+            self.queue.put_nowait((None, self.watermark))
+        except asyncio.QueueFull:
+            pass
+
+    async def get(self, timeout: float) -> Optional[NotificationRead]:
+        """Wait for the next notification, returning None on timeout."""
+        try:
+            notification, self.watermark = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        return notification
+
+
+class DeliveredIds:
+    """
+    The ids a stream sent most recently, so one that reaches it twice (from a catch-up and
+    from its queue) is sent once. Bounded; ids older than the last `size` are forgotten.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._ids: Set[int] = set()
+        self._order: Deque[int] = deque()
+
+    def add(self, notification_id: int) -> bool:
+        """Remember notification_id; False if it was sent already."""
+        if notification_id in self._ids:
+            return False
+        self._ids.add(notification_id)
+        self._order.append(notification_id)
+        if len(self._order) > self.size:
+            self._ids.discard(self._order.popleft())
+        return True
+
+
+class _ReplayRing:
+    def __init__(self, complete_after: int):
+        # Every notification of the user with a higher id is in `notifications`
+        self.complete_after = complete_after
+        self.notifications: List[NotificationRead] = []
+        self.ids: List[int] = []
+
+
+class NotificationHub:
+    """
+    In-process fan-out of newly created notifications to SSE streams, keyed by user_id.
+    `publish` is thread-safe so it can be called from sync service code running in the threadpool.
+
+    With `replay_size` > 0 the hub also keeps the last `replay_size` notifications published for
+    each of up to `replay_max_users` users, so a reconnecting stream can be sent what it missed
+    (`replay`) without a query. This assumes every notification is published to this hub, i.e.
+    a single worker or an event bus. Once `start_replay(after_id)` has been called with the
+    highest id in the table, users without buffered notifications are known to have nothing
+    newer than that id.
+
+    Inserts commit, and so are published, slightly out of id order, so the highest id published
+    doesn't mean every lower one has been. From start_replay on, the hub also tracks a settled
+    id (`replay_watermark`): every id up to it has been published, or was skipped for longer
+    than `settle_seconds` (an insert that rolled back, or an event the bus lost). Streams resume
+    their clients from it rather than from the last notification id they sent.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = 100,
+        replay_size: int = 0,
+        replay_max_users: int = 10000,
+        settle_seconds: float = 5.0
+    ):
+        self.buffer_size = buffer_size
+        self.replay_size = replay_size
+        self.replay_max_users = replay_max_users
+        self.settle_seconds = settle_seconds
+        self._subscribers: Dict[str, Set[HubSubscription]] = {}
+        self._lock = threading.Lock()
+        self._rings: "OrderedDict[str, _ReplayRing]" = OrderedDict()
+        # Users without a ring have no notification above this id; None until start_replay
+        self._replay_floor: Optional[int] = None
+        # Settled id; published ids above it (sorted), and (publish time, id) in publish order
+        self._watermark: Optional[int] = None
+        self._unsettled: List[int] = []
+        self._published: Deque[Tuple[float, int]] = deque()
+        self.replay_hits = 0
+        self.replay_misses = 0
+
+    def subscribe(self, user_id: str) -> HubSubscription:
+        """Register a stream for user_id. Must be called from the stream's event loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            subscription = HubSubscription(user_id, loop, self.buffer_size, self._settle(time.monotonic()))
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: HubSubscription) -> None:
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.user_id)
+            if subscriptions is None:
+                return
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, notification: NotificationRead) -> int:
+        """Push a notification to every stream of user_id. Returns the number of streams reached."""
+        closed = []
+        with self._lock:
+            watermark = self._note_published(notification.id)
+            if self.replay_size > 0:
+                self._record(user_id, notification)
+            subscriptions = list(self._subscribers.get(user_id, ()))
+            # Queued under the lock, so a stream gets notifications in the order the watermark
+            # saw them published
+            for subscription in subscriptions:
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._put, notification, watermark)
+                except RuntimeError:
+                    # Loop already closed; the stream is going away
+                    closed.append(subscription)
+        for subscription in closed:
+            self.unsubscribe(subscription)
+        return len(subscriptions)
+
+    def connection_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def start_replay(self, after_id: int) -> None:
+        """Declare that every notification with an id above after_id is published to this hub."""
+        with self._lock:
+            self._replay_floor = after_id if self._replay_floor is None else max(self._replay_floor, after_id)
+            if self._watermark is None:
+                # Only the first call; later ones (after reset_replay) may race inserts still committing
+                self._watermark = after_id
+                del self._unsettled[:bisect.bisect_right(self._unsettled, self._watermark)]
+
+    def replay(self, user_id: str, after_id: int) -> Optional[List[NotificationRead]]:
+        """
+        Notifications of user_id with an id above after_id, oldest first, or None if the
+        buffer can't tell (the stream then has to catch up from the DB).
+        """
+        with self._lock:
+            ring = self._rings.get(user_id)
+            if ring is None:
+                if self.replay_size > 0 and self._replay_floor is not None and after_id >= self._replay_floor:
+                    self.replay_hits += 1
+                    return []
+                self.replay_misses += 1
+                return None
+            if after_id < ring.complete_after:
+                self.replay_misses += 1
+                return None
+            self.replay_hits += 1
+            return ring.notifications[bisect.bisect_right(ring.ids, after_id):]
+
+    def replay_watermark(self) -> Optional[int]:
+        """
+        The settled id: every notification up to it has been published (or given up on), so a
+        query or replay for ids above it taken from now on returns all the rest. None before
+        start_replay.
+        """
+        with self._lock:
+            return self._settle(time.monotonic())
+
+    def reset_replay(self) -> None:
+        """
+        Forget the replay buffer and send every stream to the DB to catch up, for when some
+        notifications may never have reached the hub. Resumes are answered from the DB until
+        start_replay is called again.
+        """
+        with self._lock:
+            self._rings.clear()
+            self._replay_floor = None
+            subscriptions = [s for user_subscriptions in self._subscribers.values() for s in user_subscriptions]
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._resync)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def _note_published(self, notification_id: int) -> Optional[int]:
+        # Caller holds self._lock; returns the settled id
+        now = time.monotonic()
+        if self._watermark is not None and notification_id > self._watermark:
+            position = bisect.bisect_left(self._unsettled, notification_id)
+            if position == len(self._unsettled) or self._unsettled[position] != notification_id:
+                self._unsettled.insert(position, notification_id)
+                self._published.append((now, notification_id))
+        return self._settle(now)
+
+    def _settle(self, now: float) -> Optional[int]:
+        # Caller holds self._lock. Moves the watermark over published ids while the next one is
+        # published, or the gap below it has been open for settle_seconds: since the earliest
+        # publish of an id above the watermark
+        while self._unsettled:
+            while self._published[0][1] <= self._watermark:
+                self._published.popleft()
+            first = self._unsettled[0]
+            if first != self._watermark + 1 and now - self._published[0][0] < self.settle_seconds:
+                break
+            self._watermark = self._unsettled.pop(0)
+        return self._watermark
+
+    def _record(self, user_id: str, notification: NotificationRead) -> None:
+        # Caller holds self._lock
+        ring = self._rings.get(user_id)
+        if ring is None:
+            floor = self._replay_floor
+            ring = self._rings[user_id] = _ReplayRing(notification.id - 1 if floor is None else floor)
+            if len(self._rings) > self.replay_max_users:
+                _, dropped = self._rings.popitem(last=False)
+                # Users without a ring now include one with notifications above the floor
+                if dropped.ids and self._replay_floor is not None:
+                    self._replay_floor = max(self._replay_floor, dropped.ids[-1])
+        else:
+            self._rings.move_to_end(user_id)
+        # Commits can publish slightly out of id order; keep the ring sorted
+        position = bisect.bisect_right(ring.ids, notification.id)
+        if position and ring.ids[position - 1] == notification.id:
+            return
+        ring.ids.insert(position, notification.id)
+        ring.notifications.insert(position, notification)
+        if len(ring.ids) > self.replay_size:
+            ring.complete_after = max(ring.complete_after, ring.ids.pop(0))
+            ring.notifications.pop(0)
+
+    def replay_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self._rings),
+                "notifications": sum(len(ring.ids) for ring in self._rings.values()),
+                "hits": self.replay_hits,
+                "misses": self.replay_misses,
+            }
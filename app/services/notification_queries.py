@@ -0,0 +1,390 @@
+from sqlalchemy import and_, bindparam, delete, desc, func, insert, or_, select, union_all, update
+from sqlalchemy.engine import Connection, Dialect, Result
+from sqlalchemy.sql import CompoundSelect, Delete, Select, Update
+from app.models.notification import NotificationRequest, NotificationRead, NotificationStatus, NotificationType
+from app.services.orm_models import DigestItemORM, NotificationORM, NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
+from app.services.templates import TemplateRegistry
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from datetime import datetime
+
+# SQLAlchemy statements shared by the sync and async notification services,
+# so both execute exactly the same SQL.
+
+def to_notification_read(n: NotificationORM, templates: TemplateRegistry) -> NotificationRead:
+    return NotificationRead(
+        id=n.notification_id,
+        subscription_id=n.subscription_id,
+        user_id=n.user_id,
+        notification_type=NotificationType(n.notification_type.value),
+        subject=n.subject,
+        message=templates.message(n.template_id, n.template_params, n.message),
+        status=NotificationStatus(n.status.value),
+        read_at=n.read_at,
+        delivered_at=n.delivered_at,
+        created_at=n.created_at,
+        details=n.details,
+        metadata=n.meta
+    )
+
+def stored_now() -> datetime:
+    """
+    The current UTC time as a DATETIME column stores it. MySQL keeps whole seconds (rounding
+    any fraction), so timestamps that are written and also cached or published are truncated
+    first; otherwise the in-memory copy would differ from every later read of the row.
+    """
+    return datetime.utcnow().replace(microsecond=0)
+
+def initial_status(payload: NotificationRequest) -> ORMNotificationStatus:
+    # Push notifications are delivered via SSE, so they count as sent once stored
+    if payload.notification_type == NotificationType.push:
+        return ORMNotificationStatus.sent
+    return ORMNotificationStatus.queued
+
+def notification_values(
+    payload: NotificationRequest,
+    created_at: datetime,
+    templates: TemplateRegistry,
+    dedup_key: Optional[str] = None,
+    details: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Column values for a bulk INSERT of a notification request (with a validated template, if any)."""
+    templated = payload.template_id is not None
+    return {
+        "subscription_id": payload.subscription_id,
+        "user_id": payload.user_id,
+        "notification_type": ORMNotificationType(payload.notification_type.value),
+        "subject": payload.subject,
+        "message": payload.body,
+        "template_id": payload.template_id,
+        "template_params": templates.pack(payload.template_id, payload.template_params) if templated else None,
+        "meta": payload.metadata,
+        "status": initial_status(payload),
+        "recipient_email": payload.recipient_email,
+        "device_token": payload.device_token,
+        "recipient_phone": payload.recipient_phone,
+        "created_at": created_at,
+        "updated_at": created_at,
+        "dedup_key": dedup_key,
+        "details": details,
+    }
+
+def values_to_notification_read(notification_id: int, values: Dict[str, Any], templates: TemplateRegistry) -> NotificationRead:
+    return NotificationRead(
+        id=notification_id,
+        subscription_id=values["subscription_id"],
+        user_id=values["user_id"],
+        notification_type=NotificationType(values["notification_type"].value),
+        subject=values["subject"],
+        message=templates.message(values["template_id"], values["template_params"], values["message"]),
+        status=NotificationStatus(values["status"].value),
+        created_at=values["created_at"],
+        details=values["details"],
+        metadata=values["meta"]
+    )
+
+# Dialects whose batched INSERT ... RETURNING keeps parameter order for an autoincrement key
+# (a sentinel-ordered multi-row INSERT). SQLite and MariaDB would fall back to one INSERT per
+# row, and MySQL has no RETURNING, so those get a plain multi-row INSERT and derive the ids
+ORDERED_RETURNING_DIALECTS = {"postgresql", "mssql"}
+
+def bulk_insert_stmt(dialect: Dialect, rows: List[Dict[str, Any]]):
+    """
+    One multi-row INSERT for a chunk of notification_values() rows.
+    Returns (statement, parameters) to pass to session.execute.
+    """
+    if dialect.name in ORDERED_RETURNING_DIALECTS:
+        # insertmanyvalues batches this into multi-row INSERT ... RETURNING, ids in parameter order
+        stmt = insert(NotificationORM).returning(NotificationORM.notification_id, sort_by_parameter_order=True)
+        return stmt, rows
+    return insert(NotificationORM).values(rows), None
+
+def bulk_inserted_ids(connection: Connection, result: Result, count: int) -> List[int]:
+    """Ids of the rows a bulk_insert_stmt() INSERT on connection stored, in parameter order."""
+    if connection.dialect.name in ORDERED_RETURNING_DIALECTS:
+        return list(result.scalars())
+    if connection.dialect.name == "sqlite":
+        # lastrowid is the statement's last id. One statement holds the write lock throughout
+        # and numbers its rows max(rowid) + 1 onwards, so they are consecutive
+        return list(range(result.lastrowid - count + 1, result.lastrowid + 1))
+    # MySQL: LAST_INSERT_ID() is the first id of the statement. A multi-row INSERT ... VALUES
+    # knows its row count up front, so InnoDB reserves all of its ids in one allocation (in
+    # every innodb_autoinc_lock_mode); they are auto_increment_increment apart, which is not
+    # 1 on multi-primary setups that interleave their ids
+    step = auto_increment_step(connection)
+    return list(range(result.lastrowid, result.lastrowid + count * step, step))
+
+def auto_increment_step(connection: Connection) -> int:
+    """MySQL's @@auto_increment_increment, read once per pooled DBAPI connection."""
+    step = connection.info.get("auto_increment_increment")
+    if step is None:
+        step = connection.exec_driver_sql("SELECT @@auto_increment_increment").scalar()
+        connection.info["auto_increment_increment"] = step
+    return step
+
+def repeated_in_batch(rows: List[Dict[str, Any]]) -> Dict[int, int]:
+    """Positions of rows whose dedup_key an earlier row of the batch has, mapped to that row's position."""
+    first: Dict[str, int] = {}
+    repeats: Dict[int, int] = {}
+    for index, row in enumerate(rows):
+        key = row["dedup_key"]
+        if key in first:
+            repeats[index] = first[key]
+        elif key is not None:
+            first[key] = index
+    return repeats
+
+def existing_dedup_keys_query(dedup_keys: List[str]) -> CompoundSelect:
+    """(dedup_key, notification_id) of rows already stored under any of dedup_keys, as their
+    own key or as the key of an item merged into a digest."""
+    return union_all(
+        select(NotificationORM.dedup_key, NotificationORM.notification_id).where(
+            NotificationORM.dedup_key.in_(dedup_keys)
+        ),
+        select(DigestItemORM.dedup_key, DigestItemORM.notification_id).where(
+            DigestItemORM.dedup_key.in_(dedup_keys)
+        ),
+    )
+
+def digest_item_rows(
+    notification_ids: List[int],
+    details: List[Optional[List[Dict[str, Any]]]],
+    merged_keys: List[Optional[List[Optional[str]]]]
+) -> List[Dict[str, Any]]:
+    """notification_digest_items rows for the digests among inserted rows, given with their
+    details and their items' dedup keys (in the same order)."""
+    return [
+        {"notification_id": notification_id, "subscription_id": item["subscription_id"], "dedup_key": key}
+        for notification_id, items, keys in zip(notification_ids, details, merged_keys)
+        if items is not None
+        for item, key in zip(items, keys or [None] * len(items))
+    ]
+
+def digest_subject(subjects: List[str]) -> str:
+    """The first merged subject and how many others there are, e.g. "Upcoming Payment: Netflix (+2 more)"."""
+    distinct = list(dict.fromkeys(subjects))
+    if len(distinct) == 1:
+        return f"{distinct[0]} ({len(subjects)})"
+    return f"{distinct[0]} (+{len(subjects) - 1} more)"
+
+def subscription_digests_query(subscription_id: int, limit: int) -> Select:
+    """(notification_id, user_id, details) of the next chunk of digests holding items of a subscription."""
+    return select(NotificationORM.notification_id, NotificationORM.user_id, NotificationORM.details).where(
+        NotificationORM.notification_id.in_(
+            select(DigestItemORM.notification_id).where(DigestItemORM.subscription_id == subscription_id)
+        )
+    ).order_by(NotificationORM.notification_id).limit(limit)
+
+def update_digest_stmt(notification_id: int, details: List[Dict[str, Any]]) -> Update:
+    """Rewrite a digest for the items it has left, filed under the first one's subscription."""
+    subjects = [item["subject"] for item in details]
+    return update(NotificationORM).where(
+        NotificationORM.notification_id == notification_id
+    ).values(
+        subscription_id=details[0]["subscription_id"],
+        subject=digest_subject(subjects),
+        message="\n".join(subjects),
+        details=details
+    ).execution_options(synchronize_session=False)
+
+def latest_notification_id_query() -> Select:
+    return select(func.coalesce(func.max(NotificationORM.notification_id), 0))
+
+# NotificationRead field name -> column, for row (not ORM entity) selects
+READ_COLUMNS = {
+    "id": NotificationORM.notification_id.label("id"),
+    "subscription_id": NotificationORM.subscription_id,
+    "user_id": NotificationORM.user_id,
+    "notification_type": NotificationORM.notification_type,
+    "subject": NotificationORM.subject,
+    "message": NotificationORM.message,
+    "status": NotificationORM.status,
+    "read_at": NotificationORM.read_at,
+    "delivered_at": NotificationORM.delivered_at,
+    "created_at": NotificationORM.created_at,
+    "details": NotificationORM.details,
+    "metadata": NotificationORM.meta.label("metadata"),
+}
+
+# Selected along with "message" so templated bodies can be rendered
+TEMPLATE_COLUMNS = [NotificationORM.template_id, NotificationORM.template_params]
+
+def read_row(row: Mapping[str, Any], templates: TemplateRegistry) -> Dict[str, Any]:
+    """A READ_COLUMNS row as a dict of NotificationRead fields, with its templated body rendered."""
+    values = dict(row)
+    template_id = values.pop("template_id", None)
+    template_params = values.pop("template_params", None)
+    if template_id is not None:
+        values["message"] = templates.render(template_id, template_params)
+    return values
+
+def user_notifications_query(
+    user_id: str,
+    unread_only: bool,
+    limit: int,
+    offset: int,
+    cursor: Optional[Tuple[datetime, int]] = None,
+    fields: Optional[List[str]] = None
+) -> Select:
+    """
+    Newest-first listing. With a (created_at, notification_id) cursor the page starts right
+    after that row (keyset pagination) and offset is ignored. With fields (READ_COLUMNS keys)
+    it selects just those columns as plain rows instead of ORM entities (pass them through
+    read_row), plus the template columns when "message" is among them.
+    """
+    if fields is not None:
+        query = select(*(READ_COLUMNS[field] for field in fields), *(TEMPLATE_COLUMNS if "message" in fields else []))
+    else:
+        query = select(NotificationORM)
+    query = query.where(NotificationORM.user_id == user_id)
+    if unread_only:
+        query = query.where(NotificationORM.read_at.is_(None))
+    if cursor is not None:
+        created_at, notification_id = cursor
+        # The redundant created_at <= bound gives the planner an index range to seek into
+        query = query.where(
+            NotificationORM.created_at <= created_at,
+            or_(NotificationORM.created_at < created_at, NotificationORM.notification_id < notification_id)
+        )
+        offset = 0
+    query = query.order_by(desc(NotificationORM.created_at), desc(NotificationORM.notification_id))
+    return query.limit(limit).offset(offset)
+
+def notifications_after_query(user_id: str, after_id: int, since: Optional[datetime], limit: int) -> Select:
+    # A range scan of the user_id index, whose entries end with the primary key (InnoDB, SQLite)
+    query = select(NotificationORM).where(
+        NotificationORM.user_id == user_id,
+        NotificationORM.notification_id > after_id,
+        NotificationORM.read_at.is_(None)
+    )
+    if since is not None:
+        query = query.where(NotificationORM.created_at >= since)
+    return query.order_by(NotificationORM.notification_id).limit(limit)
+
+def user_notification_query(notification_id: int, user_id: str) -> Select:
+    return select(NotificationORM).where(
+        NotificationORM.notification_id == notification_id,
+        NotificationORM.user_id == user_id
+    )
+
+def mark_read_stmt(notification_id: int, user_id: str, read_at: datetime) -> Update:
+    # Conditional on read_at IS NULL so concurrent calls can't both count as the transition
+    return update(NotificationORM).where(
+        NotificationORM.notification_id == notification_id,
+        NotificationORM.user_id == user_id,
+        NotificationORM.read_at.is_(None)
+    ).values(read_at=read_at).execution_options(synchronize_session=False)
+
+def mark_read_bulk_stmt(
+    user_id: str,
+    read_at: datetime,
+    notification_ids: Optional[List[int]] = None,
+    before: Optional[datetime] = None
+) -> Update:
+    """Set-based mark-read of a user's unread notifications, by id list and/or created_at <= before."""
+    stmt = update(NotificationORM).where(
+        NotificationORM.user_id == user_id,
+        NotificationORM.read_at.is_(None)
+    )
+    if notification_ids is not None:
+        stmt = stmt.where(NotificationORM.notification_id.in_(notification_ids))
+    if before is not None:
+        stmt = stmt.where(NotificationORM.created_at <= before)
+    return stmt.values(read_at=read_at).execution_options(synchronize_session=False)
+
+def mark_delivered_bulk_stmt(notification_ids: List[int], delivered_at: datetime) -> Update:
+    return update(NotificationORM).where(
+        NotificationORM.notification_id.in_(notification_ids),
+        NotificationORM.delivered_at.is_(None)
+    ).values(
+        delivered_at=delivered_at,
+        status=ORMNotificationStatus.delivered
+    ).execution_options(synchronize_session=False)
+
+def undelivered_users_query(notification_ids: List[int]) -> Select:
+    """Users owning any of notification_ids that are not delivered yet."""
+    return select(NotificationORM.user_id).where(
+        NotificationORM.notification_id.in_(notification_ids),
+        NotificationORM.delivered_at.is_(None)
+    ).distinct()
+
+def claim_dispatch_query(notification_types: List[ORMNotificationType], now: datetime, limit: int) -> Select:
+    """
+    Due queued rows of the given types, oldest first, locked for the claiming transaction.
+    SKIP LOCKED lets concurrent dispatchers claim disjoint batches instead of queueing on
+    each other's locks.
+    """
+    return select(NotificationORM).where(
+        NotificationORM.status == ORMNotificationStatus.queued,
+        NotificationORM.notification_type.in_(notification_types),
+        or_(NotificationORM.next_attempt_at.is_(None), NotificationORM.next_attempt_at <= now)
+    ).order_by(NotificationORM.notification_id).limit(limit).with_for_update(skip_locked=True)
+
+def lease_stmt(notification_ids: List[int], lease_until: datetime) -> Update:
+    """Hide claimed rows from other dispatchers until lease_until and count the attempt."""
+    return update(NotificationORM).where(
+        NotificationORM.notification_id.in_(notification_ids)
+    ).values(
+        next_attempt_at=lease_until,
+        attempts=NotificationORM.attempts + 1
+    ).execution_options(synchronize_session=False)
+
+def dispatch_outcome_stmt() -> Update:
+    """
+    Executemany UPDATE recording a failed send attempt per row: b_id, b_status (queued to
+    retry at b_next_attempt_at, or failed) and b_error.
+    """
+    # Core statement on the table: a WHERE with bound parameters is plain executemany, not ORM bulk
+    table = NotificationORM.__table__
+    return update(table).where(
+        table.c.notification_id == bindparam("b_id")
+    ).values(
+        status=bindparam("b_status"),
+        next_attempt_at=bindparam("b_next_attempt_at"),
+        last_error=bindparam("b_error")
+    )
+
+def unread_count_query(user_id: str) -> Select:
+    return select(func.count()).select_from(NotificationORM).where(
+        NotificationORM.user_id == user_id,
+        NotificationORM.read_at.is_(None)
+    )
+
+def subscription_chunk_query(subscription_id: int, limit: int) -> Select:
+    """(notification_id, user_id) of the next chunk of a subscription's notifications to delete."""
+    return select(NotificationORM.notification_id, NotificationORM.user_id).where(
+        NotificationORM.subscription_id == subscription_id
+    ).order_by(NotificationORM.notification_id).limit(limit)
+
+def expired_chunk_query(
+    cutoffs: List[Tuple[ORMNotificationType, ORMNotificationStatus, datetime]],
+    after_id: int,
+    limit: int
+) -> Select:
+    """
+    (notification_id, user_id) of the next chunk of expired notifications in primary-key order,
+    where cutoffs holds one (type, status, created before) triple per purgeable combination.
+    """
+    expired = or_(*(
+        and_(
+            NotificationORM.notification_type == notification_type,
+            NotificationORM.status == notification_status,
+            NotificationORM.created_at < cutoff
+        )
+        for notification_type, notification_status, cutoff in cutoffs
+    ))
+    return select(NotificationORM.notification_id, NotificationORM.user_id).where(
+        NotificationORM.notification_id > after_id,
+        expired
+    ).order_by(NotificationORM.notification_id).limit(limit)
+
+def delete_by_ids_stmt(notification_ids: List[int]) -> Delete:
+    return delete(NotificationORM).where(
+        NotificationORM.notification_id.in_(notification_ids)
+    ).execution_options(synchronize_session=False)
+
+def delete_digest_items_stmt(notification_ids: List[int], subscription_id: Optional[int] = None) -> Delete:
+    """Delete the items of digests among notification_ids (only a subscription's, if given)."""
+    stmt = delete(DigestItemORM).where(DigestItemORM.notification_id.in_(notification_ids))
+    if subscription_id is not None:
+        stmt = stmt.where(DigestItemORM.subscription_id == subscription_id)
+    return stmt
@@ -1,97 +1,345 @@
-from sqlalchemy.exc import DatabaseError
-from sqlalchemy import desc
-from app.models.notification import NotificationRequest, NotificationRead, NotificationStatus, NotificationType
-from app.services.orm_models import NotificationORM, NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
-from typing import Callable, List, Optional
+from app.models.notification import (
+    NotificationRequest,
+    NotificationRead,
+    NotificationBatchItemResult,
+)
+from app.services.orm_models import DigestItemORM, NotificationORM, NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
+from app.services.notification_hub import NotificationHub
+from app.services.unread_counter import UnreadCounterCache
+from app.services.recent_notifications import RecentNotificationsCache
+from app.services.user_versions import UserVersions
+from app.services.idempotency_keys import IdempotencyKeyCache
+from app.services.templates import TemplateRegistry
+from app.services.notification_queries import (
+    to_notification_read,
+    notification_values,
+    stored_now,
+    values_to_notification_read,
+    bulk_insert_stmt,
+    bulk_inserted_ids,
+    existing_dedup_keys_query,
+    digest_item_rows,
+    repeated_in_batch,
+    latest_notification_id_query,
+    READ_COLUMNS,
+    read_row,
+    user_notifications_query,
+    notifications_after_query,
+    user_notification_query,
+    mark_read_stmt,
+    mark_read_bulk_stmt,
+    mark_delivered_bulk_stmt,
+    undelivered_users_query,
+    claim_dispatch_query,
+    lease_stmt,
+    dispatch_outcome_stmt,
+    unread_count_query,
+    subscription_chunk_query,
+    expired_chunk_query,
+    delete_by_ids_stmt,
+    subscription_digests_query,
+    update_digest_stmt,
+    delete_digest_items_stmt,
+)
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class NotificationService:
-    def __init__(self, session_factory: Callable[[], Session], logger):
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        logger,
+        hub: Optional[NotificationHub] = None,
+        unread_counter: Optional[UnreadCounterCache] = None,
+        recent_cache: Optional[RecentNotificationsCache] = None,
+        versions: Optional[UserVersions] = None,
+        idempotency_keys: Optional[IdempotencyKeyCache] = None,
+        templates: Optional[TemplateRegistry] = None
+    ):
         self.session_factory = session_factory
         self.logger = logger
+        self.hub = hub
+        # A zero-size cache still brackets writes correctly but never serves hits
+        self.unread_counter = unread_counter or UnreadCounterCache(max_users=0)
+        self.recent_cache = recent_cache or RecentNotificationsCache(max_users=0)
+        self.versions = versions or UserVersions()
+        self.idempotency_keys = idempotency_keys or IdempotencyKeyCache(max_keys=0)
+        self.templates = templates or TemplateRegistry()
 
-    def create_notification(self, payload: NotificationRequest) -> int:
+    def create_notification(self, payload: NotificationRequest) -> Tuple[int, bool]:
         """
-        Create a push notification and save to database.
-        For push notifications, we queue them and they will be delivered via SSE/WebSocket.
+        Create a notification and save to database.
+        Push notifications are stored as sent and delivered via SSE; other types stay queued.
+        A request whose dedup_key was used before creates nothing and gets the original
+        notification's id back. Returns (notification_id, duplicate).
         """
         try:
+            if payload.dedup_key is not None:
+                original_id = self.idempotency_keys.get(payload.dedup_key)
+                if original_id is not None:
+                    return original_id, True
             with self.session_factory() as session:
-                # Map Pydantic enum to SQLAlchemy enum
-                notification_type = ORMNotificationType(payload.notification_type.value)
-                status = ORMNotificationStatus.queued  # Start as queued for push notifications
-                
-                notification = NotificationORM(
-                    subscription_id=payload.subscription_id,
-                    user_id=payload.user_id,
-                    notification_type=notification_type,
-                    subject=payload.subject,
-                    message=payload.body,
-                    status=status,
-                    recipient_email=payload.recipient_email,
-                    device_token=payload.device_token
-                )
-                
-                session.add(notification)
-                session.commit()
-                session.refresh(notification)
+                with self.unread_counter.writing(payload.user_id) as unread_change:
+                    # The final status is known up front and the id comes back from the INSERT
+                    # itself, so a create is a single INSERT and one commit
+                    values = notification_values(payload, stored_now(), self.templates, payload.dedup_key)
+                    try:
+                        result = session.execute(insert(NotificationORM).values(values))
+                        notification_id = result.inserted_primary_key[0]
+                        session.commit()
+                    except IntegrityError:
+                        if payload.dedup_key is None:
+                            raise
+                        # The unique index caught a repeat the key cache didn't know about,
+                        # e.g. a concurrent duplicate or one from before a restart
+                        session.rollback()
+                        original_id = dict(session.execute(existing_dedup_keys_query([payload.dedup_key])).all()).get(payload.dedup_key)
+                        if original_id is None:
+                            raise
+                        self.idempotency_keys.put_many([(payload.dedup_key, original_id)])
+                        return original_id, True
+                    unread_change.delta = 1
+                if payload.dedup_key is not None:
+                    self.idempotency_keys.put_many([(payload.dedup_key, notification_id)])
                 
                 self.logger.info(
-                    f"Notification created with ID: {notification.notification_id} "
+                    f"Notification created with ID: {notification_id} "
                     f"for user {payload.user_id}, subscription {payload.subscription_id}"
                 )
                 
-                # For push notifications, mark as sent immediately (delivery happens via SSE)
-                if payload.notification_type == NotificationType.push:
-                    notification.status = ORMNotificationStatus.sent
-                    session.commit()
+                notification = values_to_notification_read(notification_id, values, self.templates)
+                self.recent_cache.added([notification])
+                self.versions.bump([payload.user_id])
+                
+                # Fan out to any open SSE streams for this user
+                if self.hub is not None:
+                    self.hub.publish(payload.user_id, notification)
                 
-                return notification.notification_id
+                return notification_id, False
                 
         except Exception as e:
             self.logger.error(f"Failed to create notification: {str(e)}")
             raise RuntimeError(f"Failed to create notification: {str(e)}") from e
 
+    def create_notifications(
+        self,
+        payloads: List[NotificationRequest],
+        chunk_size: int = 500,
+        dedup_keys: Optional[List[Optional[str]]] = None,
+        details: Optional[List[Optional[List[Dict[str, Any]]]]] = None,
+        merged_keys: Optional[List[Optional[List[Optional[str]]]]] = None
+    ) -> List[NotificationBatchItemResult]:
+        """
+        Create many notifications in a single transaction, one multi-row INSERT per chunk.
+        A chunk that fails is retried row by row (each in its own savepoint) so one bad item
+        only fails itself. Items whose dedup key (dedup_keys, else the payload's own) is
+        already stored are not inserted again and report the original id with duplicate=True,
+        as do items repeating the key of an earlier item of the batch. details optionally
+        carries the merged items of digest notifications, per payload, and merged_keys their
+        dedup keys (one per item, None for an item without one). Each item is recorded with
+        its subscription and key, so repeats of merged items are recognized too.
+        Results are returned in request order.
+        """
+        results: List[NotificationBatchItemResult] = []
+        created: List[NotificationRead] = []
+        seen_keys: Dict[str, int] = {}
+        now = stored_now()
+        dedup_keys = dedup_keys or [payload.dedup_key for payload in payloads]
+        details = details or [None] * len(payloads)
+        merged_keys = merged_keys or [None] * len(payloads)
+        rows = [
+            notification_values(payload, now, self.templates, key, items)
+            for payload, key, items in zip(payloads, dedup_keys, details)
+        ]
+        # Only the first item with a key is inserted; the rest share its outcome
+        repeats = repeated_in_batch(rows)
+        
+        try:
+            with self.session_factory() as session:
+                with self.unread_counter.writing_many(row["user_id"] for row in rows) as unread_changes:
+                    dialect = session.get_bind().dialect
+                    
+                    for start in range(0, len(rows), chunk_size):
+                        chunk = rows[start:start + chunk_size]
+                        # Repeats of earlier requests: recently used keys from memory, the rest from the index
+                        existing = {}
+                        for row in chunk:
+                            if row["dedup_key"] is not None:
+                                original_id = self.idempotency_keys.get(row["dedup_key"])
+                                if original_id is not None:
+                                    existing[row["dedup_key"]] = original_id
+                        keys = [row["dedup_key"] for row in chunk if row["dedup_key"] is not None and row["dedup_key"] not in existing]
+                        if keys:
+                            existing.update(session.execute(existing_dedup_keys_query(keys)).all())
+                        is_new = [
+                            row["dedup_key"] not in existing and start + offset not in repeats
+                            for offset, row in enumerate(chunk)
+                        ]
+                        to_insert = [row for row, new in zip(chunk, is_new) if new]
+                        to_merge = [merged_keys[start + offset] for offset, new in enumerate(is_new) if new]
+                        
+                        ids = []
+                        try:
+                            if to_insert:
+                                with session.begin_nested():
+                                    stmt, params = bulk_insert_stmt(dialect, to_insert)
+                                    ids = bulk_inserted_ids(session.connection(), session.execute(stmt, params), len(to_insert))
+                                    items = digest_item_rows(ids, [row["details"] for row in to_insert], to_merge)
+                                    if items:
+                                        session.execute(insert(DigestItemORM), items)
+                        except Exception as e:
+                            # The exception's text carries the whole statement and its parameters
+                            self.logger.warning(
+                                f"Bulk insert of {len(to_insert)} notifications failed "
+                                f"({type(e).__name__}), retrying per item"
+                            )
+                            ids = []
+                            for row, keys in zip(to_insert, to_merge):
+                                try:
+                                    with session.begin_nested():
+                                        result = session.execute(insert(NotificationORM).values(row))
+                                        notification_id = result.inserted_primary_key[0]
+                                        if row["details"]:
+                                            session.execute(
+                                                insert(DigestItemORM), digest_item_rows([notification_id], [row["details"]], [keys])
+                                            )
+                                        ids.append(notification_id)
+                                except Exception as row_error:
+                                    if isinstance(row_error, IntegrityError) and row["dedup_key"] is not None:
+                                        # A concurrent request with the same key
+                                        self.logger.info(f"Dedup key {row['dedup_key']} was stored concurrently")
+                                        existing.update(session.execute(existing_dedup_keys_query([row["dedup_key"]])).all())
+                                    # Report the driver's error, not the full statement
+                                    ids.append(getattr(row_error, "orig", None) or row_error)
+                        
+                        outcomes = iter(ids)
+                        for offset, row in enumerate(chunk):
+                            outcome = next(outcomes) if is_new[offset] else None
+                            if start + offset in repeats:
+                                first = results[repeats[start + offset]]
+                                results.append(NotificationBatchItemResult(
+                                    index=start + offset, id=first.id, error=first.error, duplicate=first.id is not None
+                                ))
+                            # Keys found during the per-item retry were stored by a concurrent request
+                            elif (outcome is None or isinstance(outcome, Exception)) and row["dedup_key"] in existing:
+                                results.append(NotificationBatchItemResult(
+                                    index=start + offset, id=existing[row["dedup_key"]], duplicate=True
+                                ))
+                                seen_keys[row["dedup_key"]] = existing[row["dedup_key"]]
+                            elif isinstance(outcome, Exception):
+                                results.append(NotificationBatchItemResult(index=start + offset, error=str(outcome)))
+                            else:
+                                notification = values_to_notification_read(outcome, row, self.templates)
+                                created.append(notification)
+                                if row["dedup_key"] is not None:
+                                    seen_keys[row["dedup_key"]] = outcome
+                                seen_keys.update((key, outcome) for key in merged_keys[start + offset] or () if key is not None)
+                                results.append(NotificationBatchItemResult(
+                                    index=start + offset, id=outcome, status=notification.status
+                                ))
+                    
+                    session.commit()
+                    for notification in created:
+                        unread_changes[notification.user_id].delta += 1
+        except Exception as e:
+            self.logger.error(f"Failed to create notification batch: {str(e)}")
+            raise RuntimeError(f"Failed to create notification batch: {str(e)}") from e
+        
+        self.logger.info(f"Created {len(created)} of {len(payloads)} notifications in batch")
+        self.idempotency_keys.put_many(seen_keys.items())
+        self.recent_cache.added(created)
+        self.versions.bump(dict.fromkeys(notification.user_id for notification in created))
+        
+        # Fan out to any open SSE streams
+        if self.hub is not None:
+            for notification in created:
+                self.hub.publish(notification.user_id, notification)
+        
+        return results
+
     def get_user_notifications(
         self, 
         user_id: str, 
         unread_only: bool = False,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        cursor: Optional[Tuple[datetime, int]] = None
     ) -> List[NotificationRead]:
         """
         Get notifications for a user, optionally filtered to unread only.
+        Pass a decoded (created_at, notification_id) cursor for keyset pagination.
         """
+        rows = self.get_user_notification_rows(user_id, unread_only, limit, offset, cursor)
+        return [NotificationRead(**row) for row in rows]
+
+    def get_user_notification_rows(
+        self,
+        user_id: str,
+        unread_only: bool = False,
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        fields: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        get_user_notifications as plain dicts keyed by NotificationRead field names, for
+        serializing straight to JSON. fields limits the keys (and the selected columns).
+        First pages of up to recent_cache.depth items are served from the recent notifications cache.
+        """
+        if self.recent_cache.max_users and offset == 0 and cursor is None and limit <= self.recent_cache.depth:
+            cached = self.recent_cache.page(user_id, limit, unread_only)
+            if cached is None:
+                self._fill_recent(user_id)
+                cached = self.recent_cache.page(user_id, limit, unread_only)
+            if cached is not None:
+                if fields is None:
+                    return cached
+                return [{field: row[field] for field in fields} for row in cached]
+                
         try:
             with self.session_factory() as session:
-                query = session.query(NotificationORM).filter(
-                    NotificationORM.user_id == user_id
-                )
-                
-                if unread_only:
-                    query = query.filter(NotificationORM.read_at.is_(None))
-                
-                query = query.order_by(desc(NotificationORM.created_at))
-                query = query.limit(limit).offset(offset)
-                
-                notifications = query.all()
+                rows = session.execute(
+                    user_notifications_query(user_id, unread_only, limit, offset, cursor, fields or list(READ_COLUMNS))
+                ).mappings().all()
+                return [read_row(row, self.templates) for row in rows]
+        except Exception as e:
+            self.logger.error(f"Failed to get notifications for user {user_id}: {str(e)}")
+            raise RuntimeError(f"Failed to get notifications: {str(e)}") from e
+
+    def _fill_recent(self, user_id: str) -> None:
+        ticket = self.recent_cache.begin_fill(user_id)
+        try:
+            with self.session_factory() as session:
+                rows = session.execute(
+                    user_notifications_query(user_id, False, self.recent_cache.depth, 0, fields=list(READ_COLUMNS))
+                ).mappings().all()
+        except Exception as e:
+            # The caller falls back to its own query
+            self.logger.warning(f"Failed to fill recent notifications for user {user_id}: {str(e)}")
+            return
+        self.recent_cache.end_fill(ticket, [read_row(row, self.templates) for row in rows])
+
+    def get_notifications_after(
+        self,
+        user_id: str,
+        after_id: int = 0,
+        since: Optional[datetime] = None,
+        limit: int = 100
+    ) -> List[NotificationRead]:
+        """
+        Get unread notifications for a user newer than after_id (and created at or after since),
+        oldest first. Used by SSE streams to catch up on anything they missed.
+        """
+        try:
+            with self.session_factory() as session:
+                notifications = session.scalars(
+                    notifications_after_query(user_id, after_id, since, limit)
+                ).all()
                 
-                return [
-                    NotificationRead(
-                        id=n.notification_id,
-                        subscription_id=n.subscription_id,
-                        user_id=n.user_id,
-                        notification_type=NotificationType(n.notification_type.value),
-                        subject=n.subject,
-                        message=n.message,
-                        status=NotificationStatus(n.status.value),
-                        read_at=n.read_at,
-                        delivered_at=n.delivered_at,
-                        created_at=n.created_at
-                    )
-                    for n in notifications
-                ]
+                return [to_notification_read(n, self.templates) for n in notifications]
         except Exception as e:
             self.logger.error(f"Failed to get notifications for user {user_id}: {str(e)}")
             raise RuntimeError(f"Failed to get notifications: {str(e)}") from e
@@ -102,26 +350,66 @@ class NotificationService:
         """
         try:
             with self.session_factory() as session:
-                notification = session.query(NotificationORM).filter(
-                    NotificationORM.notification_id == notification_id,
-                    NotificationORM.user_id == user_id
-                ).first()
-                
-                if not notification:
-                    return False
-                
-                if notification.read_at is None:
-                    notification.read_at = datetime.utcnow()
+                with self.unread_counter.writing(user_id) as unread_change:
+                    read_at = stored_now()
+                    result = session.execute(mark_read_stmt(notification_id, user_id, read_at))
                     session.commit()
-                    self.logger.info(f"Notification {notification_id} marked as read")
-                    return True
+                    if result.rowcount:
+                        unread_change.delta = -1
+                        self.recent_cache.marked_read(user_id, read_at, notification_ids=[notification_id])
+                        self.versions.bump([user_id])
+                        self.logger.info(f"Notification {notification_id} marked as read")
+                        return True
                 
-                return True  # Already read
+                # Nothing updated: either already read or not this user's notification
+                notification = session.scalars(
+                    user_notification_query(notification_id, user_id)
+                ).first()
+                return notification is not None
                 
         except Exception as e:
             self.logger.error(f"Failed to mark notification {notification_id} as read: {str(e)}")
             raise RuntimeError(f"Failed to mark notification as read: {str(e)}") from e
 
+    def mark_notifications_read(self, user_id: str, notification_ids: List[int]) -> int:
+        """
+        Mark several of a user's notifications as read with one UPDATE.
+        Ids that don't belong to the user or are already read are skipped.
+        Returns the number of notifications updated.
+        """
+        return self._mark_read_bulk(user_id, notification_ids=notification_ids)
+
+    def mark_all_read(self, user_id: str, before: Optional[datetime] = None) -> int:
+        """
+        Mark all of a user's unread notifications (optionally only those created at or before
+        `before`) as read with one UPDATE. Returns the number of notifications updated.
+        """
+        return self._mark_read_bulk(user_id, before=before)
+
+    def _mark_read_bulk(
+        self,
+        user_id: str,
+        notification_ids: Optional[List[int]] = None,
+        before: Optional[datetime] = None
+    ) -> int:
+        try:
+            with self.session_factory() as session:
+                with self.unread_counter.writing(user_id) as unread_change:
+                    read_at = stored_now()
+                    result = session.execute(
+                        mark_read_bulk_stmt(user_id, read_at, notification_ids, before)
+                    )
+                    session.commit()
+                    unread_change.delta = -result.rowcount
+                if result.rowcount:
+                    self.recent_cache.marked_read(user_id, read_at, notification_ids=notification_ids, before=before)
+                    self.versions.bump([user_id])
+                self.logger.info(f"Marked {result.rowcount} notifications as read for user {user_id}")
+                return result.rowcount
+        except Exception as e:
+            self.logger.error(f"Failed to mark notifications as read for user {user_id}: {str(e)}")
+            raise RuntimeError(f"Failed to mark notifications as read: {str(e)}") from e
+
     def mark_notification_delivered(self, notification_id: int) -> bool:
         """
         Mark a notification as delivered (called by Cloud Function or SSE handler).
@@ -134,9 +422,13 @@ class NotificationService:
                     return False
                 
                 if notification.delivered_at is None:
-                    notification.delivered_at = datetime.utcnow()
+                    delivered_at = stored_now()
+                    notification.delivered_at = delivered_at
                     notification.status = ORMNotificationStatus.delivered
+                    user_id = notification.user_id
                     session.commit()
+                    self.recent_cache.delivered([notification_id], delivered_at)
+                    self.versions.bump([user_id])
                     self.logger.info(f"Notification {notification_id} marked as delivered")
                 
                 return True
@@ -145,36 +437,163 @@ class NotificationService:
             self.logger.error(f"Failed to mark notification {notification_id} as delivered: {str(e)}")
             return False
 
+    def mark_notifications_delivered(self, notification_ids: List[int], chunk_size: int = 1000) -> int:
+        """
+        Mark many notifications as delivered in one transaction, one UPDATE per chunk of ids.
+        Already-delivered ids are skipped. Returns the number of notifications updated.
+        """
+        try:
+            updated = 0
+            now = stored_now()
+            user_ids = set()
+            with self.session_factory() as session:
+                for start in range(0, len(notification_ids), chunk_size):
+                    chunk = notification_ids[start:start + chunk_size]
+                    user_ids.update(session.scalars(undelivered_users_query(chunk)).all())
+                    result = session.execute(mark_delivered_bulk_stmt(chunk, now))
+                    updated += result.rowcount
+                session.commit()
+            self.recent_cache.delivered(notification_ids, now)
+            self.versions.bump(user_ids)
+            return updated
+        except Exception as e:
+            self.logger.error(f"Failed to mark {len(notification_ids)} notifications as delivered: {str(e)}")
+            raise RuntimeError(f"Failed to mark notifications as delivered: {str(e)}") from e
+
+    def claim_for_dispatch(
+        self,
+        notification_types: List[ORMNotificationType],
+        limit: int,
+        lease_seconds: float
+    ) -> List[Dict[str, Any]]:
+        """
+        Claim up to limit due queued notifications of the given types for sending. Claimed rows
+        are leased (hidden from other dispatchers) for lease_seconds; if the claimer dies they
+        become due again. Returns the fields needed to send them, attempts including this one.
+        """
+        try:
+            now = datetime.utcnow()
+            with self.session_factory() as session:
+                notifications = session.scalars(claim_dispatch_query(notification_types, now, limit)).all()
+                if not notifications:
+                    return []
+                claimed = [
+                    {
+                        "id": n.notification_id,
+                        "user_id": n.user_id,
+                        "notification_type": n.notification_type,
+                        "subject": n.subject,
+                        "message": self.templates.message(n.template_id, n.template_params, n.message),
+                        "recipient_email": n.recipient_email,
+                        "recipient_phone": n.recipient_phone,
+                        "attempts": n.attempts + 1,
+                        "created_at": n.created_at,
+                    }
+                    for n in notifications
+                ]
+                session.execute(lease_stmt([n["id"] for n in claimed], now + timedelta(seconds=lease_seconds)))
+                session.commit()
+                return claimed
+        except Exception as e:
+            self.logger.error(f"Failed to claim notifications for dispatch: {str(e)}")
+            raise RuntimeError(f"Failed to claim notifications for dispatch: {str(e)}") from e
+
+    def complete_dispatch(self, delivered_ids: List[int], failed_attempts: List[Dict[str, Any]]) -> None:
+        """
+        Record the outcome of a dispatch round in one transaction: delivered_ids are marked
+        delivered in bulk, failed_attempts (b_id, b_status, b_next_attempt_at, b_error) in
+        one executemany UPDATE.
+        """
+        try:
+            now = stored_now()
+            user_ids = set()
+            with self.session_factory() as session:
+                if delivered_ids:
+                    user_ids.update(session.scalars(undelivered_users_query(delivered_ids)).all())
+                    session.execute(mark_delivered_bulk_stmt(delivered_ids, now))
+                if failed_attempts:
+                    session.execute(dispatch_outcome_stmt(), failed_attempts)
+                session.commit()
+            if delivered_ids:
+                self.recent_cache.delivered(delivered_ids, now)
+                self.versions.bump(user_ids)
+        except Exception as e:
+            self.logger.error(f"Failed to record dispatch outcome: {str(e)}")
+            raise RuntimeError(f"Failed to record dispatch outcome: {str(e)}") from e
+
+    def find_by_dedup_keys(self, dedup_keys: List[str]) -> Dict[str, int]:
+        """Ids of the notifications already stored under any of dedup_keys."""
+        try:
+            with self.session_factory() as session:
+                return dict(session.execute(existing_dedup_keys_query(dedup_keys)).all())
+        except Exception as e:
+            self.logger.error(f"Failed to look up dedup keys: {str(e)}")
+            raise RuntimeError(f"Failed to look up dedup keys: {str(e)}") from e
+
+    def latest_notification_id(self) -> int:
+        """Highest notification id in the table (0 when empty)."""
+        try:
+            with self.session_factory() as session:
+                return session.execute(latest_notification_id_query()).scalar_one()
+        except Exception as e:
+            self.logger.error(f"Failed to read the latest notification id: {str(e)}")
+            raise RuntimeError(f"Failed to read the latest notification id: {str(e)}") from e
+
     def get_unread_count(self, user_id: str) -> int:
         """
         Get count of unread notifications for a user.
         """
         try:
-            with self.session_factory() as session:
-                count = session.query(NotificationORM).filter(
-                    NotificationORM.user_id == user_id,
-                    NotificationORM.read_at.is_(None)
-                ).count()
+            count = self.unread_counter.get(user_id)
+            if count is not None:
                 return count
+                
+            ticket = self.unread_counter.begin_fill(user_id)
+            try:
+                with self.session_factory() as session:
+                    count = session.scalar(unread_count_query(user_id))
+            finally:
+                self.unread_counter.end_fill(ticket, count)
+            return count
         except Exception as e:
             self.logger.error(f"Failed to get unread count for user {user_id}: {str(e)}")
             return 0
 
-    def delete_notifications_by_subscription_id(self, subscription_id: int) -> int:
+    def delete_notifications_by_subscription_id(
+        self,
+        subscription_id: int,
+        chunk_size: int = 1000,
+        progress: Optional[Callable[[int], None]] = None
+    ) -> int:
         """
-        Delete all notifications associated with a subscription.
-        Returns the number of notifications deleted.
+        Delete all notifications associated with a subscription, chunk_size rows per
+        transaction so no single DELETE holds locks (or undo) for the whole subscription.
+        Items of the subscription merged into digests are taken out of them first; a digest
+        is deleted once it has no items left. progress, if given, is called with the running
+        total after every chunk. Returns the number of notifications deleted, merged items included.
         """
+        deleted_count = 0
         try:
-            with self.session_factory() as session:
-                deleted_count = session.query(NotificationORM).filter(
-                    NotificationORM.subscription_id == subscription_id
-                ).delete(synchronize_session=False)
-                session.commit()
-                self.logger.info(
-                    f"Deleted {deleted_count} notifications for subscription {subscription_id}"
-                )
-                return deleted_count
+            while True:
+                with self.session_factory() as session:
+                    digests = session.execute(subscription_digests_query(subscription_id, chunk_size)).all()
+                    deleted_count += self._remove_digest_items(session, subscription_id, digests)
+                if progress is not None and digests:
+                    progress(deleted_count)
+                if len(digests) < chunk_size:
+                    break
+            while True:
+                with self.session_factory() as session:
+                    rows = session.execute(subscription_chunk_query(subscription_id, chunk_size)).all()
+                    deleted_count += self._delete_rows(session, rows)
+                if progress is not None:
+                    progress(deleted_count)
+                if len(rows) < chunk_size:
+                    break
+            self.logger.info(
+                f"Deleted {deleted_count} notifications for subscription {subscription_id}"
+            )
+            return deleted_count
         except Exception as e:
             self.logger.error(
                 f"Failed to delete notifications for subscription {subscription_id}: {str(e)}"
@@ -182,4 +601,69 @@ class NotificationService:
             raise RuntimeError(
                 f"Failed to delete notifications for subscription {subscription_id}: {str(e)}"
             ) from e
+        
+    def purge_expired_chunk(
+        self,
+        cutoffs: List[Tuple[ORMNotificationType, ORMNotificationStatus, datetime]],
+        after_id: int = 0,
+        chunk_size: int = 1000
+    ) -> Tuple[int, int]:
+        """
+        Delete one primary-key ordered chunk of notifications past their retention cutoff,
+        in its own short transaction. Returns (deleted, last notification_id examined);
+        fewer than chunk_size deleted means the scan reached the end of the table.
+        """
+        try:
+            with self.session_factory() as session:
+                rows = session.execute(expired_chunk_query(cutoffs, after_id, chunk_size)).all()
+                deleted_count = self._delete_rows(session, rows)
+                return deleted_count, (rows[-1][0] if rows else after_id)
+        except Exception as e:
+            self.logger.error(f"Failed to purge expired notifications: {str(e)}")
+            raise RuntimeError(f"Failed to purge expired notifications: {str(e)}") from e
+        
+    def _remove_digest_items(self, session, subscription_id: int, digests) -> int:
+        """
+        Take a subscription's items out of (notification_id, user_id, details) digests and
+        commit. A digest keeps the other items, filed under the first one's subscription;
+        one left with none is deleted. Returns the number of items removed.
+        """
+        if not digests:
+            return 0
+        removed_count = 0
+        emptied = []
+        for notification_id, user_id, details in digests:
+            kept = [item for item in details or () if item["subscription_id"] != subscription_id]
+            removed_count += len(details or ()) - len(kept)
+            if kept:
+                session.execute(update_digest_stmt(notification_id, kept))
+            else:
+                emptied.append((notification_id, user_id))
+        session.execute(delete_digest_items_stmt([notification_id for notification_id, _, _ in digests], subscription_id))
+        # Deleting the emptied digests commits the rewrites too
+        self._delete_rows(session, emptied)
+        session.commit()
+        # The removed items' keys; the others are looked up again when next used
+        self.idempotency_keys.forget(notification_id for notification_id, _, _ in digests)
+        user_ids = {user_id for _, user_id, _ in digests}
+        self.recent_cache.invalidate(user_ids)
+        self.versions.bump(user_ids)
+        return removed_count
+
+    def _delete_rows(self, session, rows) -> int:
+        """Delete (notification_id, user_id) rows and commit, invalidating the users' unread counts
+        and forgetting the rows' cached dedup keys."""
+        if not rows:
+            return 0
+        with self.unread_counter.writing_many(user_id for _, user_id in rows) as unread_changes:
+            notification_ids = [notification_id for notification_id, _ in rows]
+            session.execute(delete_digest_items_stmt(notification_ids))
+            deleted_count = session.execute(delete_by_ids_stmt(notification_ids)).rowcount
+            session.commit()
+            for unread_change in unread_changes.values():
+                unread_change.invalidate = True
+        self.idempotency_keys.forget(notification_ids)
+        self.recent_cache.invalidate(unread_changes.keys())
+        self.versions.bump(unread_changes.keys())
+        return deleted_count
 
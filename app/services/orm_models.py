@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Enum, DateTime, func
+from sqlalchemy import Column, Integer, String, Text, Enum, DateTime, Index, JSON, func
 from app.utils.db import Base
 import enum
 from datetime import datetime
@@ -17,20 +17,61 @@ class NotificationType(str, enum.Enum):
 
 class NotificationORM(Base):
     __tablename__ = "notifications"
+    __table_args__ = (
+        # Newest-first listing and keyset pagination per user
+        Index("ix_notifications_user_created", "user_id", "created_at", "notification_id"),
+        # Same order restricted to unread rows (read_at IS NULL) without a filesort
+        Index("ix_notifications_user_unread", "user_id", "read_at", "created_at", "notification_id"),
+        # Email/SMS dispatcher claims: queued rows of a type that are due
+        Index("ix_notifications_dispatch", "status", "notification_type", "next_attempt_at"),
+        # Idempotency: a repeated dedup_key fails the INSERT. A unique index rather than a column
+        # constraint, so databases upgraded in place end up with exactly the same schema
+        Index("ix_notifications_dedup_key", "dedup_key", unique=True),
+    )
 
     notification_id = Column(Integer, primary_key=True, autoincrement=True)
     subscription_id = Column(Integer, nullable=False, index=True)
     user_id = Column(String(36), nullable=False, index=True)
     notification_type = Column(Enum(NotificationType), default=NotificationType.push, nullable=False)
     subject = Column(String(255), nullable=True)
-    message = Column(Text, nullable=True)
+    message = Column(Text, nullable=True)  # Raw body; NULL when rendered from a template
+    # Templated body: registered template id and its parameter values (a compact JSON array)
+    template_id = Column(String(64), nullable=True)
+    template_params = Column(Text, nullable=True)
+    # The request's metadata ("metadata" itself is reserved on declarative models)
+    meta = Column("metadata", JSON(none_as_null=True), key="meta", nullable=True)
     status = Column(Enum(NotificationStatus), default=NotificationStatus.queued, index=True)
     # Optional fields for different notification types
     recipient_email = Column(String(255), nullable=True)  # For email notifications
     device_token = Column(String(500), nullable=True)  # For push notifications (FCM)
+    recipient_phone = Column(String(32), nullable=True)  # For SMS notifications
+    dedup_key = Column(String(64), nullable=True)  # Ingest key of queued writes, makes replays idempotent
+    details = Column(JSON(none_as_null=True), nullable=True)  # Per-subscription items merged into a digest
+    # Dispatch fields (email/SMS): attempts so far, when the row may be claimed again
+    # (lease expiry or retry backoff) and the last provider error
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at = Column(DateTime, nullable=True)
+    last_error = Column(String(500), nullable=True)
     # Tracking fields
     read_at = Column(DateTime, nullable=True)
     delivered_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, server_default=func.now())
 
+
+class DigestItemORM(Base):
+    """
+    One item merged into a digest notification: the subscription it came from and its dedup
+    key, if it had one (the digest has no key of its own). A subscription delete takes its
+    items out of the digests they were merged into.
+    """
+    __tablename__ = "notification_digest_items"
+    __table_args__ = (
+        # A repeat of a merged item's key finds its digest; NULL keys don't collide
+        Index("ix_notification_digest_items_dedup_key", "dedup_key", unique=True),
+    )
+
+    item_id = Column(Integer, primary_key=True, autoincrement=True)
+    notification_id = Column(Integer, nullable=False, index=True)
+    subscription_id = Column(Integer, nullable=False, index=True)
+    dedup_key = Column(String(64), nullable=True)
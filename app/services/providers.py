@@ -0,0 +1,113 @@
+from typing import Any, Dict, List, NamedTuple, Optional
+import requests
+from mailjet_rest import Client
+
+
+class DeliveryOutcome(NamedTuple):
+    """Result of sending one message. retryable=False failures (bad address, rejected content) go straight to failed."""
+    ok: bool
+    error: Optional[str] = None
+    retryable: bool = True
+
+
+class MailjetProvider:
+    """
+    Sends email notifications through the Mailjet v3.1 Send API, up to max_batch messages
+    per call. send() blocks; the dispatcher runs it in the threadpool.
+    api_url can point at a local stub (see benchmarks/stub_providers.py).
+    """
+
+    name = "mailjet"
+
+    def __init__(
+        self,
+        api_key: str,
+        api_secret: str,
+        sender_email: str,
+        sender_name: str = "WhatSub",
+        api_url: Optional[str] = None,
+        timeout: float = 10.0,
+        max_batch: int = 50
+    ):
+        self.client = Client(auth=(api_key, api_secret), version="v3.1", api_url=api_url)
+        self.sender = {"Email": sender_email, "Name": sender_name}
+        self.timeout = timeout
+        # Mailjet accepts at most 50 messages per Send API call
+        self.max_batch = min(max_batch, 50)
+
+    def send(self, messages: List[Dict[str, Any]], retry_rejected: bool = True) -> List[DeliveryOutcome]:
+        data = {
+            "Messages": [
+                {
+                    "From": self.sender,
+                    "To": [{"Email": message["recipient_email"]}],
+                    "Subject": message["subject"] or "",
+                    "TextPart": message["message"] or "",
+                    "CustomID": str(message["id"]),
+                }
+                for message in messages
+            ]
+        }
+        try:
+            response = self.client.send.create(data=data, timeout=self.timeout)
+        except Exception as e:
+            return [DeliveryOutcome(False, f"mailjet: {str(e)}")] * len(messages)
+        if response.status_code == 429 or response.status_code >= 500:
+            return [DeliveryOutcome(False, f"mailjet: HTTP {response.status_code}")] * len(messages)
+        try:
+            results = response.json()["Messages"]
+        except (ValueError, KeyError):
+            # Auth or request-level errors have no per-message results; keep retrying until max attempts
+            return [DeliveryOutcome(False, f"mailjet: HTTP {response.status_code} {response.text[:200]}")] * len(messages)
+        # Per-message results come back in request order; errors there are about the message itself
+        outcomes = []
+        for result in results:
+            if result.get("Status") == "success":
+                outcomes.append(DeliveryOutcome(True))
+            else:
+                errors = "; ".join(e.get("ErrorMessage", "") for e in result.get("Errors", []))
+                outcomes.append(DeliveryOutcome(False, f"mailjet: {errors or 'rejected'}", retryable=False))
+        if response.status_code != 200 and retry_rejected:
+            # A 400 rejects the whole call, so messages without errors of their own were not
+            # sent either: send those again right away instead of burning one of their attempts
+            innocent = [i for i, outcome in enumerate(outcomes) if outcome.ok]
+            for i, outcome in zip(innocent, self.send([messages[i] for i in innocent], retry_rejected=False)):
+                outcomes[i] = outcome
+        return outcomes
+
+
+class WebhookSmsProvider:
+    """
+    Sends SMS notifications to an HTTP gateway, max_batch messages per POST of
+    {"messages": [{"id", "to", "text"}]}. The gateway answers with {"results": [{"status", "error"}]}
+    in request order. Connections are kept alive across calls.
+    """
+
+    name = "sms"
+
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 10.0, max_batch: int = 100):
+        self.url = url
+        self.timeout = timeout
+        self.max_batch = max_batch
+        self.session = requests.Session()
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def send(self, messages: List[Dict[str, Any]]) -> List[DeliveryOutcome]:
+        body = {
+            "messages": [
+                {"id": message["id"], "to": message["recipient_phone"], "text": message["message"] or ""}
+                for message in messages
+            ]
+        }
+        try:
+            response = self.session.post(self.url, json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            return [DeliveryOutcome(False, f"sms: {str(e)}")] * len(messages)
+        if response.status_code >= 300:
+            return [DeliveryOutcome(False, f"sms: HTTP {response.status_code}")] * len(messages)
+        return [
+            DeliveryOutcome(True) if result.get("status") == "sent"
+            else DeliveryOutcome(False, f"sms: {result.get('error') or 'rejected'}", retryable=False)
+            for result in response.json()["results"]
+        ]
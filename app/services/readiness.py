@@ -0,0 +1,100 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class DatabaseReadiness:
+    """
+    Readiness of this worker for /readyz, refreshed in the background so probes never wait
+    on the DB. Until `prepare` has succeeded once (schema check and whatever else startup
+    needs from the DB) the worker is not ready; after that it is ready while the latest
+    `ping`, run every `interval` seconds (every second while failing), succeeded within
+    `timeout` and is no older than `max_age`. `stop()` reports not ready from then on, so load
+    balancers drain the worker on shutdown.
+    """
+
+    def __init__(
+        self,
+        ping: Callable[[], Awaitable[Any]],
+        logger,
+        prepare: Optional[Callable[[], Awaitable[Any]]] = None,
+        interval: float = 5.0,
+        timeout: float = 2.0,
+        max_age: Optional[float] = None
+    ):
+        self.ping = ping
+        self.logger = logger
+        self.prepare = prepare
+        self.interval = interval
+        self.timeout = timeout
+        self.max_age = max_age if max_age is not None else 3 * interval
+        self.prepared = prepare is None
+        self.ok = False
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.checks = 0
+        self.failures = 0
+        self.stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            ok = await self.refresh()
+            await asyncio.sleep(self.interval if ok else min(self.interval, 1.0))
+
+    async def refresh(self) -> bool:
+        """Run one check now and record the outcome."""
+        started = time.monotonic()
+        try:
+            if not self.prepared:
+                await asyncio.wait_for(self.prepare(), timeout=max(self.timeout, 30.0))
+                self.prepared = True
+            await asyncio.wait_for(self.ping(), timeout=self.timeout)
+            if not self.ok and self.checks:
+                self.logger.info("Database reachable again, worker is ready")
+            self.ok, self.error = True, None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.ok or not self.checks:
+                self.logger.error(f"Worker not ready, database check failed: {str(e) or type(e).__name__}")
+            self.ok, self.error = False, str(e) or type(e).__name__
+            self.failures += 1
+        self.checks += 1
+        self.checked_at = time.monotonic()
+        self.latency = self.checked_at - started
+        return self.ok
+
+    def ready(self) -> bool:
+        return (
+            self.ok and not self.stopping and self.checked_at is not None
+            and time.monotonic() - self.checked_at <= self.max_age
+        )
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready(),
+            "database": {
+                "ok": self.ok,
+                "schema_checked": self.prepared,
+                "checked_seconds_ago": None if self.checked_at is None else round(time.monotonic() - self.checked_at, 3),
+                "latency_ms": None if self.latency is None else round(self.latency * 1000, 3),
+                "error": self.error,
+            },
+        }
+
+    def stats(self) -> Dict[str, int]:
+        return {"ready": int(self.ready()), "checks": self.checks, "failures": self.failures}
+
+    async def stop(self) -> None:
+        self.stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,214 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from app.models.notification import NotificationRead, NotificationStatus
+
+# A notification as a plain dict with the NotificationRead field names
+Row = Dict[str, Any]
+
+
+def _row_bytes(n: Row) -> int:
+    # Rough footprint: the row dict and its values. Rows are replaced, never changed in place,
+    # so a row's size is the same when it leaves the cache as when it came in
+    return sys.getsizeof(n) + sum(sys.getsizeof(v) for v in n.values())
+
+
+class _Entry:
+    def __init__(self, items: List[Row], complete: bool):
+        # Newest first, (created_at, id) descending, like the inbox query
+        self.items = items
+        # True when the user has no notifications beyond these
+        self.complete = complete
+        self.filled_at = time.monotonic()
+        self.bytes = sum(_row_bytes(n) for n in items)
+
+
+class _FillTicket:
+    def __init__(self, user_id: str, generation: int, delivered_generation: int):
+        self.user_id = user_id
+        self.generation = generation
+        self.delivered_generation = delivered_generation
+
+
+class RecentNotificationsCache:
+    """
+    Bounded LRU cache of each active user's newest `depth` notifications, used to serve the
+    first inbox page without a DB round trip. Rows are kept as plain dicts so a hit can be
+    serialized directly.
+
+    The service applies its writes after commit. Every update is idempotent (inserts are keyed
+    by id, read/delivered only set timestamps), so it is harmless if a concurrent fill already
+    saw the write. A fill that started before a write to the same user is discarded instead of
+    stored, so an entry never misses a committed write. Entries older than `ttl_seconds` are
+    treated as misses and re-read from the DB.
+    """
+
+    def __init__(self, max_users: int = 10000, depth: int = 50, ttl_seconds: float = 60.0):
+        self.max_users = max_users
+        self.depth = depth
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._owners: Dict[int, str] = {}
+        self._generations: Dict[str, int] = {}
+        # Delivered updates only carry ids, so they invalidate fills of every user
+        self._delivered_generation = 0
+        self._lock = threading.Lock()
+        # Running totals over all entries, kept as rows come and go so stats() is cheap
+        self._notifications = 0
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def page(self, user_id: str, limit: int, unread_only: bool = False) -> Optional[List[Row]]:
+        """The first page for user_id, or None if it can't be answered from the cache."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or time.monotonic() - entry.filled_at > self.ttl_seconds:
+                self.misses += 1
+                return None
+            items = entry.items
+            if unread_only:
+                # Unread rows past the cached window are older than every cached row, so the
+                # filtered window is exact as long as it fills the page
+                items = [n for n in items if n["read_at"] is None]
+            if len(items) < limit and not entry.complete:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return items[:limit]
+
+    def begin_fill(self, user_id: str) -> _FillTicket:
+        with self._lock:
+            return _FillTicket(user_id, self._generations.get(user_id, 0), self._delivered_generation)
+
+    def end_fill(self, ticket: _FillTicket, items: List[Row]) -> None:
+        """Store the newest-first rows read for ticket (queried with limit=depth), unless a write raced it."""
+        with self._lock:
+            if (
+                self._generations.get(ticket.user_id, 0) != ticket.generation
+                or self._delivered_generation != ticket.delivered_generation
+                or self.max_users <= 0
+            ):
+                return
+            self._store(ticket.user_id, _Entry(list(items[:self.depth]), complete=len(items) < self.depth))
+
+    def added(self, notifications: Iterable[NotificationRead]) -> None:
+        with self._lock:
+            for notification in notifications:
+                self._bump(notification.user_id)
+                entry = self._entries.get(notification.user_id)
+                if entry is None or any(n["id"] == notification.id for n in entry.items):
+                    continue
+                row = notification.model_dump()
+                items = entry.items + [row]
+                items.sort(key=lambda n: (n["created_at"], n["id"]), reverse=True)
+                self._resize(entry, 1, _row_bytes(row))
+                if len(items) > self.depth:
+                    for dropped in items[self.depth:]:
+                        self._owners.pop(dropped["id"], None)
+                        self._resize(entry, -1, -_row_bytes(dropped))
+                    items = items[:self.depth]
+                    entry.complete = False
+                entry.items = items
+                self._owners[notification.id] = notification.user_id
+
+    def marked_read(
+        self,
+        user_id: str,
+        read_at: datetime,
+        notification_ids: Optional[Iterable[int]] = None,
+        before: Optional[datetime] = None
+    ) -> None:
+        """Mirror mark_read_bulk_stmt: the given ids and/or everything created at or before `before`."""
+        ids = set(notification_ids) if notification_ids is not None else None
+        with self._lock:
+            self._bump(user_id)
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return
+            entry.items = [
+                self._replace(entry, n, read_at=read_at)
+                if n["read_at"] is None and (ids is None or n["id"] in ids) and (before is None or n["created_at"] <= before)
+                else n
+                for n in entry.items
+            ]
+
+    def delivered(self, notification_ids: Iterable[int], delivered_at: datetime) -> None:
+        with self._lock:
+            self._delivered_generation += 1
+            for notification_id in notification_ids:
+                entry = self._entries.get(self._owners.get(notification_id))
+                if entry is None:
+                    continue
+                entry.items = [
+                    self._replace(entry, n, delivered_at=delivered_at, status=NotificationStatus.delivered)
+                    if n["id"] == notification_id and n["delivered_at"] is None else n
+                    for n in entry.items
+                ]
+
+    def invalidate(self, user_ids: Iterable[str]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._bump(user_id)
+                self._drop(user_id)
+
+    def invalidate_all(self) -> None:
+        """Forget every entry, e.g. after losing track of which users another process wrote for."""
+        with self._lock:
+            self._entries.clear()
+            self._owners.clear()
+            self._notifications = self._bytes = 0
+            # Fills in flight compare against it for every user
+            self._delivered_generation += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "users": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "notifications": self._notifications,
+                "approx_bytes": self._bytes,
+            }
+
+    def _resize(self, entry: _Entry, notifications: int, size: int) -> None:
+        entry.bytes += size
+        self._notifications += notifications
+        self._bytes += size
+
+    def _replace(self, entry: _Entry, n: Row, **changes: Any) -> Row:
+        """A copy of entry's row n with changes, accounted for in the running totals."""
+        replaced = {**n, **changes}
+        self._resize(entry, 0, _row_bytes(replaced) - _row_bytes(n))
+        return replaced
+
+    def _bump(self, user_id: str) -> None:
+        # Only users with a fill in flight or a cached entry need a generation to compare against,
+        # but keeping it for every writer is simpler and bounded by the eviction below
+        self._generations[user_id] = self._generations.get(user_id, 0) + 1
+        if len(self._generations) > 4 * max(self.max_users, 1):
+            self._generations = {u: g for u, g in self._generations.items() if u in self._entries}
+            self._delivered_generation += 1
+
+    def _store(self, user_id: str, entry: _Entry) -> None:
+        self._drop(user_id)
+        self._entries[user_id] = entry
+        self._notifications += len(entry.items)
+        self._bytes += entry.bytes
+        for n in entry.items:
+            self._owners[n["id"]] = user_id
+        while len(self._entries) > self.max_users:
+            evicted_user, _ = next(iter(self._entries.items()))
+            self._drop(evicted_user)
+
+    def _drop(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._notifications -= len(entry.items)
+            self._bytes -= entry.bytes
+            for n in entry.items:
+                self._owners.pop(n["id"], None)
@@ -0,0 +1,156 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from app.models.notification import DeleteJobStatus
+from app.services.orm_models import NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
+
+
+class RetentionPolicy:
+    """
+    Per type/status TTLs, e.g. {"*/delivered": 30, "email/failed": 7, "*/*": 365} (days).
+    For each (type, status) combination the most specific key wins, in the order
+    "type/status", "type/*", "*/status", "*/*". Combinations without a matching key are kept forever.
+    """
+
+    def __init__(self, ttl_days: Dict[str, int]):
+        self.ttl_days: Dict[Tuple[str, str], int] = {}
+        types = {t.value for t in ORMNotificationType}
+        statuses = {s.value for s in ORMNotificationStatus}
+        for key, days in ttl_days.items():
+            notification_type, _, notification_status = key.partition("/")
+            if notification_type not in types | {"*"} or notification_status not in statuses | {"*"}:
+                raise ValueError(f"Invalid retention key {key!r}, expected '<type|*>/<status|*>'")
+            # bool is an int too; a TTL of zero days or less would purge rows as they are written
+            if not isinstance(days, int) or isinstance(days, bool) or days < 1:
+                raise ValueError(f"Invalid retention TTL {days!r} for {key!r}, expected a whole number of days >= 1")
+            self.ttl_days[(notification_type, notification_status)] = days
+
+    def __bool__(self) -> bool:
+        return bool(self.ttl_days)
+
+    def cutoffs(self, now: datetime) -> List[Tuple[ORMNotificationType, ORMNotificationStatus, datetime]]:
+        cutoffs = []
+        for notification_type in ORMNotificationType:
+            for notification_status in ORMNotificationStatus:
+                for key in (
+                    (notification_type.value, notification_status.value),
+                    (notification_type.value, "*"),
+                    ("*", notification_status.value),
+                    ("*", "*"),
+                ):
+                    if key in self.ttl_days:
+                        cutoffs.append((notification_type, notification_status, now - timedelta(days=self.ttl_days[key])))
+                        break
+        return cutoffs
+
+
+class RetentionPurger:
+    """
+    Background task that deletes expired notifications every `interval` seconds.
+    Each pass walks the table in primary-key order, deleting at most chunk_size rows per
+    short transaction and sleeping `pause` seconds between chunks, so it never holds locks
+    for long or builds up a large undo log, and leaves room for request traffic.
+    """
+
+    def __init__(
+        self,
+        service,
+        logger,
+        policy: RetentionPolicy,
+        chunk_size: int = 1000,
+        pause: float = 0.1,
+        interval: float = 3600.0
+    ):
+        self.service = service
+        self.logger = logger
+        self.policy = policy
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self.deleted_total = 0
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.purge()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Whatever was deleted stays deleted; the next pass picks up the rest
+                self.logger.error(f"Retention purge failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def purge(self) -> int:
+        """Run one full pass. Returns the number of notifications deleted."""
+        cutoffs = self.policy.cutoffs(datetime.utcnow())
+        if not cutoffs:
+            return 0
+        started = time.monotonic()
+        deleted, after_id = 0, 0
+        while True:
+            chunk_deleted, after_id = await self.service.purge_expired_chunk(cutoffs, after_id, self.chunk_size)
+            deleted += chunk_deleted
+            self.deleted_total += chunk_deleted
+            if chunk_deleted < self.chunk_size:
+                break
+            await asyncio.sleep(self.pause)
+        elapsed = time.monotonic() - started
+        self.logger.info(f"Retention purge deleted {deleted} notifications in {elapsed:.1f}s")
+        return deleted
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+class SubscriptionDeleteJobs:
+    """
+    Runs chunked subscription deletes in the background and keeps the progress of the
+    most recent `max_jobs` of them for polling.
+    """
+
+    def __init__(self, service, logger, chunk_size: int = 1000, max_jobs: int = 100):
+        self.service = service
+        self.logger = logger
+        self.chunk_size = chunk_size
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, DeleteJobStatus]" = OrderedDict()
+        self._tasks = set()
+
+    def start(self, subscription_id: int) -> DeleteJobStatus:
+        job = DeleteJobStatus(job_id=uuid.uuid4().hex, subscription_id=subscription_id)
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_jobs:
+            self._jobs.popitem(last=False)
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[DeleteJobStatus]:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: DeleteJobStatus) -> None:
+        def progress(deleted: int) -> None:
+            job.deleted = deleted
+
+        try:
+            job.deleted = await self.service.delete_notifications_by_subscription_id(
+                job.subscription_id, chunk_size=self.chunk_size, progress=progress
+            )
+            job.status = "completed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
@@ -0,0 +1,85 @@
+import string
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+import orjson
+
+# Body templates known to every worker. Rows store the template id, so a template's text
+# must not change once rows use it: register the new wording under a new id instead.
+DEFAULT_TEMPLATES = {
+    # The Cloud Function's subscription-due message
+    "payment_due": (
+        "Hello {user_name},\n\n"
+        "Your subscription for {subscription_plan} is due on {billing_date}.\n"
+        "Amount: ${price}\n\n"
+        "Please ensure your payment method is up to date."
+    ),
+}
+
+
+class NotificationTemplate:
+    def __init__(self, template_id: str, body: str):
+        self.template_id = template_id
+        self.body = body
+        # Placeholder names in a fixed order, which is the order of the stored parameter values
+        self.fields: Tuple[str, ...] = tuple(sorted({
+            name for _, name, _, _ in string.Formatter().parse(body) if name
+        }))
+
+
+class TemplateRegistry:
+    """
+    Notification body templates. Templated rows store a template id and their parameter
+    values as a compact JSON array (in the template's field order, without the names)
+    instead of the rendered text; bodies are rendered on read. Rendered bodies are memoized
+    in a bounded LRU keyed by (template id, stored parameters), so rows read again and again
+    (inboxes that are polled, SSE catch-ups) are formatted once. A row whose template is no
+    longer registered reads with no message.
+    """
+
+    def __init__(self, templates: Optional[Dict[str, str]] = None, cache_size: int = 10000):
+        self.templates: Dict[str, NotificationTemplate] = {}
+        for template_id, body in (DEFAULT_TEMPLATES if templates is None else templates).items():
+            self.register(template_id, body)
+        self.cache_size = cache_size
+        self.render = lru_cache(maxsize=cache_size)(self._render)
+        self.unknown = 0
+
+    def register(self, template_id: str, body: str) -> None:
+        self.templates[template_id] = NotificationTemplate(template_id, body)
+
+    def validate(self, template_id: str, params: Optional[Dict[str, Any]]) -> None:
+        """Raise ValueError unless template_id is registered and params has all its fields."""
+        template = self.templates.get(template_id)
+        if template is None:
+            raise ValueError(f"Unknown template {template_id!r}")
+        missing = [field for field in template.fields if field not in (params or {})]
+        if missing:
+            raise ValueError(f"Template {template_id!r} needs {', '.join(missing)}")
+
+    def pack(self, template_id: str, params: Optional[Dict[str, Any]]) -> str:
+        """The stored form of a validated request's params; keys the template doesn't use are dropped."""
+        return orjson.dumps([params[field] for field in self.templates[template_id].fields]).decode()
+
+    def _render(self, template_id: str, packed: str) -> Optional[str]:
+        # Memoized as self.render
+        template = self.templates.get(template_id)
+        if template is None:
+            self.unknown += 1
+            return None
+        return template.body.format_map(dict(zip(template.fields, orjson.loads(packed))))
+
+    def message(self, template_id: Optional[str], packed: Optional[str], message: Optional[str]) -> Optional[str]:
+        """The body of a stored row: its rendered template, or its raw message."""
+        if template_id is None:
+            return message
+        return self.render(template_id, packed)
+
+    def stats(self) -> Dict[str, int]:
+        info = self.render.cache_info()
+        return {
+            "templates": len(self.templates),
+            "rendered": info.currsize,
+            "hits": info.hits,
+            "misses": info.misses,
+            "unknown": self.unknown,
+        }
@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class _FillTicket:
+    """A DB read of a user's count that may be stored in the cache once it completes."""
+
+    def __init__(self, user_id: str, tainted: bool):
+        self.user_id = user_id
+        self.tainted = tainted
+
+
+class _PendingChange:
+    """What a write did to a user's unread count, set by the caller after commit."""
+
+    def __init__(self):
+        self.delta = 0
+        self.invalidate = False
+
+
+class UnreadCounterCache:
+    """
+    Bounded LRU cache of per-user unread counts, kept up to date incrementally by the service.
+
+    Writers wrap their DB change in `writing(user_id)` and record the delta after commit.
+    A lazy fill from the DB is only stored if no write to the same user overlapped it, so a
+    count read before (or after) a concurrent commit can never be combined with that commit's
+    delta. Entries older than `reconcile_seconds` are treated as misses and re-read from the DB.
+    """
+
+    def __init__(self, max_users: int = 10000, reconcile_seconds: float = 300.0):
+        self.max_users = max_users
+        self.reconcile_seconds = reconcile_seconds
+        self._counts: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._writes_in_flight: Dict[str, int] = {}
+        self._fills: Dict[str, List[_FillTicket]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: str) -> Optional[int]:
+        with self._lock:
+            entry = self._counts.get(user_id)
+            if entry is None or time.monotonic() - entry[1] > self.reconcile_seconds:
+                self.misses += 1
+                return None
+            self._counts.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def begin_fill(self, user_id: str) -> _FillTicket:
+        with self._lock:
+            ticket = _FillTicket(user_id, tainted=self._writes_in_flight.get(user_id, 0) > 0)
+            self._fills.setdefault(user_id, []).append(ticket)
+            return ticket
+
+    def end_fill(self, ticket: _FillTicket, count: Optional[int]) -> None:
+        """Store the count read for ticket, unless a write overlapped the read. Pass None on failure."""
+        with self._lock:
+            tickets = self._fills.get(ticket.user_id, [])
+            if ticket in tickets:
+                tickets.remove(ticket)
+            if not tickets:
+                self._fills.pop(ticket.user_id, None)
+            if count is None or ticket.tainted:
+                return
+            self._counts[ticket.user_id] = (count, time.monotonic())
+            self._counts.move_to_end(ticket.user_id)
+            while len(self._counts) > self.max_users:
+                self._counts.popitem(last=False)
+
+    @contextmanager
+    def writing(self, user_id: str):
+        """Bracket a DB write that changes user_id's unread count; set .delta or .invalidate after commit."""
+        change = _PendingChange()
+        with self._lock:
+            self._writes_in_flight[user_id] = self._writes_in_flight.get(user_id, 0) + 1
+            for ticket in self._fills.get(user_id, ()):
+                ticket.tainted = True
+        try:
+            yield change
+        finally:
+            with self._lock:
+                remaining = self._writes_in_flight[user_id] - 1
+                if remaining:
+                    self._writes_in_flight[user_id] = remaining
+                else:
+                    del self._writes_in_flight[user_id]
+                if change.invalidate:
+                    self._counts.pop(user_id, None)
+                elif change.delta and user_id in self._counts:
+                    count, filled_at = self._counts[user_id]
+                    self._counts[user_id] = (max(0, count + change.delta), filled_at)
+
+    @contextmanager
+    def writing_many(self, user_ids: Iterable[str]):
+        """writing() for several users at once; yields a dict of user_id -> change."""
+        with ExitStack() as stack:
+            yield {user_id: stack.enter_context(self.writing(user_id)) for user_id in dict.fromkeys(user_ids)}
+
+    def invalidate(self, user_ids: Iterable[str]) -> None:
+        """Forget user_ids' counts after a write this cache did not bracket, e.g. one made by another process."""
+        with self._lock:
+            for user_id in user_ids:
+                for ticket in self._fills.get(user_id, ()):
+                    ticket.tainted = True
+                self._counts.pop(user_id, None)
+
+    def invalidate_all(self) -> None:
+        """Forget every count, e.g. after losing track of which users another process wrote for."""
+        with self._lock:
+            for tickets in self._fills.values():
+                for ticket in tickets:
+                    ticket.tainted = True
+            self._counts.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"users": len(self._counts), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,59 @@
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Callable, Iterable, List
+
+
+class UserVersions:
+    """
+    Per-user version numbers for conditional GETs, bumped by the service after every committed
+    write that changes what a user's list or unread count looks like.
+
+    Versions come from one process-wide sequence, so when a user is evicted the tracker only
+    has to remember the highest version it forgot (the floor): a forgotten user reports the
+    floor, which is at least as new as any version it was ever given out. ETags also carry a
+    random per-process epoch so a restart, which resets the sequence, never matches old tags.
+    With several worker processes, writes made elsewhere arrive through the event bus, which
+    listens to bump() here and bumps the other processes' trackers with notify=False; if the
+    bus loses such an event, `new_epoch` retires every tag. Without such a bus, workers never
+    hear of each other's writes; `etags=False` keeps the versions but serves no ETags.
+    """
+
+    def __init__(self, max_users: int = 100000, etags: bool = True):
+        self.max_users = max_users
+        self.etags = etags
+        self.epoch = uuid.uuid4().hex[:8]
+        self._versions: "OrderedDict[str, int]" = OrderedDict()
+        self._sequence = 0
+        self._floor = 0
+        self._lock = threading.Lock()
+        # Called with the bumped user ids after every bump(notify=True)
+        self.listeners: List[Callable[[List[str]], None]] = []
+
+    def get(self, user_id: str) -> int:
+        with self._lock:
+            return self._versions.get(user_id, self._floor)
+
+    def bump(self, user_ids: Iterable[str], notify: bool = True) -> None:
+        user_ids = list(user_ids)
+        with self._lock:
+            for user_id in user_ids:
+                self._sequence += 1
+                self._versions[user_id] = self._sequence
+                self._versions.move_to_end(user_id)
+            while len(self._versions) > self.max_users:
+                _, version = self._versions.popitem(last=False)
+                self._floor = max(self._floor, version)
+        if notify:
+            for listener in self.listeners:
+                listener(user_ids)
+
+    def new_epoch(self) -> None:
+        """Invalidate every ETag given out so far, for when writes may have gone unseen."""
+        with self._lock:
+            self.epoch = uuid.uuid4().hex[:8]
+
+    def etag(self, user_id: str, variant: str = "") -> str:
+        """Weak ETag for user_id's current version; variant tells apart representations (e.g. query strings)."""
+        return f'W/"{self.epoch}-{self.get(user_id)}-{zlib.crc32(variant.encode()):08x}"'
@@ -0,0 +1,22 @@
+import logging
+import logging.handlers
+import queue
+from typing import Tuple
+
+
+def create_access_logger(name: str = "whatsub-notification.access", stream=None) -> Tuple[logging.Logger, logging.handlers.QueueListener]:
+    """
+    Access logger whose records are handed to a queue and written by a background thread,
+    so a slow stdout never blocks the event loop. Start the listener on startup and stop it
+    on shutdown to flush what is left.
+    """
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    access_logger = logging.getLogger(name)
+    access_logger.handlers = [logging.handlers.QueueHandler(records)]
+    access_logger.propagate = False
+    access_logger.setLevel(logging.INFO)
+
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    return access_logger, listener
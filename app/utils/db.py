@@ -1,22 +1,136 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Connection, make_url
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.declarative import declarative_base
-from typing import Generator, Callable
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from typing import Any, Generator, Callable
+from starlette.concurrency import run_in_threadpool
+from functools import lru_cache
 from app.utils.settings import get_settings
+from app.utils.pool_metrics import InstrumentedAsyncQueuePool, InstrumentedQueuePool
+from app.utils.metrics_registry import get_metrics_registry
 
 Base = declarative_base()
 settings = get_settings()
 
 def get_db_url() -> str:
+    if settings.database_url:
+        return settings.database_url
     return f"mysql+pymysql://{settings.db_user}:{settings.db_pass}@{settings.db_host}:{settings.db_port}/{settings.db_name}"
 
+# asyncio driver used for each backend when the configured URL names a sync one
+ASYNC_DRIVERS = {"mysql": "aiomysql", "sqlite": "aiosqlite"}
+
+def get_async_db_url() -> str:
+    """get_db_url() with its driver swapped for the backend's asyncio driver, unless it already names one."""
+    url = make_url(get_db_url())
+    if url.get_dialect().is_async:
+        return get_db_url()
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No asyncio driver known for {backend}; set DATABASE_URL to an async driver's URL")
+    return url.set(drivername=f"{backend}+{ASYNC_DRIVERS[backend]}").render_as_string(hide_password=False)
+
+def get_pool_options() -> dict:
+    return {
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+def count_statements(engine) -> None:
+    """Count every statement the engine executes in the db_statements_total metric."""
+    statements = get_metrics_registry().counter("db_statements_total", "SQL statements executed")
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        # The explicit BEGIN of configure_sqlite; MySQL begins implicitly
+        if statement != "BEGIN":
+            statements.inc()
+
+def configure_sqlite(engine) -> None:
+    """
+    Make a local SQLite database (DATABASE_URL=sqlite:///...) usable by the service:
+    WAL so readers don't block the writer, a busy timeout instead of immediate "database is
+    locked" errors, and SQLAlchemy-managed transactions so SAVEPOINTs work with pysqlite.
+    """
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        # Through a cursor, which aiosqlite's adapted connection has too
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+@lru_cache(maxsize=1)
 def get_engine():
-    return create_engine(get_db_url(), pool_pre_ping=True)
+    """The process-wide engine; every session factory shares its connection pool."""
+    url = get_db_url()
+    sqlite = url.startswith("sqlite")
+    engine = create_engine(
+        url,
+        poolclass=InstrumentedQueuePool,
+        connect_args={"check_same_thread": False} if sqlite else {},
+        **get_pool_options()
+    )
+    if sqlite:
+        configure_sqlite(engine)
+    count_statements(engine)
+    return engine
 
 def get_session_factory() -> Callable[[], Session]:
-    engine = get_engine()
-    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+@lru_cache(maxsize=1)
+def get_async_engine():
+    """The process-wide async engine, used when db_async is enabled."""
+    url = get_async_db_url()
+    engine = create_async_engine(url, poolclass=InstrumentedAsyncQueuePool, **get_pool_options())
+    if url.startswith("sqlite"):
+        configure_sqlite(engine.sync_engine)
+    count_statements(engine.sync_engine)
+    return engine
+
+def get_async_session_factory(engine=None) -> Callable[[], AsyncSession]:
+    # Objects must stay usable after commit; lazy refresh is not possible under asyncio
+    return async_sessionmaker(bind=engine or get_async_engine(), autoflush=False, expire_on_commit=False)
+
+def get_pool_stats() -> dict:
+    """Checkout/overflow/wait/timeout figures for the pool of the engine the service uses."""
+    pool = get_async_engine().sync_engine.pool if settings.db_async else get_engine().pool
+    return pool.metrics.snapshot(pool)
 
 def create_all(engine):
     Base.metadata.create_all(bind=engine)
 
+def ping_database(conn: Connection) -> None:
+    conn.execute(text("SELECT 1"))
+
+async def run_with_connection(fn: Callable[..., Any], *args) -> Any:
+    """
+    Run fn(connection, *args) in a transaction on the engine the service uses (the async one
+    when db_async is enabled, so startup never builds both), without blocking the event loop.
+    """
+    if settings.db_async:
+        async with get_async_engine().begin() as conn:
+            return await conn.run_sync(fn, *args)
+
+    def run():
+        with get_engine().begin() as conn:
+            return fn(conn, *args)
+    return await run_in_threadpool(run)
+
+async def dispose_engine() -> None:
+    """Close the pooled connections of the engine the service uses, on shutdown. aiosqlite
+    runs each connection in its own thread, which would otherwise keep the process alive."""
+    if settings.db_async:
+        await get_async_engine().dispose()
+    else:
+        await run_in_threadpool(get_engine().dispose)
@@ -0,0 +1,22 @@
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+# Opaque keyset cursors for notification listings: (created_at, notification_id) of the last row seen.
+
+def encode_cursor(created_at: datetime, notification_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), notification_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, notification_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        # Only what encode_cursor writes; int() would also take floats, bools and numeric strings
+        if type(notification_id) is not int:
+            raise TypeError(f"notification id {notification_id!r} is not an integer")
+        return datetime.fromisoformat(created_at), notification_id
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
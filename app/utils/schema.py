@@ -0,0 +1,109 @@
+"""
+Schema management. The schema_version table records which version of the ORM models the
+database was created for, so startup verifies it with one query instead of reflecting every
+table. Deployments that run migrations as a separate step apply them with
+
+    python -m app.utils.schema
+
+and set SCHEMA_AUTO_UPGRADE=false; otherwise the first readiness check upgrades a database
+whose version is behind.
+
+A new database is created from the models and stamped with SCHEMA_VERSION. An existing one
+(one from before versioning reads as version 0) runs the UPGRADES steps above its version in
+order. Each step adds the tables, columns and indexes its version introduced and skips
+whatever is already there: MySQL commits every ALTER TABLE on its own, so a step that failed
+partway is simply run again. Adding a version means adding its step here; an upgraded
+database has to end up with the same schema as one created fresh.
+"""
+
+from typing import Callable, Dict, Optional
+from sqlalchemy import Column, Index, Integer, Table, delete, insert, inspect, select, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.schema import CreateColumn
+from app.utils.db import Base, get_engine
+from app.services.orm_models import NotificationORM
+
+# Bump with every change to the ORM models, and add the step to UPGRADES
+SCHEMA_VERSION = 1
+
+schema_version_table = Table(
+    "schema_version",
+    Base.metadata,
+    Column("version", Integer, nullable=False),
+)
+
+def read_schema_version(conn: Connection) -> Optional[int]:
+    """The recorded schema version, or None for a database created before versioning (or empty)."""
+    try:
+        return conn.execute(select(schema_version_table.c.version)).scalar()
+    except (OperationalError, ProgrammingError):
+        # No schema_version table; a failed statement leaves MySQL and SQLite transactions usable
+        return None
+
+def add_column(conn: Connection, column: Column) -> None:
+    """ALTER TABLE ... ADD COLUMN unless the table has it; it must be nullable or have a server default."""
+    existing = {c["name"] for c in inspect(conn).get_columns(column.table.name)}
+    if column.name not in existing:
+        preparer = conn.dialect.identifier_preparer
+        conn.execute(text(
+            f"ALTER TABLE {preparer.format_table(column.table)} "
+            f"ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"
+        ))
+
+def create_index(conn: Connection, index: Index) -> None:
+    """CREATE [UNIQUE] INDEX unless an index of that name exists."""
+    if index.name not in {i["name"] for i in inspect(conn).get_indexes(index.table.name)}:
+        index.create(bind=conn)
+
+def upgrade_to_1(conn: Connection) -> None:
+    """From the original notifications table: delivery and ingestion columns (dedup_key,
+    digest details, dispatch attempts, templated bodies, metadata), the listing, dispatch and
+    dedup_key indexes, and notification_digest_items (added by create_all in upgrade_schema)."""
+    c = NotificationORM.__table__.c
+    for column in (
+        c.recipient_phone, c.dedup_key, c.details, c.attempts, c.next_attempt_at, c.last_error,
+        c.template_id, c.template_params, c.meta
+    ):
+        add_column(conn, column)
+    for index in NotificationORM.__table__.indexes:
+        create_index(conn, index)
+
+UPGRADES: Dict[int, Callable[[Connection], None]] = {
+    1: upgrade_to_1,
+}
+
+def upgrade_schema(conn: Connection) -> None:
+    """Create a new database, or run the upgrade steps above its version; then record SCHEMA_VERSION."""
+    version = read_schema_version(conn)
+    existing = inspect(conn).has_table(NotificationORM.__tablename__)
+    # Creates the tables a database lacks (schema_version, or all of them when it is new)
+    Base.metadata.create_all(bind=conn)
+    if existing:
+        for step in range((version or 0) + 1, SCHEMA_VERSION + 1):
+            UPGRADES[step](conn)
+    conn.execute(delete(schema_version_table))
+    conn.execute(insert(schema_version_table).values(version=SCHEMA_VERSION))
+
+def ensure_schema(conn: Connection, auto_upgrade: bool) -> int:
+    """
+    Check the recorded schema version and upgrade the database if it is behind and
+    auto_upgrade is set. Returns the version the database is at; a version newer than
+    SCHEMA_VERSION (a later build already migrated it) is left to the caller.
+    """
+    version = read_schema_version(conn)
+    if version is not None and version >= SCHEMA_VERSION:
+        return version
+    if not auto_upgrade:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this build needs {SCHEMA_VERSION}; "
+            f"run python -m app.utils.schema"
+        )
+    upgrade_schema(conn)
+    return SCHEMA_VERSION
+
+if __name__ == "__main__":
+    with get_engine().begin() as conn:
+        before = read_schema_version(conn)
+        upgrade_schema(conn)
+    print(f"Schema upgraded from version {before} to {SCHEMA_VERSION}")
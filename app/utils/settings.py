@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Dict, Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -19,6 +20,134 @@ class Settings(BaseSettings):
     db_user: str = Field(default="notify_user")
     db_pass: str = Field(default="password")
     db_name: str = Field(default="notification_db")
+    # Full SQLAlchemy URL; overrides the db_* fields above (e.g. sqlite:///./local.db)
+    database_url: Optional[str] = Field(default=None)
+    # Use the native asyncio service instead of offloading sync calls to threads; the async
+    # engine uses the same database with the backend's asyncio driver (aiomysql, aiosqlite)
+    db_async: bool = Field(default=False)
+    
+    # Connection pool settings (per process; size against the number of uvicorn workers)
+    db_pool_size: int = Field(default=10)
+    db_max_overflow: int = Field(default=20)
+    db_pool_timeout: float = Field(default=10.0)
+    db_pool_recycle: int = Field(default=1800)
+    db_pool_pre_ping: bool = Field(default=True)
+    # Create or upgrade the schema when its recorded version is behind this build; turn off
+    # when migrations run as a deploy step (python -m app.utils.schema)
+    schema_auto_upgrade: bool = Field(default=True)
+    # Admission control: concurrent requests per endpoint class and worker (0 = unlimited). Keep
+    # the sum at or below db_pool_size + db_max_overflow so admitted requests never wait for a
+    # connection. Excess requests wait up to admission_max_wait_ms in a queue of
+    # admission_queue_size per class, then get admission_reject_status (503, or 429 behind
+    # proxies that eject backends on 5xx) with Retry-After
+    admission_writes_limit: int = Field(default=8)
+    admission_reads_limit: int = Field(default=8)
+    admission_counts_limit: int = Field(default=8)
+    # SSE streams catching up from the DB (resumes that the replay buffer can't answer)
+    admission_connects_limit: int = Field(default=4)
+    admission_queue_size: int = Field(default=32)
+    admission_max_wait_ms: int = Field(default=250)
+    admission_retry_after_seconds: int = Field(default=1)
+    admission_reject_status: int = Field(default=503)
+    # /readyz answers from a background DB ping refreshed this often
+    readiness_interval_seconds: float = Field(default=5.0)
+    readiness_timeout_seconds: float = Field(default=2.0)
+    
+    # Batch ingestion settings
+    notification_batch_max_items: int = Field(default=1000)
+    notification_batch_chunk_size: int = Field(default=500)
+    # Coalescing: push notifications for one user arriving within the window are stored as a
+    # single digest of up to coalesce_max_group items. 0 disables; queued ingestion bypasses it.
+    coalesce_window_ms: int = Field(default=0)
+    coalesce_max_group: int = Field(default=20)
+    
+    # Unread counter cache settings
+    unread_cache_max_users: int = Field(default=10000)
+    unread_cache_reconcile_seconds: float = Field(default=300.0)
+    
+    # Recent notifications cache (first inbox page) settings
+    recent_cache_max_users: int = Field(default=10000)
+    recent_cache_depth: int = Field(default=50)
+    recent_cache_ttl_seconds: float = Field(default=60.0)
+    # Users whose ETag version is tracked individually; older ones share a conservative floor
+    etag_versions_max_users: int = Field(default=100000)
+    # ETags on the inbox and unread count. Versions are per process: with several workers they
+    # need an event bus (EVENT_BUS=unix or broker), and are refused with the in-process one when
+    # WEB_CONCURRENCY (uvicorn's and gunicorn's default worker count) is above 1
+    etags_enabled: bool = Field(default=True)
+    web_concurrency: int = Field(default=1)
+    # Recently used idempotency keys answered from memory; older repeats are caught by the unique index
+    idempotency_cache_max_keys: int = Field(default=100000)
+    # Rendered bodies of templated notifications kept in memory, keyed by template and params
+    template_render_cache_size: int = Field(default=10000)
+    
+    # SSE streaming settings
+    sse_heartbeat_seconds: float = Field(default=15.0)
+    sse_queue_size: int = Field(default=100)
+    # SSE streams per worker (0 = unlimited); streams beyond it are told to reconnect later
+    sse_max_connections: int = Field(default=10000)
+    # Recent notifications kept per user (for up to sse_replay_max_users users) so streams resuming
+    # with Last-Event-ID catch up without a query; 0 always catches up from the DB. Assumes every
+    # notification reaches this worker's hub: a single worker, or an event bus
+    sse_replay_size: int = Field(default=20)
+    sse_replay_max_users: int = Field(default=10000)
+    # How long a gap in the published notification ids (an insert still committing, one that
+    # rolled back, an event the bus lost) holds back the id streams tell clients to resume from
+    sse_settle_ms: int = Field(default=5000)
+    # Client reconnect delay sent in the stream's retry: field, spread randomly up to twice this
+    # so clients dropped together (deploys) don't all come back at once
+    sse_retry_ms: int = Field(default=3000)
+    delivery_ack_batch_size: int = Field(default=500)
+    delivery_ack_flush_ms: int = Field(default=250)
+    # How SSE events reach streams in other processes: "inprocess" (single worker), "unix"
+    # (workers on this machine, via datagram sockets in event_bus_socket_dir) or "broker"
+    # (any number of machines, through the adapter factory named "package.module:factory")
+    event_bus: str = Field(default="inprocess")
+    event_bus_socket_dir: str = Field(default="/tmp/whatsub-event-bus")
+    event_bus_broker_adapter: Optional[str] = Field(default=None)
+    # How often each worker tells its peers how many events it has sent, so a lost one (and the
+    # cache invalidations in it) is noticed within this long even when nothing else follows
+    event_bus_sync_ms: int = Field(default=1000)
+    # Events waiting for the bus's sender thread; beyond this they are dropped (and peers
+    # notice the loss) rather than blocking the request or event loop that published them
+    event_bus_send_queue_size: int = Field(default=1000)
+    
+    # Ingestion settings: "sync" writes each POST /notifications before responding, "queued"
+    # appends it to a local durable queue, returns 202 and group-commits in the background
+    ingestion_mode: str = Field(default="sync")
+    ingestion_queue_path: str = Field(default="./ingestion-queue.db")
+    ingestion_queue_synchronous: str = Field(default="NORMAL")
+    ingestion_flush_max_items: int = Field(default=500)
+    ingestion_flush_interval_ms: int = Field(default=50)
+    
+    # Retention settings: TTL in days per "<type|*>/<status|*>", as JSON in RETENTION_TTL_DAYS,
+    # e.g. {"*/delivered": 30, "*/failed": 7}. Empty keeps notifications forever.
+    retention_ttl_days: Dict[str, int] = Field(default_factory=dict)
+    retention_purge_interval_seconds: float = Field(default=3600.0)
+    retention_purge_chunk_size: int = Field(default=1000)
+    retention_purge_pause_ms: int = Field(default=100)
+    subscription_delete_chunk_size: int = Field(default=1000)
+    
+    # Email/SMS dispatcher settings; a type is only sent when its provider is configured below
+    dispatcher_enabled: bool = Field(default=False)
+    dispatch_claim_size: int = Field(default=500)
+    dispatch_lease_seconds: float = Field(default=300.0)
+    dispatch_concurrency: int = Field(default=4)
+    dispatch_max_attempts: int = Field(default=5)
+    dispatch_backoff_base_seconds: float = Field(default=30.0)
+    dispatch_backoff_max_seconds: float = Field(default=3600.0)
+    dispatch_poll_interval_seconds: float = Field(default=1.0)
+    mailjet_api_key: Optional[str] = Field(default=None)
+    mailjet_api_secret: Optional[str] = Field(default=None)
+    mailjet_sender_email: str = Field(default="noreply@whatsub.app")
+    mailjet_sender_name: str = Field(default="WhatSub")
+    # Override to send to a local stub, e.g. http://127.0.0.1:9000/
+    mailjet_api_url: Optional[str] = Field(default=None)
+    # Messages per second; 0 disables the limit
+    mailjet_rate_limit: float = Field(default=50.0)
+    sms_webhook_url: Optional[str] = Field(default=None)
+    sms_webhook_token: Optional[str] = Field(default=None)
+    sms_rate_limit: float = Field(default=10.0)
 
 @lru_cache(maxsize=1)
 def get_settings() -> Settings:
@@ -0,0 +1,131 @@
+"""
+Admission control under overload. Closed-loop clients read inboxes (GET /notifications)
+through the real router against a deliberately slow stand-in DB: SQLite with --db-ms added
+to every statement and a pool of --pool-size connections. A couple of clients keep polling
+unread counts meanwhile. For each concurrency, with admission control off and on, reports
+p50/p99 of the requests that were admitted (answered 200), throughput, how many were shed
+and the unread-count p99. Shed clients come back after Retry-After, as well-behaved ones do.
+
+Exits non-zero if, with admission control on, admitted p99 at the highest concurrency
+exceeds twice the p99 at the lowest plus the configured queue wait.
+
+    python -m benchmarks.bench_admission --concurrency 8 32 128 256
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event
+
+from app.resources.notifications import router as notifications_router
+from app.services.admission import AdmissionControl, ConcurrencyLimiter
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.utils.settings import get_settings
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, percentile, seed_notifications
+
+COUNT_CLIENTS = 2
+COUNTS_LIMIT = 2
+
+
+def make_admission(reads_limit, settings):
+    def limiter(limit):
+        return ConcurrencyLimiter(limit, settings.admission_queue_size, settings.admission_max_wait_ms / 1000)
+
+    return AdmissionControl(
+        {"reads": limiter(reads_limit), "counts": limiter(COUNTS_LIMIT)},
+        retry_after=settings.admission_retry_after_seconds,
+        reject_status=settings.admission_reject_status
+    )
+
+
+async def run(app, users, concurrency, seconds):
+    latencies, count_latencies = [], []
+    shed = 0
+    deadline = time.monotonic() + seconds
+
+    async def client(i, path, sink):
+        nonlocal shed
+        params = {"user_id": f"user-{i % users}"}
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await http.get(path, params=params)
+            if response.status_code == 200:
+                sink.append(time.perf_counter() - started)
+            else:
+                shed += 1
+                await asyncio.sleep(min(int(response.headers["Retry-After"]), max(0.0, deadline - time.monotonic())))
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(client(i, "/notifications", latencies) for i in range(concurrency)),
+            *(client(i, "/notifications/unread-count", count_latencies) for i in range(COUNT_CLIENTS))
+        )
+        elapsed = time.perf_counter() - started
+    return {
+        "p50": percentile(latencies, 50) * 1000,
+        "p99": percentile(latencies, 99) * 1000,
+        "rps": len(latencies) / elapsed,
+        "shed": shed,
+        "count_p99": percentile(count_latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128, 256])
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--db-ms", type=float, default=20.0)
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=50)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    engine = make_sqlite_engine(pool_size=args.pool_size, max_overflow=0, pool_timeout=120)
+    seed_notifications(engine, args.users, args.per_user)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def slow_database(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(args.db_ms / 1000)
+
+    app = FastAPI()
+    app.include_router(notifications_router)
+    app.state.notification_service = ThreadedNotificationService(
+        NotificationService(make_session_factory(engine), logger)
+    )
+
+    # Counts keep a couple of connections to themselves, so admitted requests never wait for one
+    reads_limit = args.pool_size - COUNTS_LIMIT
+    print(
+        f"DB +{args.db_ms:.0f} ms/statement, pool {args.pool_size}; admission limits reads {reads_limit}, "
+        f"counts {COUNTS_LIMIT}, queue {settings.admission_queue_size}, wait {settings.admission_max_wait_ms} ms"
+    )
+    print(f"{'admission':>9} {'clients':>7} {'p50 ms':>8} {'p99 ms':>8} {'rps':>7} {'shed':>7} {'count p99 ms':>13}")
+    admitted_p99 = []
+    for enabled in (False, True):
+        for concurrency in args.concurrency:
+            app.state.admission = make_admission(reads_limit, settings) if enabled else None
+            result = asyncio.run(run(app, args.users, concurrency, args.seconds))
+            if enabled:
+                admitted_p99.append(result["p99"])
+            print(
+                f"{'on' if enabled else 'off':>9} {concurrency:>7} {result['p50']:>8.1f} {result['p99']:>8.1f} "
+                f"{result['rps']:>7.0f} {result['shed']:>7} {result['count_p99']:>13.1f}"
+            )
+    engine.dispose()
+
+    bound = 2 * admitted_p99[0] + settings.admission_max_wait_ms
+    if admitted_p99[-1] > bound:
+        print(f"admitted p99 grew to {admitted_p99[-1]:.1f} ms, above {bound:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
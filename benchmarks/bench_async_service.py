@@ -0,0 +1,117 @@
+"""
+Latency of a cheap request while many SSE-style streams hit the DB concurrently.
+
+Compares calling the sync service directly on the event loop (the old SSE code path),
+the thread-offload fallback and the native async service. Needs `pip install aiosqlite`.
+Every statement is delayed by --db-latency-ms inside the driver's own thread to mimic
+a MySQL network round trip.
+
+    python -m benchmarks.bench_async_service --streams 200 --duration 5 --db-latency-ms 5
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.services.notification_service import NotificationService
+from app.services.async_notification_service import AsyncNotificationService, ThreadedNotificationService
+from app.utils.db import get_async_session_factory
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, percentile, seed_notifications
+
+
+def add_statement_latency(engine, latency_ms):
+    """Sleep in whichever thread executes each SQLite statement."""
+    delay = lambda statement: time.sleep(latency_ms / 1000.0)
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if hasattr(dbapi_connection, "await_"):
+            # aiosqlite: install the callback from inside its worker thread
+            dbapi_connection.await_(dbapi_connection._connection.set_trace_callback(delay))
+        else:
+            dbapi_connection.set_trace_callback(delay)
+
+
+class BlockingNotificationService:
+    """Awaitable wrapper that still runs the sync service on the event loop thread."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def __getattr__(self, name):
+        attr = getattr(self.service, name)
+
+        async def blocking(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return blocking
+
+
+async def stream_load(service, stop, index):
+    while not stop.is_set():
+        await service.get_user_notifications(user_id=f"user-{index % 4}", unread_only=True, limit=10)
+        await asyncio.sleep(0.2)
+
+
+async def run(service, streams, duration):
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(stream_load(service, stop, i)) for i in range(streams)]
+    latencies = []
+
+    async def probe(scheduled):
+        await service.get_unread_count("user-light")
+        latencies.append((time.perf_counter() - scheduled) * 1000)
+
+    probes = []
+    started = time.perf_counter()
+    scheduled = started
+    while scheduled < started + duration:
+        # Measure from the intended start time so event loop stalls are included
+        scheduled += 0.02
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        probes.append(asyncio.create_task(probe(scheduled)))
+    stop.set()
+    await asyncio.gather(*tasks, *probes)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--rows-per-user", type=int, default=200)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=4, per_user=args.rows_per_user)
+    engine.dispose()
+    add_statement_latency(engine, args.db_latency_ms)
+    sync_service = NotificationService(make_session_factory(engine), logger)
+
+    async def run_async():
+        async_engine = create_async_engine(engine.url.set(drivername="sqlite+aiosqlite"))
+        add_statement_latency(async_engine.sync_engine, args.db_latency_ms)
+        try:
+            service = AsyncNotificationService(get_async_session_factory(async_engine), logger)
+            return await run(service, args.streams, args.duration)
+        finally:
+            await async_engine.dispose()
+
+    modes = {
+        "blocking": lambda: run(BlockingNotificationService(sync_service), args.streams, args.duration),
+        "threaded": lambda: run(ThreadedNotificationService(sync_service), args.streams, args.duration),
+        "async": run_async,
+    }
+    print(f"{'mode':>10} {'probes':>7} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, factory in modes.items():
+        latencies = asyncio.run(factory())
+        print(f"{mode:>10} {len(latencies):>7} {percentile(latencies, 50):>8.2f} {percentile(latencies, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Notifications/sec vs batch size: one POST per notification vs POST /notifications/batch.
+
+    python -m benchmarks.bench_batch_insert --total 20000 --sizes 1 10 100 500 1000
+"""
+
+import argparse
+import time
+
+from app.models.notification import NotificationRequest
+from app.services.notification_service import NotificationService
+from benchmarks.common import StatementCounter, logger, make_session_factory, make_sqlite_engine
+
+
+def make_payloads(count, offset=0):
+    return [
+        NotificationRequest(
+            user_id=f"user-{(offset + i) % 1000}",
+            subscription_id=offset + i,
+            subject="Upcoming Payment: Netflix",
+            body="Hello Subscriber,\n\nYour subscription for Netflix is due on 2024-01-15.\nAmount: $15.99",
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--total", type=int, default=20000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 500, 1000])
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    print(f"{'batch size':>10} {'notif/s':>10} {'stmts/notif':>12}")
+    for size in args.sizes:
+        engine = make_sqlite_engine()
+        counter = StatementCounter(engine)
+        service = NotificationService(make_session_factory(engine), logger)
+        payloads = make_payloads(args.total)
+
+        started = time.perf_counter()
+        if size == 1:
+            for payload in payloads:
+                service.create_notification(payload)
+        else:
+            for start in range(0, len(payloads), size):
+                service.create_notifications(payloads[start:start + size])
+        elapsed = time.perf_counter() - started
+        print(f"{size:>10} {args.total / elapsed:>10.0f} {counter.count / args.total:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+100 single PATCH /notifications/{id}/read calls vs one PATCH /notifications/read call.
+
+    python -m benchmarks.bench_bulk_read --count 100 --rounds 20
+"""
+
+import argparse
+import time
+
+from sqlalchemy import update
+
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from benchmarks.common import StatementCounter, logger, make_session_factory, make_sqlite_engine, seed_notifications
+
+
+def reset_unread(engine):
+    with engine.begin() as conn:
+        conn.execute(update(NotificationORM).values(read_at=None))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=1, per_user=args.count)
+    counter = StatementCounter(engine)
+    service = NotificationService(make_session_factory(engine), logger)
+    logger.setLevel("WARNING")
+    ids = list(range(1, args.count + 1))
+
+    results = {}
+    for mode in ("single", "bulk"):
+        elapsed = 0.0
+        statements = 0
+        for _ in range(args.rounds):
+            reset_unread(engine)
+            counter.reset()
+            started = time.perf_counter()
+            if mode == "single":
+                for notification_id in ids:
+                    service.mark_notification_read(notification_id, "user-0")
+            else:
+                service.mark_notifications_read("user-0", ids)
+            elapsed += time.perf_counter() - started
+            statements += counter.reset()
+        results[mode] = (elapsed / args.rounds * 1000, statements / args.rounds)
+
+    print(f"{'mode':>7} {'ms per inbox':>13} {'statements':>11}")
+    for mode, (ms, statements) in results.items():
+        print(f"{mode:>7} {ms:>13.2f} {statements:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Rows written, SSE events published and added create latency on a synthetic billing-day
+trace, without coalescing and with several coalescing windows. Each user has 1-10
+subscriptions due; the billing run emits a user's reminders in a burst (spread over
+--burst-ms) and users start at random times across --span seconds.
+
+    python -m benchmarks.bench_coalescing --users 1000 --span 10 --windows 250 1000 2000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from sqlalchemy import func, select
+
+from app.models.notification import NotificationRequest
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.coalescer import NotificationCoalescer
+from app.services.notification_hub import NotificationHub
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, percentile
+
+
+class CountingHub(NotificationHub):
+    def __init__(self):
+        super().__init__()
+        self.published = 0
+
+    def publish(self, user_id, notification):
+        self.published += 1
+        return super().publish(user_id, notification)
+
+
+def billing_day_trace(users, span, burst, seed=7):
+    """(arrival offset in seconds, payload), sorted by arrival."""
+    rng = random.Random(seed)
+    trace = []
+    subscription_id = 0
+    for u in range(users):
+        start = rng.uniform(0, span)
+        # Most users have a few subscriptions, some have many
+        for _ in range(min(10, max(1, int(rng.paretovariate(1.2))))):
+            subscription_id += 1
+            trace.append((start + rng.uniform(0, burst), NotificationRequest(
+                user_id=f"user-{u}",
+                subscription_id=subscription_id,
+                subject=f"Upcoming Payment: Plan {subscription_id % 40}",
+                body="Your subscription is due today.",
+                metadata={"billing_date": "2026-10-17", "price": "9.99"},
+                dedup_key=f"due:{subscription_id}:2026-10-17"
+            )))
+    trace.sort(key=lambda entry: entry[0])
+    return trace
+
+
+async def run(trace, window, max_group):
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    hub = CountingHub()
+    service = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger, hub=hub))
+    coalescer = NotificationCoalescer(service, logger, window=window, max_group=max_group) if window else None
+    latencies = []
+    started = time.perf_counter()
+
+    async def deliver(offset, payload):
+        await asyncio.sleep(max(0.0, offset - (time.perf_counter() - started)))
+        sent = time.perf_counter()
+        if coalescer is not None:
+            await coalescer.submit(payload)
+        else:
+            await service.create_notification(payload)
+        latencies.append(time.perf_counter() - sent)
+
+    await asyncio.gather(*(deliver(offset, payload) for offset, payload in trace))
+    if coalescer is not None:
+        await coalescer.aclose()
+    with engine.connect() as conn:
+        rows = conn.execute(select(func.count()).select_from(NotificationORM)).scalar()
+        largest_inbox = conn.execute(
+            select(func.count()).select_from(NotificationORM).group_by(NotificationORM.user_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+    return rows, hub.published, largest_inbox, percentile(latencies, 50), percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--span", type=float, default=10.0)
+    parser.add_argument("--burst-ms", type=float, default=500)
+    parser.add_argument("--windows", type=int, nargs="+", default=[250, 1000, 2000])
+    parser.add_argument("--max-group", type=int, default=20)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    trace = billing_day_trace(args.users, args.span, args.burst_ms / 1000.0)
+    print(f"{len(trace)} notifications for {args.users} users over {args.span:.0f}s")
+    print(f"{'window ms':>9} {'rows':>6} {'events':>7} {'max inbox':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    for window_ms in [0] + args.windows:
+        rows, events, inbox, p50, p99 = asyncio.run(run(trace, window_ms / 1000.0, args.max_group))
+        print(f"{window_ms:>9} {rows:>6} {events:>7} {inbox:>9} {p50 * 1000:>7.1f} {p99 * 1000:>7.1f}")
+
+
+if __name__ == "__main__":
+    main()
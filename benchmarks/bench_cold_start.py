@@ -0,0 +1,120 @@
+"""
+Cold start of a worker: import time of app.main, the DB work of a schema check (version
+query vs reflecting every table with create_all, which startup used to run on every boot),
+and seconds from spawning uvicorn until /livez, /readyz and a first inbox read succeed,
+against an existing database and an empty one. Then starts a worker whose database is
+unreachable and checks it stays live but not ready; exits non-zero if it reports ready.
+
+    python -m benchmarks.bench_cold_start --runs 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.utils.schema import ensure_schema, upgrade_schema
+from benchmarks.common import StatementCounter, make_sqlite_engine, seed_notifications
+from benchmarks.suite import Server
+
+
+def import_seconds(runs):
+    code = "import time; t = time.perf_counter(); import app.main; print(time.perf_counter() - t)"
+    return statistics.median(
+        float(subprocess.check_output([sys.executable, "-c", code], env={**os.environ, "LOG_LEVEL": "WARNING"}))
+        for _ in range(runs)
+    )
+
+
+def schema_check_cost(engine, runs=20):
+    """(statements, ms) per check: create_all on an existing schema vs the version query."""
+    counter = StatementCounter(engine)
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+    figures = {}
+    for name, check in [
+        ("create_all", lambda conn: upgrade_schema(conn)),
+        ("version check", lambda conn: ensure_schema(conn, auto_upgrade=False)),
+    ]:
+        counter.reset()
+        started = time.perf_counter()
+        for _ in range(runs):
+            with engine.begin() as conn:
+                check(conn)
+        figures[name] = (counter.reset() / runs, (time.perf_counter() - started) / runs * 1000)
+    return figures
+
+
+async def start_once(database_path, workdir):
+    server = Server(database_path, os.path.join(workdir, "server.log"), {})
+    try:
+        async with httpx.AsyncClient(base_url=server.base_url, timeout=10) as client:
+            return await server.cold_start(client, "user-0")
+    finally:
+        server.stop()
+
+
+async def unreachable_database(workdir):
+    """(livez status, readyz status) of a worker whose SQLite file can't be opened."""
+    server = Server(os.path.join(workdir, "missing-dir", "notifications.db"), os.path.join(workdir, "down.log"), {})
+    try:
+        async with httpx.AsyncClient(base_url=server.base_url, timeout=10) as client:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    live = (await client.get("/livez")).status_code
+                    break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline:
+                        raise
+                    await asyncio.sleep(0.05)
+            await asyncio.sleep(1.0)  # a few readiness checks
+            return live, (await client.get("/readyz")).status_code
+    finally:
+        server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--per-user", type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="notif-cold-start-")
+    print(f"import app.main: {import_seconds(args.runs) * 1000:.0f} ms (median of {args.runs})")
+
+    existing = os.path.join(workdir, "existing.db")
+    engine = make_sqlite_engine(existing)
+    seed_notifications(engine, args.users, args.per_user)
+    print(f"{'schema check':>14} {'statements':>11} {'ms':>7}")
+    for name, (statements, ms) in schema_check_cost(engine).items():
+        print(f"{name:>14} {statements:>11.0f} {ms:>7.2f}")
+    engine.dispose()
+
+    print(f"{'database':>14} {'live s':>7} {'ready s':>8} {'first request s':>16}")
+    for name in ("existing", "empty"):
+        runs = []
+        for i in range(args.runs):
+            path = existing if name == "existing" else os.path.join(workdir, f"empty-{i}.db")
+            runs.append(asyncio.run(start_once(path, workdir)))
+        median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(
+            f"{name:>14} {median['live_seconds']:>7.3f} {median['ready_seconds']:>8.3f} "
+            f"{median['first_request_seconds']:>16.3f}"
+        )
+
+    live, ready = asyncio.run(unreachable_database(workdir))
+    print(f"database unreachable: /livez {live}, /readyz {ready}")
+    if live != 200 or ready != 503:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Bytes out and DB statements per poll of GET /notifications and GET /notifications/unread-count,
+for clients that ignore ETags vs clients that revalidate with If-None-Match, while a new
+notification arrives every --write-every polls.
+
+    python -m benchmarks.bench_conditional_get --polls 2000
+"""
+
+import argparse
+import asyncio
+
+import httpx
+from fastapi import FastAPI
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.unread_counter import UnreadCounterCache
+from benchmarks.common import StatementCounter, logger, make_session_factory, make_sqlite_engine, seed_notifications
+
+USERS = [f"user-{i}" for i in range(20)]
+
+
+async def run(conditional, polls, write_every):
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=len(USERS), per_user=200)
+    counter = StatementCounter(engine)
+    # Cached unread counts and no recent cache, so list polls without ETags always query
+    service = ThreadedNotificationService(
+        NotificationService(make_session_factory(engine), logger, unread_counter=UnreadCounterCache())
+    )
+    app = FastAPI()
+    app.include_router(router)
+    app.state.notification_service = service
+
+    etags = {}
+    bytes_out = statements = not_modified = 0
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        for i in range(polls):
+            user_id = USERS[i % len(USERS)]
+            if i % write_every == 0:
+                await service.create_notification(NotificationRequest(
+                    user_id=user_id, subscription_id=1, subject="s", body="b"
+                ))
+            counter.reset()
+            for url in (f"/notifications?user_id={user_id}&limit=20", f"/notifications/unread-count?user_id={user_id}"):
+                headers = {"If-None-Match": etags[url]} if conditional and url in etags else {}
+                response = await client.get(url, headers=headers)
+                if response.status_code == 304:
+                    not_modified += 1
+                else:
+                    etags[url] = response.headers["etag"]
+                bytes_out += len(response.content) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+            statements += counter.reset()
+    return bytes_out / polls, statements / polls, not_modified / (2 * polls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--polls", type=int, default=2000)
+    parser.add_argument("--write-every", type=int, default=50)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    print(f"{'client':>12} {'bytes/poll':>11} {'stmts/poll':>11} {'304 share':>10}")
+    for name, conditional in (("plain", False), ("conditional", True)):
+        bytes_per_poll, statements_per_poll, share = asyncio.run(run(conditional, args.polls, args.write_every))
+        print(f"{name:>12} {bytes_per_poll:>11.0f} {statements_per_poll:>11.2f} {share:>10.1%}")
+
+
+if __name__ == "__main__":
+    main()
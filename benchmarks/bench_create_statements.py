@@ -0,0 +1,67 @@
+"""
+SQL statements and commits per NotificationService.create_notification call.
+Exits non-zero if a create needs more than --max-statements statements or --max-commits commits,
+so it can guard against regressions in CI.
+
+    python -m benchmarks.bench_create_statements
+"""
+
+import argparse
+import sys
+import time
+
+from sqlalchemy import event
+
+from app.models.notification import NotificationRequest, NotificationType
+from app.services.notification_service import NotificationService
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--creates", type=int, default=2000)
+    parser.add_argument("--max-statements", type=float, default=1.0)
+    parser.add_argument("--max-commits", type=float, default=1.0)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine()
+    service = NotificationService(make_session_factory(engine), logger)
+    logger.setLevel("WARNING")
+    counts = {"statements": 0, "commits": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        # BEGIN is emitted by the SQLite harness itself, MySQL begins implicitly
+        if not statement.startswith("BEGIN"):
+            counts["statements"] += 1
+
+    @event.listens_for(engine, "commit")
+    def on_commit(conn):
+        counts["commits"] += 1
+
+    failed = False
+    print(f"{'type':>6} {'stmts/create':>13} {'commits/create':>15} {'creates/s':>10}")
+    for notification_type in (NotificationType.push, NotificationType.email):
+        counts.update(statements=0, commits=0)
+        started = time.perf_counter()
+        for i in range(args.creates):
+            service.create_notification(NotificationRequest(
+                user_id=f"user-{i % 100}",
+                subscription_id=i,
+                subject="Upcoming Payment: Netflix",
+                body="Your subscription for Netflix is due on 2024-01-15.",
+                notification_type=notification_type,
+            ))
+        elapsed = time.perf_counter() - started
+        statements = counts["statements"] / args.creates
+        commits = counts["commits"] / args.creates
+        print(f"{notification_type.value:>6} {statements:>13.2f} {commits:>15.2f} {args.creates / elapsed:>10.0f}")
+        failed = failed or statements > args.max_statements or commits > args.max_commits
+
+    if failed:
+        print("create_notification exceeded its statement budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
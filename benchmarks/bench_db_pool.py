@@ -0,0 +1,72 @@
+"""
+Pool checkout wait and timeouts vs concurrency for a few pool sizes, read from the same
+pool telemetry that /metrics/db-pool reports. Each checkout holds its connection for
+--hold-ms to stand in for a query round trip.
+
+    python -m benchmarks.bench_db_pool --concurrency 8 32 64 --pool-sizes 5 10 20
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.utils.pool_metrics import InstrumentedQueuePool
+
+
+def run(pool_size, concurrency, requests_per_thread, hold_ms):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(
+        f"sqlite:///{path}",
+        poolclass=InstrumentedQueuePool,
+        pool_size=pool_size,
+        max_overflow=pool_size // 2,
+        pool_timeout=1.0,
+        connect_args={"check_same_thread": False},
+    )
+
+    def worker():
+        for _ in range(requests_per_thread):
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                    time.sleep(hold_ms / 1000.0)
+            except Exception:
+                pass
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stats = engine.pool.metrics.snapshot(engine.pool)
+    engine.dispose()
+    return stats, concurrency * requests_per_thread / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--pool-sizes", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--hold-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    print(f"{'pool':>5} {'threads':>8} {'req/s':>7} {'wait avg ms':>12} {'wait max ms':>12} {'timeouts':>9}")
+    for pool_size in args.pool_sizes:
+        for concurrency in args.concurrency:
+            stats, throughput = run(pool_size, concurrency, args.requests, args.hold_ms)
+            print(
+                f"{pool_size:>5} {concurrency:>8} {throughput:>7.0f} {stats['wait_ms_avg']:>12.2f} "
+                f"{stats['wait_ms_max']:>12.2f} {stats['timeouts_total']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
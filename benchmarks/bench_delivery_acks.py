@@ -0,0 +1,94 @@
+"""
+Delivered-state writes under burst fan-out: one UPDATE per SSE event vs the shared ack buffer.
+
+    python -m benchmarks.bench_delivery_acks --streams 500 --burst 2000
+"""
+
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import stream_notifications
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.delivery_acks import DeliveryAckBuffer
+from app.services.notification_hub import NotificationHub
+from app.services.notification_service import NotificationService
+from benchmarks.common import fake_request, logger, make_session_factory, make_sqlite_engine
+
+
+class ImmediateAcks:
+    """The previous behaviour: one mark_notification_delivered call per event."""
+
+    def __init__(self, service):
+        self.service = service
+        self.tasks = set()
+
+    def ack(self, notification_id):
+        task = asyncio.get_running_loop().create_task(self.service.mark_notification_delivered(notification_id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def aclose(self):
+        await asyncio.gather(*self.tasks)
+
+
+async def run(mode, streams, burst, users):
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    writes = {"count": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("UPDATE"):
+            writes["count"] += 1
+
+    service = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger, hub=NotificationHub()))
+    acks = ImmediateAcks(service) if mode == "per-event" else DeliveryAckBuffer(service, logger)
+    request = fake_request(notification_service=service, delivery_acks=acks)
+
+    received = {"count": 0}
+
+    async def consume(user_id):
+        response = await stream_notifications(user_id=user_id, request=request, last_event_id=None)
+        async for chunk in response.body_iterator:
+            if "data:" in chunk:
+                received["count"] += 1
+
+    tasks = [asyncio.create_task(consume(f"user-{i % users}")) for i in range(streams)]
+    await asyncio.sleep(0.2)
+
+    expected = burst * streams // users
+    started = time.perf_counter()
+    await service.create_notifications([
+        NotificationRequest(user_id=f"user-{i % users}", subscription_id=i, subject="s", body="b")
+        for i in range(burst)
+    ])
+    while received["count"] < expected:
+        await asyncio.sleep(0.01)
+    await acks.aclose()
+    elapsed = time.perf_counter() - started
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return writes["count"], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--burst", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    print(f"{'mode':>10} {'UPDATEs':>8} {'seconds':>8} {'writes/s':>9}")
+    for mode in ("per-event", "buffered"):
+        writes, elapsed = asyncio.run(run(mode, args.streams, args.burst, args.users))
+        print(f"{mode:>10} {writes:>8} {elapsed:>8.2f} {writes / elapsed:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
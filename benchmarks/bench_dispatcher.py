@@ -0,0 +1,109 @@
+"""
+Email/SMS dispatch throughput against the local stub providers: one message per API call
+sent one at a time vs batched calls with bounded concurrency, under the stub's rate limit
+and failure rate. Reports time to drain the queue, provider calls, 429s and final statuses.
+
+    python -m benchmarks.bench_dispatcher --messages 2000 --latency-ms 50 --rate-limit 2000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from sqlalchemy import func, insert, select
+
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.dispatcher import DeliveryDispatcher
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM, NotificationStatus, NotificationType
+from app.services.providers import MailjetProvider, WebhookSmsProvider
+from app.utils.metrics_registry import MetricsRegistry
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine
+from benchmarks.stub_providers import StubProviders
+
+
+def seed_queued(engine, messages):
+    now = datetime.utcnow()
+    rows = [
+        {
+            "subscription_id": i % 20 + 1,
+            "user_id": f"user-{i % 500}",
+            "notification_type": NotificationType.email if i % 4 else NotificationType.sms,
+            "subject": "Upcoming Payment",
+            "message": "Your subscription renews tomorrow.",
+            "status": NotificationStatus.queued,
+            "recipient_email": f"user{i}@example.com",
+            "recipient_phone": f"+1555{i:07d}",
+            "created_at": now,
+            "updated_at": now,
+        }
+        for i in range(messages)
+    ]
+    with engine.begin() as conn:
+        conn.execute(insert(NotificationORM), rows)
+
+
+def statuses(engine):
+    with engine.connect() as conn:
+        rows = conn.execute(select(NotificationORM.status, func.count()).group_by(NotificationORM.status)).all()
+    return {status.value: count for status, count in rows}
+
+
+async def run(args, batched):
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    seed_queued(engine, args.messages)
+    stub = StubProviders(latency=args.latency_ms / 1000.0, failure_rate=args.failure_rate, rate_limit=args.rate_limit).start()
+    service = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger))
+    max_batch = None if batched else 1
+    providers = {
+        NotificationType.email: MailjetProvider("key", "secret", "bench@example.com", api_url=stub.url, max_batch=max_batch or 50),
+        NotificationType.sms: WebhookSmsProvider(stub.url + "sms", max_batch=max_batch or 100),
+    }
+    # Stay a little under the stub's limit, like a production limit set below the provider's quota
+    limit = args.rate_limit * 0.9 / 2 if args.rate_limit else 0
+    dispatcher = DeliveryDispatcher(
+        service,
+        logger,
+        providers,
+        rate_limits={NotificationType.email: limit, NotificationType.sms: limit},
+        registry=MetricsRegistry(),
+        claim_size=500 if batched else 50,
+        concurrency=args.concurrency if batched else 1,
+        max_attempts=3,
+        backoff_base=0.05,
+        backoff_max=0.2,
+        poll_interval=0.05
+    )
+
+    started = time.perf_counter()
+    while True:
+        claimed = await dispatcher.dispatch_once()
+        if not claimed:
+            if statuses(engine).get("queued", 0) == 0:
+                break
+            # Only backed-off retries left
+            await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    stub.stop()
+    return args.messages / elapsed, stub.calls, stub.throttled, statuses(engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.005)
+    parser.add_argument("--rate-limit", type=float, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    print(f"{'mode':>9} {'msgs/s':>8} {'calls':>7} {'429 msgs':>9}  statuses")
+    for name, batched in (("per-msg", False), ("batched", True)):
+        rate, calls, throttled, final = asyncio.run(run(args, batched))
+        print(f"{name:>9} {rate:>8.0f} {calls:>7} {throttled:>9}  {final}")
+
+
+if __name__ == "__main__":
+    main()
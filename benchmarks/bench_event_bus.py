@@ -0,0 +1,106 @@
+"""
+Cross-process SSE fan-out latency over the Unix socket event bus: one publisher process
+(standing in for the worker that created the notification) and N worker processes, each
+with an SSE subscription to the same user. Reports per-event delivery latency from publish
+to the subscriber's queue, across all workers, and exits non-zero if any event is lost.
+
+    python -m benchmarks.bench_event_bus --workers 2 4 8 --events 2000 --rate 2000
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from app.models.notification import NotificationRead, NotificationStatus, NotificationType
+from app.services.event_bus import UnixSocketEventBus
+from benchmarks.common import logger, percentile
+
+
+def worker(socket_dir, events, ready, results):
+    async def main():
+        bus = UnixSocketEventBus(socket_dir, logger)
+        await bus.start()
+        subscription = bus.subscribe("user-0")
+        ready.set()
+        latencies = []
+        while len(latencies) < events:
+            notification = await subscription.get(timeout=10.0)
+            if notification is None:
+                break
+            latencies.append(time.monotonic() - float(notification.subject))
+        await bus.stop()
+        results.put(latencies)
+
+    asyncio.run(main())
+
+
+def notification(i):
+    # The send time travels in the subject; CLOCK_MONOTONIC is shared by all processes
+    return NotificationRead(
+        id=i, subscription_id=1, user_id="user-0", notification_type=NotificationType.push,
+        subject=repr(time.monotonic()), message="Your subscription is due today.",
+        status=NotificationStatus.sent, created_at=datetime.utcnow()
+    )
+
+
+async def publish(socket_dir, events, rate):
+    bus = UnixSocketEventBus(socket_dir, logger, peer_refresh=0.0)
+    await bus.start()
+
+    # Publish from a plain thread, like the sync service running in the threadpool
+    def run():
+        started = time.monotonic()
+        for i in range(events):
+            delay = started + i / rate - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            bus.publish("user-0", notification(i + 1))
+
+    await asyncio.get_running_loop().run_in_executor(None, run)
+    await bus.stop()
+
+
+def run(workers, events, rate):
+    socket_dir = tempfile.mkdtemp(prefix="whatsub-bus-")
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    readies = [context.Event() for _ in range(workers)]
+    processes = [context.Process(target=worker, args=(socket_dir, events, ready, results)) for ready in readies]
+    for process in processes:
+        process.start()
+    for ready in readies:
+        ready.wait(timeout=30)
+    asyncio.run(publish(socket_dir, events, rate))
+    latencies = [latency for _ in processes for latency in results.get(timeout=60)]
+    for process in processes:
+        process.join()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=2000)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    lost = False
+    print(f"{'workers':>7} {'delivered':>10} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7}")
+    for workers in args.workers:
+        latencies = run(workers, args.events, args.rate)
+        lost = lost or len(latencies) != workers * args.events
+        print(
+            f"{workers:>7} {len(latencies):>10} {percentile(latencies, 50) * 1000:>7.2f} "
+            f"{percentile(latencies, 99) * 1000:>7.2f} {max(latencies, default=0) * 1000:>7.2f}"
+        )
+    if lost:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cost of idempotency keys on POST /notifications-style creates: per-request time and DB
+statements for creates without a key, with a new key, and for repeated keys answered by
+the unique index vs the recent-keys cache. Correctness (one row per key, concurrent
+duplicates included) is covered by tests/test_idempotency.py.
+
+    python -m benchmarks.bench_idempotency --requests 2000
+"""
+
+import argparse
+import time
+
+from app.models.notification import NotificationRequest
+from app.services.idempotency_keys import IdempotencyKeyCache
+from app.services.notification_service import NotificationService
+from benchmarks.common import StatementCounter, logger, make_session_factory, make_sqlite_engine, seed_notifications
+
+
+def payload(i, key=None):
+    return NotificationRequest(user_id=f"user-{i % 100}", subscription_id=i % 20 + 1, subject="s", body="b", dedup_key=key)
+
+
+def measure(service, counter, payloads):
+    counter.reset()
+    started = time.perf_counter()
+    for p in payloads:
+        service.create_notification(p)
+    elapsed = time.perf_counter() - started
+    return elapsed / len(payloads), counter.reset() / len(payloads)
+
+
+def cost(requests):
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=100, per_user=100)
+    counter = StatementCounter(engine)
+    uncached = NotificationService(make_session_factory(engine), logger)
+    cached = NotificationService(make_session_factory(engine), logger, idempotency_keys=IdempotencyKeyCache())
+
+    cases = [
+        ("no key", uncached, [payload(i) for i in range(requests)]),
+        ("new key", cached, [payload(i, f"k-{i}") for i in range(requests)]),
+        # The same keys again: uncached repeats hit the unique index, cached ones never reach the DB
+        ("repeat, index", uncached, [payload(i, f"k-{i}") for i in range(requests)]),
+        ("repeat, cache", cached, [payload(i, f"k-{i}") for i in range(requests)]),
+    ]
+    print(f"{'case':>14} {'us/request':>11} {'stmts/request':>14}")
+    for name, service, payloads in cases:
+        seconds, statements = measure(service, counter, payloads)
+        print(f"{name:>14} {seconds * 1e6:>11.0f} {statements:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    logger.setLevel("CRITICAL")
+    cost(args.requests)
+
+
+if __name__ == "__main__":
+    main()
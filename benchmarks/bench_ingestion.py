@@ -0,0 +1,86 @@
+"""
+POST /notifications latency and sustained inserts/sec: synchronous writes vs the
+write-behind ingestion queue (INGESTION_MODE=queued) with background group commits.
+
+    python -m benchmarks.bench_ingestion --requests 5000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import func, select
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import create_notification
+from app.services.admission import AdmissionSlot
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.ingestion_queue import IngestionFlusher, IngestionQueue
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from benchmarks.common import fake_request, logger, make_session_factory, make_sqlite_engine, percentile
+
+
+async def run(mode, requests, concurrency, users):
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    service = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger))
+    state = {"notification_service": service}
+    flusher = None
+    if mode == "queued":
+        fd, path = tempfile.mkstemp(prefix="notif-ingest-", suffix=".db")
+        os.close(fd)
+        queue = IngestionQueue(path)
+        flusher = IngestionFlusher(queue, service, logger)
+        flusher.start()
+        state["ingestion_queue"] = queue
+    request = fake_request(**state)
+
+    latencies = []
+    next_index = iter(range(requests))
+
+    async def client():
+        for i in next_index:
+            payload = NotificationRequest(user_id=f"user-{i % users}", subscription_id=i, subject="s", body="b")
+            started = time.perf_counter()
+            await create_notification(payload, request, idempotency_key=None, slot=AdmissionSlot(None, "writes"))
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    accepted = time.perf_counter() - started
+
+    # Sustained rate counts until the rows are in the notifications table, not just accepted
+    while True:
+        # A fresh connection per poll, so the count doesn't hold a read lock the flusher waits on
+        with engine.connect() as conn:
+            if conn.execute(select(func.count()).select_from(NotificationORM)).scalar() >= requests:
+                break
+        await asyncio.sleep(0.01)
+    stored = time.perf_counter() - started
+    if flusher is not None:
+        await flusher.stop()
+        queue.close()
+    return latencies, accepted, stored
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=100)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    print(f"{'mode':>7} {'p50 ms':>8} {'p99 ms':>8} {'accepted/s':>11} {'stored/s':>9}")
+    for mode in ("sync", "queued"):
+        latencies, accepted, stored = asyncio.run(run(mode, args.requests, args.concurrency, args.users))
+        print(
+            f"{mode:>7} {percentile(latencies, 50) * 1000:>8.2f} {percentile(latencies, 99) * 1000:>8.2f}"
+            f" {args.requests / accepted:>11.0f} {args.requests / stored:>9.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
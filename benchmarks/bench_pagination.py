@@ -0,0 +1,61 @@
+"""
+Page 1 vs deep-page latency for offset and keyset (cursor) pagination.
+
+    python -m benchmarks.bench_pagination --users 10 --per-user 100000 --page 500
+"""
+
+import argparse
+import time
+
+from app.services.notification_service import NotificationService
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, percentile, seed_notifications
+
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return percentile(latencies, 50)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--per-user", type=int, default=100000)
+    parser.add_argument("--page", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine()
+    started = time.perf_counter()
+    seed_notifications(engine, users=args.users, per_user=args.per_user)
+    print(f"seeded {args.users * args.per_user} rows in {time.perf_counter() - started:.1f}s")
+    service = NotificationService(make_session_factory(engine), logger)
+    user_id = "user-0"
+
+    print(f"{'mode':>8} {'unread':>7} {'page 1 ms':>10} {f'page {args.page} ms':>12}")
+    for unread_only in (False, True):
+        # Walk the cursors up to the target page once, untimed
+        cursor = None
+        for _ in range(args.page - 1):
+            page = service.get_user_notifications(user_id, unread_only, args.limit, cursor=cursor)
+            cursor = (page[-1].created_at, page[-1].id)
+
+        offset_first = timed(lambda: service.get_user_notifications(user_id, unread_only, args.limit, 0), args.repeat)
+        offset_deep = timed(
+            lambda: service.get_user_notifications(user_id, unread_only, args.limit, (args.page - 1) * args.limit),
+            args.repeat
+        )
+        keyset_first = timed(lambda: service.get_user_notifications(user_id, unread_only, args.limit), args.repeat)
+        keyset_deep = timed(
+            lambda: service.get_user_notifications(user_id, unread_only, args.limit, cursor=cursor), args.repeat
+        )
+        print(f"{'offset':>8} {str(unread_only):>7} {offset_first:>10.2f} {offset_deep:>12.2f}")
+        print(f"{'cursor':>8} {str(unread_only):>7} {keyset_first:>10.2f} {keyset_deep:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
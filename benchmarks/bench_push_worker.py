@@ -0,0 +1,121 @@
+"""
+Messages/sec for the send-push-notification Cloud Function: one invocation per event
+vs the batch-pull worker, against a local stub notification service and an in-memory
+fake Pub/Sub subscriber.
+
+    python -m benchmarks.bench_push_worker --messages 5000
+"""
+
+import argparse
+import base64
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cloud-functions", "send-push-notification"))
+import main as cloud_function  # noqa: E402
+from batch_worker import BatchPullWorker  # noqa: E402
+
+ids = itertools.count(1)
+
+
+class StubNotificationService(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/notifications/batch":
+            status, result = 200, {"results": [
+                {"index": i, "id": next(ids), "status": "sent"} for i in range(len(body["notifications"]))
+            ]}
+        else:
+            status, result = 201, {"id": next(ids), "status": "sent"}
+        data = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeSubscriber:
+    """In-memory stand-in for pubsub_v1.SubscriberClient."""
+
+    def __init__(self, payloads):
+        self.messages = {
+            f"ack-{i}": SimpleNamespace(ack_id=f"ack-{i}", message=SimpleNamespace(data=json.dumps(p).encode()))
+            for i, p in enumerate(payloads)
+        }
+        self.available = list(self.messages)
+        self.acked = set()
+        self.lock = threading.Lock()
+
+    def pull(self, request, timeout=None):
+        with self.lock:
+            batch, self.available = self.available[:request["max_messages"]], self.available[request["max_messages"]:]
+        return SimpleNamespace(received_messages=[self.messages[a] for a in batch])
+
+    def acknowledge(self, request):
+        with self.lock:
+            self.acked.update(request["ack_ids"])
+
+    def modify_ack_deadline(self, request):
+        with self.lock:
+            self.available.extend(request["ack_ids"])
+
+
+def make_payloads(count):
+    return [
+        {"user_id": f"user-{i % 1000}", "subscription_id": i, "subscription_plan": "Netflix",
+         "billing_date": "2024-01-15", "price": "15.99", "user_name": "Test User"}
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=5000)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubNotificationService)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}"
+    cloud_function.NOTIFICATION_SERVICE_URL = url
+    cloud_function.logger.setLevel("WARNING")
+    payloads = make_payloads(args.messages)
+    events = [{"data": base64.b64encode(json.dumps(p).encode()).decode()} for p in payloads]
+
+    print(f"{'mode':>24} {'msgs/s':>8} {'acked':>6}")
+
+    # One function invocation per event, without and with a pooled session
+    for name, session in (("per-event, no keep-alive", requests), ("per-event, pooled", cloud_function.create_http_session())):
+        cloud_function.http_session = session
+        started = time.perf_counter()
+        for event in events:
+            cloud_function.send_push_notification(event, None)
+        print(f"{name:>24} {len(events) / (time.perf_counter() - started):>8.0f} {len(events):>6}")
+
+    for name, use_batch in (("worker, concurrent", False), ("worker, batch endpoint", True)):
+        subscriber = FakeSubscriber(payloads)
+        worker = BatchPullWorker(subscriber, "projects/p/subscriptions/s", service_url=url, use_batch_endpoint=use_batch)
+        started = time.perf_counter()
+        while len(subscriber.acked) < len(payloads):
+            worker.run_once()
+        print(f"{name:>24} {len(payloads) / (time.perf_counter() - started):>8.0f} {len(subscriber.acked):>6}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+First-page inbox throughput on a hot-user workload, with and without the recent
+notifications cache, plus a consistency check: after concurrent creates, reads, delivered
+acks and deletes, every cached first page is compared with the DB. Exits non-zero on mismatch.
+
+    python -m benchmarks.bench_recent_cache --threads 8 --requests 4000
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from app.models.notification import NotificationRequest
+from app.services.notification_service import NotificationService
+from app.services.recent_notifications import RecentNotificationsCache
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, seed_notifications
+
+USERS = [f"user-{i}" for i in range(200)]
+# A handful of users get most of the traffic
+WEIGHTS = [1.0 / (rank + 1) for rank in range(len(USERS))]
+
+
+def workload(service, requests, seed, write_ratio):
+    rng = random.Random(seed)
+    for _ in range(requests):
+        user_id = rng.choices(USERS, WEIGHTS)[0]
+        action = rng.random()
+        if action < write_ratio / 2:
+            service.create_notification(NotificationRequest(
+                user_id=user_id, subscription_id=rng.randint(1, 20), subject="s", body="b"
+            ))
+        elif action < write_ratio:
+            page = service.get_user_notifications(user_id, limit=20)
+            if page:
+                service.mark_notification_read(rng.choice(page).id, user_id)
+        elif action < write_ratio + 0.01:
+            service.mark_notifications_delivered([rng.randint(1, 20000) for _ in range(20)])
+        else:
+            service.get_user_notifications(user_id, unread_only=rng.random() < 0.3, limit=rng.choice((10, 20, 50)))
+
+
+def run(service, threads, requests, write_ratio):
+    workers = [
+        threading.Thread(target=workload, args=(service, requests, i, write_ratio))
+        for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return threads * requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=4000)
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    seed_notifications(engine, users=len(USERS), per_user=500)
+    logger.setLevel("WARNING")
+    uncached = NotificationService(make_session_factory(engine), logger)
+    cache = RecentNotificationsCache(max_users=1000)
+    cached = NotificationService(make_session_factory(engine), logger, recent_cache=cache)
+
+    print(f"{'mode':>7} {'req/s':>8}")
+    for name, service in (("db", uncached), ("cached", cached)):
+        print(f"{name:>7} {run(service, args.threads, args.requests, args.write_ratio):>8.0f}")
+    stats = cache.stats()
+    hit_ratio = stats["hits"] / max(1, stats["hits"] + stats["misses"])
+    print(f"hit ratio {hit_ratio:.1%}, {stats['users']} users, {stats['notifications']} notifications, ~{stats['approx_bytes'] / 1024:.0f} KiB")
+
+    mismatched = []
+    for user_id in USERS:
+        for unread_only in (False, True):
+            page = cache.page(user_id, 50, unread_only)
+            if page is not None and page != uncached.get_user_notification_rows(user_id, unread_only=unread_only, limit=50):
+                mismatched.append((user_id, unread_only))
+    print(f"mismatched cached pages: {mismatched}")
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-request overhead of the request middleware: none vs the previous BaseHTTPMiddleware
+access logger vs the pure ASGI RequestMetricsMiddleware. Requests are driven straight
+through the ASGI interface, so only app and middleware time is measured.
+
+    python -m benchmarks.bench_request_middleware --requests 20000
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import time
+
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from app.middleware.request_metrics import RequestMetricsMiddleware
+from app.utils.access_log import create_access_logger
+from app.utils.metrics_registry import MetricsRegistry
+from benchmarks.common import percentile
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    """The middleware this replaced: whole-millisecond timing and a print per request."""
+
+    async def dispatch(self, request, call_next):
+        start = time.time()
+        response = await call_next(request)
+        duration_ms = int((time.time() - start) * 1000)
+        print(f"{request.method} {request.url.path} -> {response.status_code} in {duration_ms}ms")
+        return response
+
+
+def build_app(mode, devnull):
+    app = FastAPI()
+
+    @app.get("/notifications/{notification_id}")
+    async def get_notification(notification_id: int):
+        return {"id": notification_id}
+
+    listener = None
+    if mode == "legacy":
+        app.add_middleware(LegacyRequestLoggingMiddleware)
+    elif mode == "asgi":
+        access_logger, listener = create_access_logger("bench.access", stream=devnull)
+        listener.start()
+        app.add_middleware(RequestMetricsMiddleware, registry=MetricsRegistry(), access_logger=access_logger)
+    return app, listener
+
+
+async def drive(app, requests):
+    scope = {
+        "type": "http", "http_version": "1.1", "method": "GET", "scheme": "http",
+        "path": "/notifications/42", "raw_path": b"/notifications/42", "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "server": ("bench", 80), "client": ("bench", 1),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await app(dict(scope), receive, send)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    print(f"{'mode':>7} {'mean us':>8} {'p50 us':>8} {'p99 us':>8} {'overhead us':>12}")
+    baseline = None
+    with open(os.devnull, "w") as devnull:
+        for mode in ("none", "legacy", "asgi"):
+            app, listener = build_app(mode, devnull)
+            with contextlib.redirect_stdout(devnull):
+                asyncio.run(drive(app, 1000))
+                latencies = asyncio.run(drive(app, args.requests))
+            if listener is not None:
+                listener.stop()
+            mean = sum(latencies) / len(latencies) * 1e6
+            baseline = mean if baseline is None else baseline
+            print(
+                f"{mode:>7} {mean:>8.1f} {percentile(latencies, 50) * 1e6:>8.1f}"
+                f" {percentile(latencies, 99) * 1e6:>8.1f} {mean - baseline:>12.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Retention purge rate and its effect on concurrent request latency: one unbounded DELETE
+vs the chunked, paced RetentionPurger, while reads and writes keep running.
+
+    python -m benchmarks.bench_retention_purge --users 200 --per-user 1000
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from sqlalchemy import delete
+
+from app.models.notification import NotificationRequest
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from app.services.retention import RetentionPolicy, RetentionPurger
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, percentile, seed_notifications
+
+# seed_notifications writes push/sent rows up to 30 days old, so all of them expire
+POLICY = {"push/sent": 7}
+
+
+async def probe(service, users, stop, latencies):
+    i = 0
+    while not stop.is_set():
+        started = time.perf_counter()
+        if i % 4 == 0:
+            await service.create_notification(NotificationRequest(
+                user_id=f"fresh-{i % users}", subscription_id=1, subject="s", body="b"
+            ))
+        else:
+            await service.get_user_notifications(f"user-{i % users}", limit=20)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+        await asyncio.sleep(0.005)
+
+
+async def run(mode, users, per_user, chunk_size, pause):
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    seed_notifications(engine, users, per_user)
+    service = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger))
+    policy = RetentionPolicy(POLICY)
+
+    stop = asyncio.Event()
+    latencies = []
+    probes = [asyncio.create_task(probe(service, users, stop, latencies)) for _ in range(4)]
+    await asyncio.sleep(0.5)
+
+    started = time.perf_counter()
+    if mode == "unbounded":
+        cutoffs = policy.cutoffs(datetime.utcnow())
+
+        def delete_all():
+            with engine.begin() as conn:
+                _, _, cutoff = next(c for c in cutoffs if c[0].value == "push" and c[1].value == "sent")
+                return conn.execute(delete(NotificationORM).where(NotificationORM.created_at < cutoff)).rowcount
+
+        deleted = await asyncio.get_running_loop().run_in_executor(None, delete_all)
+    else:
+        deleted = await RetentionPurger(service, logger, policy, chunk_size=chunk_size, pause=pause).purge()
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await asyncio.gather(*probes)
+    return deleted, elapsed, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--per-user", type=int, default=1000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--pause-ms", type=float, default=10.0)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    print(f"{'mode':>10} {'deleted':>8} {'seconds':>8} {'rows/s':>8} {'req p50 ms':>11} {'req p99 ms':>11} {'req max ms':>11}")
+    for mode in ("unbounded", "chunked"):
+        deleted, elapsed, latencies = asyncio.run(
+            run(mode, args.users, args.per_user, args.chunk_size, args.pause_ms / 1000.0)
+        )
+        print(
+            f"{mode:>10} {deleted:>8} {elapsed:>8.2f} {deleted / elapsed:>8.0f}"
+            f" {percentile(latencies, 50) * 1000:>11.2f} {percentile(latencies, 99) * 1000:>11.2f}"
+            f" {max(latencies) * 1000:>11.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
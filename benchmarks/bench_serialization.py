@@ -0,0 +1,75 @@
+"""
+Cost of building and serializing a 100-row GET /notifications page: ORM entities through
+NotificationRead and response_model validation (the previous path) vs column tuples
+serialized straight to bytes with orjson, with and without a fields= projection.
+
+    python -m benchmarks.bench_serialization --iterations 500
+"""
+
+import argparse
+import asyncio
+import time
+from typing import List
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from app.models.notification import NotificationRead
+from app.services.notification_queries import READ_COLUMNS, read_row, to_notification_read, user_notifications_query
+from app.services.templates import TemplateRegistry
+from benchmarks.common import make_session_factory, make_sqlite_engine, seed_notifications
+
+ROWS = 100
+TEMPLATES = TemplateRegistry()
+RESPONSE_FIELD = create_model_field(name="response", type_=List[NotificationRead], mode="serialization")
+
+
+def previous_path(session):
+    notifications = [to_notification_read(n, TEMPLATES) for n in session.scalars(user_notifications_query("user-0", False, ROWS, 0)).all()]
+    content = asyncio.run(serialize_response(field=RESPONSE_FIELD, response_content=notifications, is_coroutine=True))
+    return JSONResponse(content).body
+
+
+def fast_path(session, fields=None):
+    rows = session.execute(user_notifications_query("user-0", False, ROWS, 0, fields=fields or list(READ_COLUMNS))).mappings().all()
+    return ORJSONResponse([read_row(row, TEMPLATES) for row in rows]).body
+
+
+def query_only(session):
+    # The query alone, so the serialization share can be read off the totals
+    session.execute(user_notifications_query("user-0", False, ROWS, 0, fields=list(READ_COLUMNS))).all()
+    return b""
+
+
+def measure(session, build, iterations):
+    build(session)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        body = build(session)
+    return (time.perf_counter() - started) / iterations, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=1, per_user=ROWS)
+    session = make_session_factory(engine)()
+
+    cases = [
+        ("query only", query_only),
+        ("previous", previous_path),
+        ("orjson", fast_path),
+        ("orjson+fields", lambda s: fast_path(s, ["id", "created_at", "subject", "read_at"])),
+    ]
+    print(f"{'path':>14} {'ms/100 rows':>12} {'bytes':>7}")
+    for name, build in cases:
+        seconds, size = measure(session, build, args.iterations)
+        print(f"{name:>14} {seconds * 1000:>12.3f} {size:>7}")
+
+
+if __name__ == "__main__":
+    main()
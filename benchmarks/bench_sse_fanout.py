@@ -0,0 +1,82 @@
+"""
+DB queries per second vs idle SSE connection count, legacy polling vs push hub.
+
+    python -m benchmarks.bench_sse_fanout --connections 100 500 1000 --duration 6
+"""
+
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from app.resources.notifications import stream_notifications
+from app.services.notification_hub import NotificationHub
+from app.services.notification_service import NotificationService
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.delivery_acks import DeliveryAckBuffer
+from benchmarks.common import (
+    StatementCounter, fake_request, logger, make_session_factory, make_sqlite_engine, seed_notifications,
+)
+
+
+async def legacy_polling_stream(service, user_id):
+    """The pre-hub event_generator: poll the DB every 2 seconds per connection."""
+    last_check = datetime.utcnow()
+    while True:
+        notifications = service.get_user_notifications(user_id=user_id, unread_only=True, limit=10)
+        for notification in [n for n in notifications if n.created_at > last_check]:
+            service.mark_notification_delivered(notification.id)
+            yield "data"
+        last_check = datetime.utcnow()
+        yield ": heartbeat\n\n"
+        await asyncio.sleep(2)
+
+
+async def hub_stream(service, user_id):
+    service = ThreadedNotificationService(service)
+    request = fake_request(notification_service=service, delivery_acks=DeliveryAckBuffer(service, logger))
+    response = await stream_notifications(user_id=user_id, request=request, last_event_id=None)
+    async for chunk in response.body_iterator:
+        yield chunk
+
+
+async def drain(stream):
+    async for _ in stream:
+        pass
+
+
+async def run(mode, service, counter, connections, duration):
+    make_stream = legacy_polling_stream if mode == "polling" else hub_stream
+    tasks = [asyncio.create_task(drain(make_stream(service, f"user-{i % 50}"))) for i in range(connections)]
+    await asyncio.sleep(0.5)  # let every stream connect
+    counter.reset()
+    started = time.perf_counter()
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - started
+    queries = counter.reset()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return queries / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connections", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--duration", type=float, default=6.0)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=50, per_user=20)
+    counter = StatementCounter(engine)
+    service = NotificationService(make_session_factory(engine), logger, hub=NotificationHub())
+
+    print(f"{'connections':>12} {'polling q/s':>12} {'hub q/s':>10}")
+    for connections in args.connections:
+        polling = asyncio.run(run("polling", service, counter, connections, args.duration))
+        hub = asyncio.run(run("hub", service, counter, connections, args.duration))
+        print(f"{connections:>12} {polling:>12.1f} {hub:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+SSE reconnect storm: N clients follow their streams, all connections drop at once (a deploy,
+a proxy restart), notifications are created for some users meanwhile, and every client
+reconnects at the same moment with the Last-Event-ID it last saw. Reports the DB queries the
+reconnects cost, how long the affected clients took to receive what they missed, and how
+many missed notifications never arrived. Exits non-zero if a resuming client loses any.
+
+    python -m benchmarks.bench_sse_resume --clients 2000
+
+Scenarios:
+    no resume        clients reconnect without Last-Event-ID (the old behavior)
+    DB               resume with a range query per client (replay buffer disabled)
+    replay           resume on the same worker, answered by its replay buffer
+    rolling restart  resume on a worker that started before the drop
+    full restart     resume on a worker that started after the missed notifications
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import stream_notifications
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.delivery_acks import DeliveryAckBuffer
+from app.services.notification_hub import NotificationHub
+from app.services.notification_service import NotificationService
+from app.utils.settings import get_settings
+from benchmarks.common import (
+    StatementCounter, fake_request, logger, make_session_factory, make_sqlite_engine, percentile, seed_notifications,
+)
+
+SCENARIOS = ["no resume", "DB", "replay", "rolling restart", "full restart"]
+
+
+class Worker:
+    """One service process: its hub, service and ack buffer."""
+
+    def __init__(self, engine, replay_size, users):
+        self.hub = NotificationHub(replay_size=replay_size, replay_max_users=users)
+        self.service = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger, hub=self.hub))
+        # Never flushes during the run, so the statement counts are catch-up queries only
+        self.acks = DeliveryAckBuffer(self.service, logger, max_batch=10 ** 9, flush_interval=3600)
+
+    async def start(self):
+        self.hub.start_replay(await self.service.latest_notification_id())
+
+
+class Client:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.last_event_id = None
+        self.received = {}
+
+    async def follow(self, worker, resume):
+        request = fake_request(notification_service=worker.service, delivery_acks=worker.acks)
+        last_event_id = str(self.last_event_id) if resume and self.last_event_id is not None else None
+        response = await stream_notifications(user_id=self.user_id, request=request, last_event_id=last_event_id)
+        async for chunk in response.body_iterator:
+            for line in chunk.split("\n"):
+                if line.startswith("id: "):
+                    self.last_event_id = int(line[4:])
+                elif line.startswith("data: "):
+                    event = json.loads(line[6:])
+                    if "id" in event:
+                        self.received[event["id"]] = time.perf_counter()
+
+
+async def create(service, user_ids):
+    results = await service.create_notifications([
+        NotificationRequest(user_id=user_id, subscription_id=1, subject="Upcoming Payment", body="Due today.")
+        for user_id in user_ids
+    ])
+    return {user_id: result.id for user_id, result in zip(user_ids, results)}
+
+
+async def wait_for(clients, expected, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if all(expected[c.user_id] in c.received for c in clients if c.user_id in expected):
+            return
+        await asyncio.sleep(0.01)
+
+
+async def run(scenario, args):
+    engine = make_sqlite_engine()
+    seed_notifications(engine, users=args.clients, per_user=args.per_user)
+    counter = StatementCounter(engine)
+    replay_size = 0 if scenario == "DB" else args.replay_size
+    old = Worker(engine, replay_size, args.clients)
+    await old.start()
+
+    clients = [Client(f"user-{i}") for i in range(args.clients)]
+    tasks = [asyncio.create_task(c.follow(old, resume=False)) for c in clients]
+    await asyncio.sleep(0.5)
+    # Some traffic while connected; idle clients resume from the id they got on connecting
+    live = await create(old.service, [c.user_id for c in clients[::10]])
+    await wait_for(clients, live, timeout=10)
+
+    new = None
+    if scenario == "rolling restart":
+        new = Worker(engine, replay_size, args.clients)
+        await new.start()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    # Missed while disconnected
+    missed_users = [c.user_id for c in clients[::args.missed_every]]
+    if scenario == "full restart":
+        writer = ThreadedNotificationService(NotificationService(make_session_factory(engine), logger))
+    else:
+        writer = (new or old).service
+    missed = await create(writer, missed_users)
+    if scenario == "full restart":
+        new = Worker(engine, replay_size, args.clients)
+        await new.start()
+
+    target = new or old
+    counter.reset()
+    started = time.perf_counter()
+    for c in clients:
+        c.received = {}
+    tasks = [asyncio.create_task(c.follow(target, resume=scenario != "no resume")) for c in clients]
+    await wait_for(clients, missed, timeout=args.timeout)
+    caught_up = [c.received[missed[c.user_id]] - started for c in clients if missed.get(c.user_id) in c.received]
+    # Let reconnects of unaffected clients finish their catch-up too before counting queries
+    await asyncio.sleep(0.5)
+    queries = counter.reset()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return queries, caught_up, len(missed) - len(caught_up), target.hub.replay_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--missed-every", type=int, default=4, help="every Nth user gets a notification while disconnected")
+    parser.add_argument("--replay-size", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=5.0, help="seconds to wait for missed notifications")
+    parser.add_argument("--scenarios", nargs="+", default=SCENARIOS, choices=SCENARIOS)
+    args = parser.parse_args()
+
+    logger.setLevel("WARNING")
+    get_settings().sse_heartbeat_seconds = 0.2
+    lost_on_resume = False
+    print(f"{args.clients} clients reconnecting, {len(range(0, args.clients, args.missed_every))} missed a notification")
+    print(f"{'scenario':>16} {'queries':>8} {'replay hits':>11} {'p50 ms':>7} {'p99 ms':>7} {'max ms':>7} {'lost':>5}")
+    for scenario in args.scenarios:
+        queries, caught_up, lost, replay = asyncio.run(run(scenario, args))
+        lost_on_resume = lost_on_resume or (lost > 0 and scenario != "no resume")
+        print(
+            f"{scenario:>16} {queries:>8} {replay['hits']:>11} {percentile(caught_up, 50) * 1000:>7.1f} "
+            f"{percentile(caught_up, 99) * 1000:>7.1f} {max(caught_up, default=0) * 1000:>7.1f} {lost:>5}"
+        )
+    if lost_on_resume:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
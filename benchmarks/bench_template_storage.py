@@ -0,0 +1,139 @@
+"""
+Storage and read cost of templated notification bodies. Stores the Cloud Function's
+subscription-due notifications three ways: the rendered body in `message` (the metadata
+thrown away, as before), the rendered body plus the persisted metadata, and the payment_due
+template id with its packed params plus the metadata. Reports the size of the notifications
+table (SQLite dbstat, indexes excluded) per million rows, and the cost per row of reading
+the inboxes of --active-users users over and over through the service: raw bodies, templated
+bodies rendered through the memo, and templated bodies rendered on every read (memo
+disabled). Exits non-zero if the templated table is not smaller than the raw-body one.
+
+    python -m benchmarks.bench_template_storage --rows 200000
+"""
+
+import argparse
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+
+from app.models.notification import NotificationRequest
+from app.services.notification_queries import notification_values
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from app.services.templates import DEFAULT_TEMPLATES, TemplateRegistry
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine
+
+PLANS = ["Netflix", "Spotify Premium", "Disney+", "YouTube Premium", "iCloud+ 200GB", "Xbox Game Pass Ultimate"]
+NAMES = ["Alex", "Sam Taylor", "Jordan Lee", "Priya Sharma", "Chris", "Maria Garcia", "Wei Zhang"]
+LAYOUTS = ["raw body", "raw body + metadata", "template + metadata"]
+
+
+def requests(rows, users, seed=0):
+    """Subscription-due requests as the Cloud Function builds them, for `users` users."""
+    rng = random.Random(seed)
+    user_ids = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(users)]
+    base = datetime(2024, 1, 1)
+    for i in range(rows):
+        plan = rng.choice(PLANS)
+        params = {
+            "user_name": rng.choice(NAMES),
+            "subscription_plan": plan,
+            "billing_date": (base + timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d"),
+            "price": f"{rng.choice([4.99, 9.99, 11.99, 15.49, 22.99]):.2f}",
+        }
+        yield i, NotificationRequest(
+            user_id=user_ids[i % users],
+            subscription_id=i % 5000 + 1,
+            subject=f"Upcoming Payment: {plan}",
+            template_id="payment_due",
+            template_params=params,
+            metadata={"billing_date": params["billing_date"], "price": params["price"]}
+        )
+
+
+def as_layout(payload, layout):
+    if layout == "template + metadata":
+        return payload
+    return payload.model_copy(update={
+        "body": DEFAULT_TEMPLATES["payment_due"].format_map(payload.template_params),
+        "template_id": None,
+        "template_params": None,
+        "metadata": payload.metadata if layout == "raw body + metadata" else None,
+    })
+
+
+def build(path, layout, rows, users, chunk=10000):
+    engine = make_sqlite_engine(path)
+    templates = TemplateRegistry()
+    created_at = datetime.utcnow()
+    batch = []
+    with engine.begin() as conn:
+        for i, payload in requests(rows, users):
+            batch.append(notification_values(as_layout(payload, layout), created_at + timedelta(seconds=i), templates))
+            if len(batch) >= chunk:
+                conn.execute(insert(NotificationORM), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(NotificationORM), batch)
+    with sqlite3.connect(path) as db:
+        db.execute("VACUUM")
+        table_bytes = db.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = 'notifications'").fetchone()[0]
+    return engine, table_bytes
+
+
+def read_cost(engine, active_users, cache_size, reads, limit=50):
+    """Microseconds per row of get_user_notification_rows over `reads` inbox pages."""
+    service = NotificationService(make_session_factory(engine), logger, templates=TemplateRegistry(cache_size=cache_size))
+    with engine.connect() as conn:
+        user_ids = list(conn.scalars(select(NotificationORM.user_id).distinct().limit(active_users)))
+    for user_id in user_ids:
+        service.get_user_notification_rows(user_id, limit=limit)
+    fetched = 0
+    started = time.perf_counter()
+    for i in range(reads):
+        fetched += len(service.get_user_notification_rows(user_ids[i % len(user_ids)], limit=limit))
+    return (time.perf_counter() - started) / fetched * 1e6, service.templates.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=4000)
+    parser.add_argument("--active-users", type=int, default=200)
+    parser.add_argument("--reads", type=int, default=2000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="notif-templates-")
+    engines = {}
+    print(f"{'layout':>20} {'table MB / 1M rows':>19} {'bytes / row':>12}")
+    sizes = {}
+    for i, layout in enumerate(LAYOUTS):
+        engines[layout], table_bytes = build(f"{workdir}/{i}.db", layout, args.rows, args.users)
+        sizes[layout] = table_bytes
+        print(f"{layout:>20} {table_bytes / args.rows * 1e6 / 2 ** 20:>19.1f} {table_bytes / args.rows:>12.1f}")
+
+    print(f"{'read path':>20} {'us / row':>9} {'memo hit rate':>14}")
+    for name, layout, cache_size in [
+        ("raw body", "raw body + metadata", 10000),
+        ("template, memo", "template + metadata", 10000),
+        ("template, no memo", "template + metadata", 0),
+    ]:
+        per_row, stats = read_cost(engines[layout], args.active_users, cache_size, args.reads)
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.1%}" if lookups and cache_size else "-"
+        print(f"{name:>20} {per_row:>9.2f} {hit_rate:>14}")
+    for engine in engines.values():
+        engine.dispose()
+
+    if sizes["template + metadata"] >= sizes["raw body"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
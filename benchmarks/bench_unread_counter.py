@@ -0,0 +1,86 @@
+"""
+Badge poll cost with and without the unread counter cache, plus a drift check:
+many threads create, mark-read (including the same ids concurrently), delete and poll,
+then the cached count of every user is compared with COUNT(*). Exits non-zero on drift.
+
+    python -m benchmarks.bench_unread_counter --threads 16 --ops 400
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+
+from app.models.notification import NotificationRequest
+from app.services.notification_service import NotificationService
+from app.services.unread_counter import UnreadCounterCache
+from benchmarks.common import logger, make_session_factory, make_sqlite_engine, percentile, seed_notifications
+
+USERS = [f"user-{i}" for i in range(8)]
+
+
+def poll_latency(service, polls):
+    latencies = []
+    for i in range(polls):
+        started = time.perf_counter()
+        service.get_unread_count(USERS[i % len(USERS)])
+        latencies.append((time.perf_counter() - started) * 1e6)
+    return percentile(latencies, 50), percentile(latencies, 99)
+
+
+def churn(service, ops, seed):
+    rng = random.Random(seed)
+    for _ in range(ops):
+        user_id = rng.choice(USERS)
+        action = rng.random()
+        if action < 0.3:
+            service.create_notification(NotificationRequest(
+                user_id=user_id, subscription_id=rng.randint(1, 25), subject="s", body="b"
+            ))
+        elif action < 0.8:
+            # Small id range so threads race to mark the same notifications read
+            service.mark_notification_read(rng.randint(1, 200), user_id)
+        elif action < 0.805:
+            service.delete_notifications_by_subscription_id(rng.randint(1, 25))
+        else:
+            service.get_unread_count(user_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--ops", type=int, default=400)
+    parser.add_argument("--polls", type=int, default=5000)
+    args = parser.parse_args()
+
+    engine = make_sqlite_engine(begin="BEGIN IMMEDIATE")
+    seed_notifications(engine, users=len(USERS), per_user=2000)
+    logger.setLevel("WARNING")
+    uncached = NotificationService(make_session_factory(engine), logger)
+    cached = NotificationService(make_session_factory(engine), logger, unread_counter=UnreadCounterCache())
+
+    print(f"{'mode':>9} {'p50 us':>8} {'p99 us':>8}")
+    for name, service in (("db", uncached), ("cached", cached)):
+        p50, p99 = poll_latency(service, args.polls)
+        print(f"{name:>9} {p50:>8.1f} {p99:>8.1f}")
+
+    threads = [threading.Thread(target=churn, args=(cached, args.ops, i)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    drifted = []
+    for user_id in USERS:
+        cached_count = cached.unread_counter.get(user_id)
+        actual = uncached.get_unread_count(user_id)
+        if cached_count is not None and cached_count != actual:
+            drifted.append((user_id, cached_count, actual))
+    print(f"after {args.threads * args.ops} concurrent ops: {cached.unread_counter.stats()}, drifted users: {drifted}")
+    if drifted:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Shared helpers for the offline benchmarks.
+Everything runs against a local SQLite file so no MySQL instance is needed.
+"""
+
+import logging
+import os
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from typing import List, Sequence
+
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.db import create_all
+from app.services.orm_models import NotificationORM, NotificationStatus, NotificationType
+
+logger = logging.getLogger("whatsub-notification-bench")
+
+
+def make_sqlite_engine(path: str = None, begin: str = "BEGIN", **engine_kwargs):
+    """
+    Create a file-backed SQLite engine with the notifications schema.
+    Pass begin="BEGIN IMMEDIATE" for write-heavy concurrent runs, so transactions that read
+    before writing queue on the lock instead of failing with "database is locked".
+    Extra keyword arguments (pool sizing, ...) go to create_engine.
+    """
+    if path is None:
+        fd, path = tempfile.mkstemp(prefix="notif-bench-", suffix=".db")
+        os.close(fd)
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 30}, **engine_kwargs)
+
+    # Let SQLAlchemy own transactions so SAVEPOINTs work with pysqlite
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql(begin)
+
+    create_all(engine)
+    return engine
+
+
+def make_session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+class StatementCounter:
+    """Counts SQL statements executed on an engine, ignoring the harness's own BEGINs."""
+
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not statement.startswith("BEGIN"):
+            self.count += 1
+
+    def reset(self) -> int:
+        count, self.count = self.count, 0
+        return count
+
+
+def seed_notifications(engine, users: int, per_user: int, chunk: int = 10000) -> None:
+    """Insert users * per_user notifications with increasing created_at."""
+    base = datetime.utcnow() - timedelta(days=30)
+    rows = []
+    with engine.begin() as conn:
+        for u in range(users):
+            for i in range(per_user):
+                rows.append({
+                    "subscription_id": i % 20 + 1,
+                    "user_id": f"user-{u}",
+                    "notification_type": NotificationType.push,
+                    "subject": f"Upcoming Payment: Plan {i % 20}",
+                    "message": "Hello Subscriber,\n\nYour subscription is due soon.",
+                    "status": NotificationStatus.sent,
+                    "read_at": base if i % 3 == 0 else None,
+                    "created_at": base + timedelta(seconds=i),
+                    "updated_at": base + timedelta(seconds=i),
+                })
+                if len(rows) >= chunk:
+                    conn.execute(insert(NotificationORM), rows)
+                    rows = []
+        if rows:
+            conn.execute(insert(NotificationORM), rows)
+
+
+def fake_request(**state):
+    """Minimal stand-in for a Starlette Request, enough for the route helpers."""
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(**state)), headers={})
+
+
+def percentile(values: Sequence[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered: List[float] = sorted(values)
+    index = min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
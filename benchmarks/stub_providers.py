@@ -0,0 +1,121 @@
+"""
+Local stand-ins for the email and SMS providers, for running the dispatcher without
+sending anything. Serves the Mailjet v3.1 Send API (POST /v3.1/send) and the SMS webhook
+(POST /sms) with configurable latency, per-message failure rate and an enforced rate
+limit that answers 429 like the real services.
+
+    python -m benchmarks.stub_providers --port 9000 --latency-ms 80 --rate-limit 200
+
+then point MAILJET_API_URL=http://127.0.0.1:9000/ and SMS_WEBHOOK_URL=http://127.0.0.1:9000/sms at it.
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubProviders:
+    def __init__(self, port: int = 0, latency: float = 0.05, failure_rate: float = 0.0, rate_limit: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        # Messages per second across both endpoints, over a sliding one-second window; 0 = unlimited
+        self.rate_limit = rate_limit
+        self.accepted = 0
+        self.rejected = 0
+        self.throttled = 0
+        self.calls = 0
+        self._window = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}/"
+
+    def start(self) -> "StubProviders":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _admit(self, messages: int) -> bool:
+        with self._lock:
+            self.calls += 1
+            if not self.rate_limit:
+                return True
+            now = time.monotonic()
+            self._window = [(t, n) for t, n in self._window if now - t < 1.0]
+            if sum(n for _, n in self._window) + messages > self.rate_limit:
+                self.throttled += messages
+                return False
+            self._window.append((now, messages))
+            return True
+
+    def _outcomes(self, messages: int):
+        failed = [random.random() < self.failure_rate for _ in range(messages)]
+        with self._lock:
+            self.rejected += sum(failed)
+            self.accepted += messages - sum(failed)
+        return failed
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                if self.path.startswith("/v3.1/send"):
+                    messages = body["Messages"]
+                elif self.path.startswith("/sms"):
+                    messages = body["messages"]
+                else:
+                    return self._reply(404, {})
+                if not stub._admit(len(messages)):
+                    return self._reply(429, {"ErrorMessage": "Too many requests"})
+                time.sleep(stub.latency)
+                failed = stub._outcomes(len(messages))
+                if self.path.startswith("/sms"):
+                    return self._reply(200, {"results": [
+                        {"status": "error", "error": "invalid number"} if f else {"status": "sent"} for f in failed
+                    ]})
+                # Like Mailjet, one bad message makes the whole call a 400
+                return self._reply(400 if any(failed) else 200, {"Messages": [
+                    {"Status": "error", "Errors": [{"ErrorMessage": "invalid recipient"}]} if f else {"Status": "success"}
+                    for f in failed
+                ]})
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float, default=0.0)
+    args = parser.parse_args()
+
+    stub = StubProviders(args.port, args.latency_ms / 1000.0, args.failure_rate, args.rate_limit)
+    print(f"stub providers listening on {stub.url}")
+    stub.server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
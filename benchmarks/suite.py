@@ -0,0 +1,347 @@
+"""
+Offline load and benchmark suite for the whole service.
+
+Seeds a local SQLite database with users x notifications, starts the real app under uvicorn
+in a subprocess against it, drives the endpoints in app/resources/notifications.py (including
+thousands of concurrent SSE streams) and reports throughput, p50/p95/p99 latency, DB statements
+per request (from the server's /metrics) and server RSS. Results are written as JSON so runs
+can be compared between commits:
+
+    python -m benchmarks.suite --output bench-results.json
+    python -m benchmarks.suite --output new.json --compare bench-results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import make_sqlite_engine, percentile, seed_notifications
+
+
+class Server:
+    """The service under uvicorn in a child process, pointed at a SQLite file."""
+
+    def __init__(self, database_path: str, log_path: str, env: Dict[str, str]):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.port = sock.getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.log = open(log_path, "w")
+        self.spawned_at = time.monotonic()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(self.port),
+             "--log-level", "warning", "--no-access-log", "--backlog", "8192"],
+            env={**os.environ, "DATABASE_URL": f"sqlite:///{database_path}", "LOG_LEVEL": "WARNING", **env},
+            stdout=self.log,
+            stderr=subprocess.STDOUT,
+        )
+
+    async def cold_start(self, client: httpx.AsyncClient, user_id: str, timeout: float = 30.0) -> Dict[str, Any]:
+        """Seconds from spawning the process until /livez, /readyz and a first inbox read succeed."""
+        figures: Dict[str, Any] = {}
+        probes = [
+            ("live_seconds", lambda: client.get("/livez")),
+            ("ready_seconds", lambda: client.get("/readyz")),
+            ("first_request_seconds", lambda: client.get("/notifications", params={"user_id": user_id, "limit": 20})),
+        ]
+        deadline = self.spawned_at + timeout
+        for name, probe in probes:
+            while True:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Server did not start, see {self.log.name}")
+                try:
+                    if (await probe()).status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                await asyncio.sleep(0.005)
+            figures[name] = round(time.monotonic() - self.spawned_at, 3)
+        return figures
+
+    def rss_mb(self) -> Optional[float]:
+        try:
+            with open(f"/proc/{self.process.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        return None
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self.log.close()
+
+
+async def scrape(client: httpx.AsyncClient, name: str) -> float:
+    """Sum of all samples of one metric on the server's /metrics."""
+    total = 0.0
+    for line in (await client.get("/metrics")).text.splitlines():
+        if line.startswith(name + " ") or line.startswith(name + "{"):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def drive(
+    client: httpx.AsyncClient,
+    server: Server,
+    requests: int,
+    concurrency: int,
+    send: Callable[[httpx.AsyncClient, int], Any],
+    ok: Callable[[httpx.Response], bool] = lambda r: r.status_code < 400
+) -> Dict[str, Any]:
+    """Send `requests` requests from `concurrency` workers and summarize them."""
+    latencies: List[float] = []
+    errors = 0
+    indexes = iter(range(requests))
+    statements_before = await scrape(client, "db_statements_total")
+
+    async def worker():
+        nonlocal errors
+        for i in indexes:
+            started = time.perf_counter()
+            try:
+                response = await send(client, i)
+                if not ok(response):
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    statements = await scrape(client, "db_statements_total") - statements_before
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "db_statements_per_request": round(statements / requests, 3),
+        "rss_mb": server.rss_mb(),
+    }
+
+
+async def sse_scenario(client: httpx.AsyncClient, server: Server, connections: int, users: List[str]) -> Dict[str, Any]:
+    """Open `connections` SSE streams, publish one notification per streamed user and time delivery."""
+    received: Dict[int, List[float]] = {}
+    streamed_users = [users[i % len(users)] for i in range(connections)]
+
+    async def stream(user_id: str):
+        async with client.stream("GET", "/notifications/stream", params={"user_id": user_id}, timeout=None) as response:
+            async for line in response.aiter_lines():
+                if line.startswith("data:"):
+                    event = json.loads(line[5:])
+                    if "id" in event:
+                        received.setdefault(event["id"], []).append(time.perf_counter())
+
+    connect_started = time.perf_counter()
+    tasks = [asyncio.create_task(stream(user_id)) for user_id in streamed_users]
+    while await scrape(client, "sse_connections_open") < connections:
+        if all(task.done() for task in tasks):
+            break
+        await asyncio.sleep(0.05)
+    connect_seconds = time.perf_counter() - connect_started
+    connected = int(await scrape(client, "sse_connections_open"))
+    # Headers go out before the stream subscribes to the hub; give the generators a moment
+    await asyncio.sleep(0.5)
+    rss_connected = server.rss_mb()
+    statements_before = await scrape(client, "db_statements_total")
+
+    sent_at: Dict[int, float] = {}
+    expected = 0
+    for user_id in dict.fromkeys(streamed_users):
+        started = time.perf_counter()
+        response = await client.post("/notifications", json={
+            "user_id": user_id, "subscription_id": 1, "subject": "Upcoming Payment", "body": "Due soon."
+        })
+        sent_at[response.json()["id"]] = started
+        expected += streamed_users.count(user_id)
+
+    deadline = time.monotonic() + 30
+    while sum(len(v) for k, v in received.items() if k in sent_at) < expected and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    latencies = [t - sent_at[i] for i, times in received.items() if i in sent_at for t in times]
+    statements = await scrape(client, "db_statements_total") - statements_before
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "connections": connections,
+        "connected": connected,
+        "connect_seconds": round(connect_seconds, 3),
+        "events_expected": expected,
+        "events_received": len(latencies),
+        "delivery_p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "delivery_p95_ms": round(percentile(latencies, 95) * 1000, 3),
+        "delivery_p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "db_statements_per_event": round(statements / max(1, len(latencies)), 3),
+        "rss_mb": rss_connected,
+    }
+
+
+async def run_suite(args, server: Server) -> Dict[str, Any]:
+    users = [f"user-{i}" for i in range(args.users)]
+    # Zipf-like: a few users get most of the reads, like real inboxes
+    weights = [1.0 / (rank + 1) for rank in range(len(users))]
+    rng = random.Random(args.seed)
+    hot_user = lambda: rng.choices(users, weights)[0]
+    limits = httpx.Limits(max_connections=args.sse + args.concurrency + 16, max_keepalive_connections=args.concurrency + 16)
+    results: Dict[str, Any] = {}
+
+    async with httpx.AsyncClient(base_url=server.base_url, limits=limits, timeout=60) as client:
+        results["cold_start"] = await server.cold_start(client, users[0])
+        results["idle"] = {"rss_mb": server.rss_mb()}
+
+        def create(c, i):
+            return c.post("/notifications", json={
+                "user_id": hot_user(), "subscription_id": i % 50 + 1,
+                "subject": "Upcoming Payment: Netflix", "body": "Your subscription for Netflix is due on 2024-01-15."
+            })
+        results["create"] = await drive(client, server, args.requests, args.concurrency, create)
+
+        def create_batch(c, i):
+            return c.post("/notifications/batch", json={"notifications": [
+                {"user_id": hot_user(), "subscription_id": j % 50 + 1, "subject": "Upcoming Payment", "body": "Due soon."}
+                for j in range(100)
+            ]})
+        results["create_batch_100"] = await drive(client, server, max(1, args.requests // 100), 4, create_batch)
+
+        def first_page(c, i):
+            return c.get("/notifications", params={"user_id": hot_user(), "limit": 20})
+        results["list_first_page"] = await drive(client, server, args.requests, args.concurrency, first_page)
+
+        def projected_page(c, i):
+            return c.get("/notifications", params={"user_id": hot_user(), "limit": 20, "fields": "subject,read_at"})
+        results["list_first_page_fields"] = await drive(client, server, args.requests, args.concurrency, projected_page)
+
+        async def deep_page(c, i):
+            first = await c.get("/notifications", params={"user_id": hot_user(), "limit": 50})
+            cursor = first.headers.get("x-next-cursor")
+            return await c.get("/notifications", params={"user_id": hot_user(), "limit": 50, "cursor": cursor}) if cursor else first
+        results["list_cursor_pages"] = await drive(client, server, args.requests // 2, args.concurrency, deep_page)
+
+        def unread_count(c, i):
+            return c.get("/notifications/unread-count", params={"user_id": hot_user()})
+        results["unread_count"] = await drive(client, server, args.requests, args.concurrency, unread_count)
+
+        etags: Dict[str, str] = {}
+
+        async def conditional_count(c, i):
+            user_id = hot_user()
+            headers = {"If-None-Match": etags[user_id]} if user_id in etags else {}
+            response = await c.get("/notifications/unread-count", params={"user_id": user_id}, headers=headers)
+            if "etag" in response.headers:
+                etags[user_id] = response.headers["etag"]
+            return response
+        results["unread_count_conditional"] = await drive(client, server, args.requests, args.concurrency, conditional_count)
+
+        def mark_read(c, i):
+            # seed_notifications inserts user by user, so user u owns ids u*per_user+1 .. (u+1)*per_user
+            u = rng.randrange(args.users)
+            notification_id = u * args.per_user + rng.randint(1, args.per_user)
+            return c.patch(f"/notifications/{notification_id}/read", params={"user_id": users[u]})
+        results["mark_read"] = await drive(client, server, args.requests, args.concurrency, mark_read)
+
+        if args.sse:
+            results["sse"] = await sse_scenario(client, server, args.sse, users[:args.sse_users])
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Any], previous: Dict[str, Any]) -> None:
+    """Print the change of every numeric figure shared by two result files."""
+    print(f"\ncompared with {previous['meta'].get('commit')} ({previous['meta'].get('timestamp')})")
+    print(f"{'scenario':>26} {'metric':>26} {'before':>10} {'after':>10} {'change':>8}")
+    for scenario, figures in current["scenarios"].items():
+        for metric, after in figures.items():
+            before = previous["scenarios"].get(scenario, {}).get(metric)
+            if not isinstance(after, (int, float)) or not isinstance(before, (int, float)) or isinstance(after, bool):
+                continue
+            change = f"{(after - before) / before:+.1%}" if before else "n/a"
+            print(f"{scenario:>26} {metric:>26} {before:>10} {after:>10} {change:>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--per-user", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per HTTP scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--sse", type=int, default=2000, help="Concurrent SSE connections (0 to skip)")
+    parser.add_argument("--sse-users", type=int, default=200, help="Distinct users the SSE connections are spread over")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="Extra settings for the server")
+    parser.add_argument("--output", default="bench-results.json")
+    parser.add_argument("--compare", help="Earlier result file to compare with")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="notif-suite-")
+    database_path = os.path.join(workdir, "notifications.db")
+    seed_started = time.perf_counter()
+    seed_notifications(make_sqlite_engine(database_path), args.users, args.per_user)
+    print(f"seeded {args.users * args.per_user} notifications in {time.perf_counter() - seed_started:.1f}s ({workdir})")
+
+    server = Server(database_path, os.path.join(workdir, "server.log"), dict(kv.split("=", 1) for kv in args.env))
+    try:
+        scenarios = asyncio.run(run_suite(args, server))
+    finally:
+        server.stop()
+
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        },
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+
+    print(f"{'scenario':>26} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'stmts/req':>10} {'errors':>7} {'rss MB':>7}")
+    for name, figures in scenarios.items():
+        if "throughput_rps" in figures:
+            print(
+                f"{name:>26} {figures['throughput_rps']:>9} {figures['p50_ms']:>9} {figures['p95_ms']:>9}"
+                f" {figures['p99_ms']:>9} {figures['db_statements_per_request']:>10} {figures['errors']:>7} {figures['rss_mb']:>7}"
+            )
+    if "sse" in scenarios:
+        print(f"sse: {json.dumps(scenarios['sse'])}")
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(results, json.load(previous))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+High-throughput worker mode for subscription-due notifications.
+
+Instead of one Cloud Function invocation per Pub/Sub event, this worker pulls many
+messages at a time, builds all of their notification payloads, sends them over a
+pooled keep-alive HTTP session (through POST /notifications/batch, or with bounded
+concurrency against POST /notifications) and acks the messages that succeeded.
+
+A message the service rejects (a 4xx other than 408/429) or that can't be turned into a
+payload will never succeed, so it is handed to `dead_letter` (if given) and acked rather
+than redelivered forever; when the batch endpoint rejects a whole batch, its items are
+sent one by one to find the bad ones. Messages that failed for a transient reason (5xx,
+429, timeouts, connection errors, per-item DB errors) are nacked so Pub/Sub redelivers
+them (or dead-letters them after the subscription's max delivery attempts).
+
+The subscriber only needs `pull`, `acknowledge` and `modify_ack_deadline` with the
+google-cloud-pubsub request shapes, so an in-memory fake can be used locally.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from main import NOTIFICATION_SERVICE_URL, build_notification_payload, create_http_session
+
+logger = logging.getLogger("notification-batch-worker")
+
+# Outcomes of sending one message
+ACCEPTED = "accepted"
+REJECTED = "rejected"    # permanent: dead-letter and ack
+FAILED = "failed"        # transient: nack for redelivery
+
+# 4xx answers that a retry can get past
+RETRYABLE_CLIENT_ERRORS = (408, 429)
+
+
+def outcome_for_status(status_code: int) -> str:
+    if status_code in (200, 201, 202):
+        return ACCEPTED
+    if 400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS:
+        return REJECTED
+    return FAILED
+
+
+class BatchPullWorker:
+    def __init__(
+        self,
+        subscriber: Any,
+        subscription_path: str,
+        service_url: str = NOTIFICATION_SERVICE_URL,
+        max_messages: int = 500,
+        concurrency: int = 16,
+        use_batch_endpoint: bool = True,
+        session: Optional[requests.Session] = None,
+        timeout: float = 30.0,
+        dead_letter: Optional[Callable[[bytes, str], None]] = None
+    ):
+        self.subscriber = subscriber
+        self.subscription_path = subscription_path
+        self.service_url = service_url.rstrip("/")
+        self.max_messages = max_messages
+        self.concurrency = concurrency
+        self.use_batch_endpoint = use_batch_endpoint
+        self.session = session or create_http_session(pool_size=concurrency)
+        self.timeout = timeout
+        # Called with a rejected message's data and the reason; may raise to have it nacked instead
+        self.dead_letter = dead_letter
+        self.acked = 0
+        self.nacked = 0
+        self.rejected = 0
+
+    def run_once(self) -> Tuple[int, int]:
+        """Pull one batch, deliver it and ack/nack. Returns (acked, nacked)."""
+        response = self.subscriber.pull(
+            request={"subscription": self.subscription_path, "max_messages": self.max_messages},
+            timeout=self.timeout
+        )
+        received = list(response.received_messages)
+        if not received:
+            return 0, 0
+
+        ok_ack_ids: List[str] = []
+        failed_ack_ids: List[str] = []
+        rejected: List[Tuple[Any, str]] = []
+        pending: List[Tuple[Any, Dict[str, Any]]] = []
+        for received_message in received:
+            try:
+                payload = json.loads(received_message.message.data.decode("utf-8"))
+                pending.append((received_message, build_notification_payload(payload)))
+            except Exception as e:
+                rejected.append((received_message, f"invalid message: {str(e)}"))
+
+        if pending:
+            send = self._send_batch if self.use_batch_endpoint else self._send_concurrently
+            outcomes = send([body for _, body in pending])
+            for (received_message, _), (outcome, reason) in zip(pending, outcomes):
+                if outcome == ACCEPTED:
+                    ok_ack_ids.append(received_message.ack_id)
+                elif outcome == REJECTED:
+                    rejected.append((received_message, reason))
+                else:
+                    failed_ack_ids.append(received_message.ack_id)
+
+        for received_message, reason in rejected:
+            logger.error(f"Rejecting message {received_message.ack_id}: {reason}")
+            try:
+                if self.dead_letter is not None:
+                    self.dead_letter(received_message.message.data, reason)
+                ok_ack_ids.append(received_message.ack_id)
+                self.rejected += 1
+            except Exception as e:
+                logger.error(f"Failed to dead-letter message {received_message.ack_id}: {str(e)}")
+                failed_ack_ids.append(received_message.ack_id)
+
+        if ok_ack_ids:
+            self.subscriber.acknowledge(
+                request={"subscription": self.subscription_path, "ack_ids": ok_ack_ids}
+            )
+        if failed_ack_ids:
+            # Deadline 0 makes the messages available for redelivery right away
+            self.subscriber.modify_ack_deadline(
+                request={"subscription": self.subscription_path, "ack_ids": failed_ack_ids, "ack_deadline_seconds": 0}
+            )
+        self.acked += len(ok_ack_ids)
+        self.nacked += len(failed_ack_ids)
+        return len(ok_ack_ids), len(failed_ack_ids)
+
+    def _send_batch(self, bodies: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        """(outcome, reason) per body."""
+        try:
+            response = self.session.post(
+                f"{self.service_url}/notifications/batch",
+                json={"notifications": bodies},
+                timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            logger.error(f"Failed to call notification service: {str(e)}")
+            return [(FAILED, str(e))] * len(bodies)
+        if response.status_code == 200:
+            outcomes = [(FAILED, "missing from the batch response")] * len(bodies)
+            for result in response.json()["results"]:
+                if result.get("id") is not None:
+                    outcomes[result["index"]] = (ACCEPTED, "")
+                else:
+                    # Row-level insert errors; the request itself was valid
+                    outcomes[result["index"]] = (FAILED, result.get("error") or "")
+            return outcomes
+        if outcome_for_status(response.status_code) == REJECTED:
+            # One bad item fails the whole request; find it by sending them one at a time
+            logger.warning(f"Batch endpoint returned {response.status_code}, sending {len(bodies)} items one by one")
+            return self._send_concurrently(bodies)
+        logger.error(f"Batch endpoint returned {response.status_code}: {response.text}")
+        return [(FAILED, f"batch endpoint returned {response.status_code}")] * len(bodies)
+
+    def _send_one(self, body: Dict[str, Any]) -> Tuple[str, str]:
+        try:
+            response = self.session.post(f"{self.service_url}/notifications", json=body, timeout=self.timeout)
+        except requests.RequestException as e:
+            logger.error(f"Failed to call notification service: {str(e)}")
+            return FAILED, str(e)
+        # 202 when the service runs with a write-behind ingestion queue
+        outcome = outcome_for_status(response.status_code)
+        return outcome, "" if outcome == ACCEPTED else f"{response.status_code}: {response.text}"
+
+    def _send_concurrently(self, bodies: List[Dict[str, Any]]) -> List[Tuple[str, str]]:
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(self._send_one, bodies))
+
+    def run_forever(self, stop: Optional[threading.Event] = None, report_every: float = 10.0) -> None:
+        """Pull and deliver until stop is set, logging messages/sec every report_every seconds."""
+        stop = stop or threading.Event()
+        window_started, window_count = time.monotonic(), 0
+        while not stop.is_set():
+            acked, nacked = self.run_once()
+            window_count += acked + nacked
+            elapsed = time.monotonic() - window_started
+            if elapsed >= report_every:
+                logger.info(
+                    f"{window_count / elapsed:.1f} messages/sec "
+                    f"({self.acked} acked, {self.rejected} of them rejected, {self.nacked} nacked total)"
+                )
+                window_started, window_count = time.monotonic(), 0
+
+
+def pubsub_dead_letter(topic_path: str) -> Callable[[bytes, str], None]:
+    """Publish rejected messages to topic_path, with the reason as an attribute."""
+    from google.cloud import pubsub_v1
+
+    publisher = pubsub_v1.PublisherClient()
+
+    def dead_letter(data: bytes, reason: str) -> None:
+        publisher.publish(topic_path, data, reason=reason[:1024]).result(timeout=30)
+
+    return dead_letter
+
+
+if __name__ == "__main__":
+    from google.cloud import pubsub_v1
+
+    logging.basicConfig(level=logging.INFO)
+    dead_letter_topic = os.environ.get("BATCH_DEAD_LETTER_TOPIC")
+    worker = BatchPullWorker(
+        pubsub_v1.SubscriberClient(),
+        os.environ["PUBSUB_SUBSCRIPTION"],
+        max_messages=int(os.environ.get("BATCH_MAX_MESSAGES", "500")),
+        concurrency=int(os.environ.get("BATCH_CONCURRENCY", "16")),
+        use_batch_endpoint=os.environ.get("BATCH_USE_BATCH_ENDPOINT", "true").lower() == "true",
+        dead_letter=pubsub_dead_letter(dead_letter_topic) if dead_letter_topic else None
+    )
+    worker.run_forever()
@@ -6,12 +6,13 @@ It creates a notification in the notification service database and prepares
 it for delivery to the frontend via SSE.
 """
 
+import base64
 import json
 import logging
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Any, Dict
-from google.cloud import pubsub_v1
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +25,71 @@ NOTIFICATION_SERVICE_URL = os.environ.get(
 ).rstrip("/")
 
 
+def create_http_session(pool_size: int = 10) -> requests.Session:
+    """HTTP session with keep-alive connection pooling to the notification service."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+# Module level so warm instances reuse the TCP/TLS connection across invocations
+http_session = create_http_session()
+
+
+def decode_event(event: Dict[str, Any]) -> Dict[str, Any]:
+    """Decode a Pub/Sub event (or a plain dict, for testing) into the message payload."""
+    if "data" in event:
+        # Pub/Sub message format
+        message_data = base64.b64decode(event["data"]).decode("utf-8")
+        return json.loads(message_data)
+    # Direct JSON format (for testing)
+    return event
+
+
+def build_notification_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the POST /notifications body for a subscription-due message."""
+    # Validate required fields
+    required_fields = ["user_id", "subscription_id"]
+    missing_fields = [field for field in required_fields if field not in payload]
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {missing_fields}")
+    
+    # Extract payload data
+    user_id = payload["user_id"]
+    subscription_id = payload["subscription_id"]
+    subscription_plan = payload.get("subscription_plan", "Subscription")
+    billing_date = payload.get("billing_date", "")
+    price = payload.get("price", "0.00")
+    user_name = payload.get("user_name", "Subscriber")
+    
+    notification = {
+        "user_id": user_id,
+        "subscription_id": subscription_id,
+        "subject": f"Upcoming Payment: {subscription_plan}",
+        # The service stores these and renders the "payment_due" body when it is read
+        "template_id": "payment_due",
+        "template_params": {
+            "user_name": user_name,
+            "subscription_plan": subscription_plan,
+            "billing_date": billing_date,
+            "price": price
+        },
+        "notification_type": "push",
+        # user_id and subscription_id are already top-level fields of the notification
+        "metadata": {
+            "billing_date": billing_date,
+            "price": price
+        }
+    }
+    if billing_date:
+        # Pub/Sub delivers at least once; the service stores one notification per due date
+        notification["dedup_key"] = f"due:{subscription_id}:{billing_date}"
+    return notification
+
+
 def send_push_notification(event: Dict[str, Any], context: Any) -> None:
     """
     Cloud Function entry point triggered by Pub/Sub.
@@ -33,61 +99,22 @@ def send_push_notification(event: Dict[str, Any], context: Any) -> None:
         context: Cloud Function context (unused but required)
     """
     try:
-        # Decode Pub/Sub message
-        if "data" in event:
-            # Pub/Sub message format
-            import base64
-            message_data = base64.b64decode(event["data"]).decode("utf-8")
-            payload = json.loads(message_data)
-        else:
-            # Direct JSON format (for testing)
-            payload = event
+        payload = decode_event(event)
         
         logger.info(f"Received Pub/Sub event: {json.dumps(payload)}")
         
-        # Validate required fields
-        required_fields = ["user_id", "subscription_id"]
-        missing_fields = [field for field in required_fields if field not in payload]
-        if missing_fields:
-            raise ValueError(f"Missing required fields: {missing_fields}")
-        
-        # Extract payload data
+        notification_payload = build_notification_payload(payload)
         user_id = payload["user_id"]
         subscription_id = payload["subscription_id"]
-        subscription_plan = payload.get("subscription_plan", "Subscription")
-        billing_date = payload.get("billing_date", "")
-        price = payload.get("price", "0.00")
-        user_name = payload.get("user_name", "Subscriber")
-        
-        # Build notification payload
-        notification_payload = {
-            "user_id": user_id,
-            "subscription_id": subscription_id,
-            "subject": f"Upcoming Payment: {subscription_plan}",
-            "body": (
-                f"Hello {user_name},\n\n"
-                f"Your subscription for {subscription_plan} is due on {billing_date}.\n"
-                f"Amount: ${price}\n\n"
-                "Please ensure your payment method is up to date."
-            ),
-            "notification_type": "push",
-            "metadata": {
-                "subscription_id": subscription_id,
-                "user_id": user_id,
-                "billing_date": billing_date,
-                "price": price
-            }
-        }
         
         # Call notification service API to create notification
         notification_url = f"{NOTIFICATION_SERVICE_URL}/notifications"
         
         logger.info(f"Calling notification service: {notification_url}")
         
-        response = requests.post(
+        response = http_session.post(
             notification_url,
             json=notification_payload,
-            headers={"Content-Type": "application/json"},
             timeout=10
         )
         
@@ -97,6 +124,13 @@ def send_push_notification(event: Dict[str, Any], context: Any) -> None:
                 f"Successfully created notification {notification_data.get('id')} "
                 f"for user {user_id}, subscription {subscription_id}"
             )
+        elif response.status_code == 202:
+            # Service runs with a write-behind ingestion queue; the row is written shortly
+            notification_data = response.json()
+            logger.info(
+                f"Notification accepted as {notification_data.get('ingest_key')} "
+                f"for user {user_id}, subscription {subscription_id}"
+            )
         else:
             error_msg = f"Notification service returned {response.status_code}: {response.text}"
             logger.error(error_msg)
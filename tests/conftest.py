@@ -0,0 +1,71 @@
+import logging
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.utils.db import create_all, get_async_session_factory
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def logger():
+    return logging.getLogger("whatsub-notification-tests")
+
+
+def own_transactions(engine):
+    """Let SQLAlchemy own transactions so SAVEPOINTs work with pysqlite (and aiosqlite)."""
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+
+@pytest.fixture
+def make_engine(tmp_path):
+    """Factory for file-backed SQLite engines under tmp_path, optionally without the schema."""
+    engines = []
+
+    def make(name="notifications.db", schema=True):
+        engine = create_engine(
+            f"sqlite:///{tmp_path / name}", connect_args={"check_same_thread": False, "timeout": 30}
+        )
+        own_transactions(engine)
+        if schema:
+            create_all(engine)
+        engines.append(engine)
+        return engine
+
+    yield make
+    for engine in engines:
+        engine.dispose()
+
+
+@pytest.fixture
+def engine(make_engine):
+    return make_engine()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+@pytest.fixture
+async def async_session_factory(engine):
+    """AsyncSessions (aiosqlite) on the same database file as `engine`."""
+    async_engine = create_async_engine(
+        engine.url.set(drivername="sqlite+aiosqlite"), connect_args={"check_same_thread": False, "timeout": 30}
+    )
+    own_transactions(async_engine.sync_engine)
+    yield get_async_session_factory(async_engine)
+    await async_engine.dispose()
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from app.resources.notifications import admit, router as notifications_router
+from app.services.admission import AdmissionControl, AdmissionRejected, ConcurrencyLimiter
+
+
+def make_app(admission, **state):
+    app = FastAPI()
+    app.include_router(notifications_router)
+
+    @app.get("/fails", dependencies=[Depends(admit("writes"))])
+    async def fails():
+        raise RuntimeError("boom")
+
+    app.state.admission = admission
+    for name, value in state.items():
+        setattr(app.state, name, value)
+    return app
+
+
+def client(app):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app, raise_app_exceptions=False), base_url="http://test")
+
+
+@pytest.mark.anyio
+async def test_full_queue_is_refused_without_waiting():
+    limiter = ConcurrencyLimiter(1, max_waiting=0, max_wait=5.0)
+    assert await limiter.acquire()
+
+    started = time.perf_counter()
+    assert not await limiter.acquire()
+    assert time.perf_counter() - started < 0.1
+    assert limiter.stats() == {"in_flight": 1, "waiting": 0, "admitted": 1, "rejected": 1}
+
+
+@pytest.mark.anyio
+async def test_released_slot_goes_to_the_oldest_waiter():
+    limiter = ConcurrencyLimiter(1, max_waiting=2, max_wait=5.0)
+    await limiter.acquire()
+    first = asyncio.create_task(limiter.acquire())
+    second = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+
+    limiter.release()
+    assert await first
+    assert not second.done()
+    limiter.release()
+    assert await second
+    assert limiter.in_flight == 1
+
+
+@pytest.mark.anyio
+async def test_wait_timeout_raises_admission_rejected():
+    admission = AdmissionControl({"reads": ConcurrencyLimiter(1, max_waiting=1, max_wait=0.05)}, retry_after=3)
+    await admission.acquire("reads")
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await admission.acquire("reads")
+    assert rejected.value.retry_after == 3
+    assert admission.stats()["reads_rejected"] == 1
+    # Classes without a limiter are always admitted
+    await admission.acquire("counts")
+
+
+@pytest.mark.anyio
+async def test_timed_out_request_gets_503_with_retry_after():
+    admission = AdmissionControl({"reads": ConcurrencyLimiter(1, max_waiting=1, max_wait=0.05)}, retry_after=2)
+    await admission.acquire("reads")
+
+    async with client(make_app(admission)) as http:
+        response = await http.get("/notifications", params={"user_id": "user-1"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "2"
+
+
+@pytest.mark.anyio
+async def test_slot_is_released_when_the_route_raises():
+    limiter = ConcurrencyLimiter(1)
+    admission = AdmissionControl({"writes": limiter})
+
+    async with client(make_app(admission)) as http:
+        for _ in range(3):
+            response = await http.get("/fails")
+            assert response.status_code == 500
+    assert limiter.in_flight == 0
+    assert limiter.stats()["rejected"] == 0
+
+
+@pytest.mark.anyio
+async def test_coalesced_create_does_not_hold_a_writes_slot():
+    limiter = ConcurrencyLimiter(1)
+    window = asyncio.Event()
+
+    class Coalescer:
+        async def submit(self, payload):
+            await window.wait()
+            return 1, False
+
+    service = SimpleNamespace(templates=None)
+    app = make_app(AdmissionControl({"writes": limiter}), notification_service=service, coalescer=Coalescer())
+    body = {"user_id": "user-1", "subscription_id": 1, "subject": "Upcoming Payment", "body": "Due today."}
+    async with client(app) as http:
+        creates = [asyncio.create_task(http.post("/notifications", json=body)) for _ in range(3)]
+        await asyncio.sleep(0.1)
+        # All three wait on the coalescer together, none holding the only slot
+        assert limiter.in_flight == 0 and limiter.stats()["rejected"] == 0
+        window.set()
+        responses = await asyncio.gather(*creates)
+    assert [r.status_code for r in responses] == [201, 201, 201]
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta
+import asyncio
+
+import pytest
+from sqlalchemy import event
+
+from app.models.notification import NotificationRequest, NotificationType
+from app.services.async_notification_service import AsyncNotificationService, ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
+from app.services.recent_notifications import RecentNotificationsCache
+from app.services.unread_counter import UnreadCounterCache
+
+
+def payload(user_id="user-1", subscription_id=1, key=None, notification_type=NotificationType.push):
+    return NotificationRequest(
+        user_id=user_id, subscription_id=subscription_id, subject="Upcoming Payment", body="Due today.",
+        dedup_key=key, notification_type=notification_type, recipient_email="user@example.com"
+    )
+
+
+@pytest.fixture(params=["async", "threaded"])
+async def service(request, session_factory, async_session_factory, logger):
+    """The async service on aiosqlite, and the threaded facade over the sync one as its reference."""
+    caches = {"unread_counter": UnreadCounterCache(), "recent_cache": RecentNotificationsCache()}
+    if request.param == "async":
+        return AsyncNotificationService(async_session_factory, logger, **caches)
+    return ThreadedNotificationService(NotificationService(session_factory, logger, **caches))
+
+
+@pytest.mark.anyio
+async def test_create_and_list(service):
+    first_id, duplicate = await service.create_notification(payload(key="k-1"))
+    assert not duplicate
+    assert await service.create_notification(payload(key="k-1")) == (first_id, True)
+
+    results = await service.create_notifications([payload(), payload(key="k-1"), payload("user-2"), payload(key="k-2")])
+    assert [r.duplicate for r in results] == [False, True, False, False]
+    assert results[1].id == first_id
+
+    listed = await service.get_user_notifications("user-1", limit=10)
+    assert [n.id for n in listed] == sorted((first_id, results[0].id, results[3].id), reverse=True)
+    assert listed[0].message == "Due today."
+    rows = await service.get_user_notification_rows("user-1", limit=1, offset=1, fields=["id", "subject"])
+    assert rows == [{"id": listed[1].id, "subject": "Upcoming Payment"}]
+    assert [n.id for n in await service.get_notifications_after("user-1", after_id=first_id)] == [results[0].id, results[3].id]
+    assert await service.find_by_dedup_keys(["k-1", "k-2", "k-3"]) == {"k-1": first_id, "k-2": results[3].id}
+    assert await service.latest_notification_id() == max(r.id for r in results)
+
+
+@pytest.mark.anyio
+async def test_read_state_and_unread_counts(service):
+    ids = [r.id for r in await service.create_notifications([payload() for _ in range(4)])]
+    assert await service.get_unread_count("user-1") == 4
+
+    assert await service.mark_notification_read(ids[0], "user-1")
+    assert not await service.mark_notification_read(ids[0], "user-2")
+    assert await service.mark_notifications_read("user-1", ids[1:3]) == 2
+    assert await service.get_unread_count("user-1") == 1
+    assert await service.mark_all_read("user-1") == 1
+    assert await service.get_unread_count("user-1") == 0
+    assert await service.get_user_notifications("user-1", unread_only=True) == []
+
+    assert await service.mark_notification_delivered(ids[0])
+    assert await service.mark_notifications_delivered(ids[1:]) == 3
+
+
+@pytest.mark.anyio
+async def test_dispatch_claim_and_outcome(service):
+    email_id, _ = await service.create_notification(payload(notification_type=NotificationType.email))
+    failing_id, _ = await service.create_notification(payload(notification_type=NotificationType.email))
+
+    claimed = await service.claim_for_dispatch([ORMNotificationType.email], limit=10, lease_seconds=60)
+    assert [(n["id"], n["attempts"]) for n in claimed] == [(email_id, 1), (failing_id, 1)]
+    # Leased: another dispatcher sees nothing
+    assert await service.claim_for_dispatch([ORMNotificationType.email], limit=10, lease_seconds=60) == []
+
+    await service.complete_dispatch([email_id], [{
+        "b_id": failing_id, "b_status": ORMNotificationStatus.queued,
+        "b_next_attempt_at": datetime.utcnow() - timedelta(seconds=1), "b_error": "provider down"
+    }])
+    claimed = await service.claim_for_dispatch([ORMNotificationType.email], limit=10, lease_seconds=60)
+    assert [(n["id"], n["attempts"]) for n in claimed] == [(failing_id, 2)]
+
+
+@pytest.mark.anyio
+async def test_delete_and_purge(service):
+    await service.create_notifications([payload(subscription_id=1) for _ in range(3)] + [payload(subscription_id=2)])
+    progress = []
+
+    assert await service.delete_notifications_by_subscription_id(1, chunk_size=2, progress=progress.append) == 3
+    assert progress == [2, 3]
+    assert await service.get_unread_count("user-1") == 1
+
+    cutoffs = [(ORMNotificationType.push, ORMNotificationStatus.sent, datetime.utcnow() + timedelta(days=1))]
+    deleted, _ = await service.purge_expired_chunk(cutoffs)
+    assert deleted == 1
+    assert await service.get_user_notifications("user-1") == []
+
+
+@pytest.mark.anyio
+async def test_errors_surface_as_runtime_errors(service):
+    with pytest.raises(RuntimeError, match="Failed to get notifications"):
+        await service.get_user_notification_rows("user-1", limit=100, fields=["id", "no_such_field"])
+
+
+@pytest.mark.anyio
+async def test_cache_hits_check_out_no_connection(async_session_factory, logger):
+    service = AsyncNotificationService(
+        async_session_factory, logger, unread_counter=UnreadCounterCache(), recent_cache=RecentNotificationsCache()
+    )
+    checkouts = []
+    event.listen(async_session_factory.kw["bind"].sync_engine, "checkout", lambda *args: checkouts.append(1))
+    await service.create_notifications([payload() for _ in range(3)])
+    assert await service.get_unread_count("user-1") == 3
+    assert len(await service.get_user_notifications("user-1", limit=10)) == 3
+    filled = len(checkouts)
+
+    assert await service.get_unread_count("user-1") == 3
+    assert len(await service.get_user_notifications("user-1", limit=10)) == 3
+    assert len(checkouts) == filled
+
+
+@pytest.mark.anyio
+async def test_concurrent_calls_use_their_own_sessions(service):
+    results = await asyncio.gather(*(
+        service.create_notification(payload(f"user-{i % 4}", subscription_id=i)) for i in range(20)
+    ))
+    assert len({notification_id for notification_id, _ in results}) == 20
+    counts = await asyncio.gather(*(service.get_unread_count(f"user-{i}") for i in range(4)))
+    assert counts == [5, 5, 5, 5]
@@ -0,0 +1,123 @@
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "cloud-functions", "send-push-notification"))
+from batch_worker import BatchPullWorker  # noqa: E402
+
+
+def message(i, **fields):
+    payload = {"user_id": f"user-{i}", "subscription_id": i, **fields}
+    return SimpleNamespace(ack_id=f"ack-{i}", message=SimpleNamespace(data=json.dumps(payload).encode()))
+
+
+class Subscriber:
+    def __init__(self, received):
+        self.received = received
+        self.acked = []
+        self.nacked = []
+
+    def pull(self, request, timeout=None):
+        received, self.received = self.received, []
+        return SimpleNamespace(received_messages=received)
+
+    def acknowledge(self, request):
+        self.acked.extend(request["ack_ids"])
+
+    def modify_ack_deadline(self, request):
+        self.nacked.extend(request["ack_ids"])
+
+
+class Session:
+    """Answers POSTs from `respond(path, json) -> (status, body)`."""
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.paths = []
+
+    def post(self, url, json, timeout=None):
+        path = url.split("http://service", 1)[1]
+        self.paths.append(path)
+        status, body = self.respond(path, json)
+        if isinstance(body, Exception):
+            raise body
+        return SimpleNamespace(status_code=status, json=lambda: body, text=str(body))
+
+
+def worker(received, respond, **kwargs):
+    subscriber = Subscriber(received)
+    return subscriber, BatchPullWorker(
+        subscriber, "sub", "http://service", concurrency=2, session=Session(respond), **kwargs
+    )
+
+
+def rejects_subscription_3(path, body):
+    if path == "/notifications/batch":
+        if any(n["subscription_id"] == 3 for n in body["notifications"]):
+            return 422, {"detail": "invalid"}
+        return 200, {"results": [{"index": i, "id": i + 1} for i in range(len(body["notifications"]))]}
+    return (422, {"detail": "invalid"}) if body["subscription_id"] == 3 else (201, {"id": 1})
+
+
+def test_rejected_batch_is_retried_per_item_and_only_the_bad_message_is_dead_lettered():
+    dead_letters = []
+    subscriber, batch_worker = worker(
+        [message(i) for i in range(1, 6)], rejects_subscription_3,
+        dead_letter=lambda data, reason: dead_letters.append((json.loads(data)["subscription_id"], reason))
+    )
+
+    assert batch_worker.run_once() == (5, 0)
+
+    assert sorted(subscriber.acked) == [f"ack-{i}" for i in range(1, 6)]
+    assert subscriber.nacked == []
+    assert [subscription_id for subscription_id, _ in dead_letters] == [3]
+    assert dead_letters[0][1].startswith("422")
+    assert batch_worker.rejected == 1
+
+
+def test_unparseable_message_is_acked_not_redelivered():
+    bad = SimpleNamespace(ack_id="ack-bad", message=SimpleNamespace(data=b"not json"))
+    subscriber, batch_worker = worker([bad, message(1)], rejects_subscription_3)
+    missing_fields = SimpleNamespace(ack_id="ack-missing", message=SimpleNamespace(data=b'{"user_id": "u"}'))
+    subscriber.received.append(missing_fields)
+
+    assert batch_worker.run_once() == (3, 0)
+    assert set(subscriber.acked) == {"ack-bad", "ack-1", "ack-missing"}
+    assert batch_worker.rejected == 2
+
+
+def test_transient_failures_are_nacked():
+    def respond(path, body):
+        if path == "/notifications/batch":
+            # A row-level error for the second item; the rest were stored
+            return 200, {"results": [{"index": 0, "id": 1}, {"index": 1, "id": None, "error": "deadlock"}]}
+        return 503, {"detail": "busy"}
+
+    subscriber, batch_worker = worker([message(1), message(2)], respond)
+    assert batch_worker.run_once() == (1, 1)
+    assert (subscriber.acked, subscriber.nacked) == (["ack-1"], ["ack-2"])
+
+    for status in (429, 503):
+        subscriber, batch_worker = worker([message(1), message(2)], lambda path, body: (status, {}))
+        assert batch_worker.run_once() == (0, 2)
+        # Only one request: a retryable status is not a reason to try each item
+        assert batch_worker.session.paths == ["/notifications/batch"]
+
+    subscriber, batch_worker = worker(
+        [message(1)], lambda path, body: (0, requests.ConnectionError("refused")), use_batch_endpoint=False
+    )
+    assert batch_worker.run_once() == (0, 1)
+
+
+def test_failed_dead_letter_publish_nacks_the_message():
+    def dead_letter(data, reason):
+        raise RuntimeError("publish failed")
+
+    subscriber, batch_worker = worker([message(3)], rejects_subscription_3, dead_letter=dead_letter)
+
+    assert batch_worker.run_once() == (0, 1)
+    assert subscriber.nacked == ["ack-3"]
+    assert batch_worker.rejected == 0
@@ -0,0 +1,118 @@
+from datetime import datetime
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import update
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import router as notifications_router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from app.services.recent_notifications import RecentNotificationsCache
+from app.services.unread_counter import UnreadCounterCache
+
+
+def payload(user_id, i):
+    return NotificationRequest(user_id=user_id, subscription_id=1, subject=f"Upcoming Payment {i}", body="Due today.")
+
+
+@pytest.fixture
+def service(session_factory, logger):
+    return NotificationService(
+        session_factory, logger, recent_cache=RecentNotificationsCache(), unread_counter=UnreadCounterCache()
+    )
+
+
+@pytest.fixture
+def http(service):
+    app = FastAPI()
+    app.include_router(notifications_router)
+    app.state.notification_service = ThreadedNotificationService(service)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def create(service, user_id, count):
+    return [r.id for r in service.create_notifications([payload(user_id, i) for i in range(count)])]
+
+
+async def unread_count(http, user_id):
+    response = await http.get("/notifications/unread-count", params={"user_id": user_id})
+    return response.json()["unread_count"]
+
+
+async def warm(http, *user_ids):
+    # Fill the unread counter and the recent cache so the writes have to update them
+    for user_id in user_ids:
+        await unread_count(http, user_id)
+        await http.get("/notifications", params={"user_id": user_id})
+
+
+def read_ids(service, user_id):
+    """Ids of the user's read notifications, from the cached first page and from the DB."""
+    cached = {n["id"] for n in service.recent_cache.page(user_id, 20) if n["read_at"] is not None}
+    stored = {n["id"] for n in service.get_user_notification_rows(user_id, limit=20) if n["read_at"] is not None}
+    return cached, stored
+
+
+@pytest.mark.anyio
+async def test_mark_read_by_id_list(service, http):
+    mine = create(service, "user-1", 4)
+    theirs = create(service, "user-2", 2)
+    async with http:
+        await warm(http, "user-1", "user-2")
+
+        # Another user's id and an unknown id are skipped, not counted
+        body = {"notification_ids": [mine[0], mine[1], theirs[0], 999999]}
+        response = await http.patch("/notifications/read", params={"user_id": "user-1"}, json=body)
+        assert response.status_code == 200
+        assert response.json()["updated_count"] == 2
+
+        # Already read: nothing left to update
+        response = await http.patch("/notifications/read", params={"user_id": "user-1"}, json=body)
+        assert response.json()["updated_count"] == 0
+
+        assert (await unread_count(http, "user-1"), await unread_count(http, "user-2")) == (2, 2)
+        assert service.unread_counter.get("user-1") == 2
+        assert read_ids(service, "user-1") == ({mine[0], mine[1]}, {mine[0], mine[1]})
+        assert read_ids(service, "user-2") == (set(), set())
+
+
+@pytest.mark.anyio
+async def test_mark_all_read(service, http, engine):
+    mine = create(service, "user-1", 5)
+    create(service, "user-2", 2)
+    # The first two are older than the rest
+    with engine.begin() as conn:
+        conn.execute(
+            update(NotificationORM).where(NotificationORM.notification_id.in_(mine[:2])).values(
+                created_at=datetime(2024, 1, 15, 9, 0, 0)
+            )
+        )
+    async with http:
+        await warm(http, "user-1", "user-2")
+
+        response = await http.patch(
+            "/notifications/read-all", params={"user_id": "user-1", "before": "2024-01-15T10:00:00+01:00"}
+        )
+        assert response.json()["updated_count"] == 2
+        assert await unread_count(http, "user-1") == 3
+        assert read_ids(service, "user-1") == (set(mine[:2]), set(mine[:2]))
+
+        response = await http.patch("/notifications/read-all", params={"user_id": "user-1"})
+        assert response.json()["updated_count"] == 3
+        response = await http.patch("/notifications/read-all", params={"user_id": "user-1"})
+        assert response.json()["updated_count"] == 0
+
+        assert (await unread_count(http, "user-1"), await unread_count(http, "user-2")) == (0, 2)
+        assert service.unread_counter.get("user-1") == 0
+        assert read_ids(service, "user-1") == (set(mine), set(mine))
+        assert read_ids(service, "user-2") == (set(), set())
+
+
+@pytest.mark.anyio
+async def test_mark_read_needs_at_least_one_id(http):
+    async with http:
+        response = await http.patch("/notifications/read", params={"user_id": "user-1"}, json={"notification_ids": []})
+        assert response.status_code == 422
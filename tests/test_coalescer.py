@@ -0,0 +1,122 @@
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy import func, select
+
+from app.models.notification import NotificationRequest
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.coalescer import NotificationCoalescer, digest_subject
+from app.services.notification_service import NotificationService
+from app.services.orm_models import DigestItemORM, NotificationORM
+
+
+def payload(subscription_id, key=None, subject=None, user_id="user-1"):
+    return NotificationRequest(
+        user_id=user_id, subscription_id=subscription_id, subject=subject or f"Upcoming Payment: plan {subscription_id}",
+        body="Due today.", dedup_key=key
+    )
+
+
+def stored_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(NotificationORM)).scalar()
+
+
+@pytest.fixture
+def make_coalescer(session_factory, logger):
+    def make(**kwargs):
+        # No idempotency key cache: repeats have to be found in the database
+        service = ThreadedNotificationService(NotificationService(session_factory, logger))
+        return NotificationCoalescer(service, logger, **{"window": 0.05, **kwargs})
+
+    return make
+
+
+def test_digest_subject_is_built_from_the_merged_items():
+    assert digest_subject([payload(i).subject for i in (1, 2, 3)]) == "Upcoming Payment: plan 1 (+2 more)"
+    assert digest_subject(["Reminder", "Reminder"]) == "Reminder (2)"
+
+
+@pytest.mark.anyio
+async def test_repeat_of_a_merged_item_gets_the_digest_id(make_coalescer, engine):
+    coalescer = make_coalescer()
+    ids = await asyncio.gather(*(coalescer.submit(payload(i, f"due:{i}")) for i in (1, 2, 3)))
+    digest_id = ids[0][0]
+    assert ids == [(digest_id, False)] * 3
+    await coalescer.aclose()
+
+    # A later worker, after the key cache forgot them; one of the keys arrives in a batch too
+    coalescer = make_coalescer()
+    assert await coalescer.submit(payload(2, "due:2")) == (digest_id, True)
+    results = await coalescer.service.create_notifications([payload(3, "due:3"), payload(4, "due:4")])
+    assert (results[0].id, results[0].duplicate) == (digest_id, True)
+    await coalescer.aclose()
+    assert stored_rows(engine) == 2
+
+
+def stored_digest(engine, notification_id):
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(NotificationORM.subscription_id, NotificationORM.subject, NotificationORM.details).where(
+                NotificationORM.notification_id == notification_id
+            )
+        ).first()
+        items = conn.execute(
+            select(DigestItemORM.subscription_id).where(DigestItemORM.notification_id == notification_id)
+        ).scalars().all()
+    return row, sorted(items)
+
+
+@pytest.mark.anyio
+async def test_subscription_delete_removes_only_its_items_from_a_digest(make_coalescer, engine):
+    coalescer = make_coalescer()
+    ids = await asyncio.gather(*(coalescer.submit(payload(i, f"due:{i}")) for i in (1, 2, 3)))
+    digest_id = ids[0][0]
+    # Filed under the first item's subscription; the other two belong to 2 and 3
+    assert await coalescer.service.delete_notifications_by_subscription_id(2) == 1
+    row, items = stored_digest(engine, digest_id)
+    assert [item["subscription_id"] for item in row.details] == [1, 3] and items == [1, 3]
+    assert row.subject == "Upcoming Payment: plan 1 (+1 more)"
+
+    # Deleting the subscription the digest is filed under keeps the other items
+    assert await coalescer.service.delete_notifications_by_subscription_id(1) == 1
+    row, items = stored_digest(engine, digest_id)
+    assert (row.subscription_id, [item["subscription_id"] for item in row.details], items) == (3, [3], [3])
+    assert row.subject == "Upcoming Payment: plan 3 (1)"
+
+    # The removed items' keys are forgotten, the remaining one's still finds the digest
+    assert await coalescer.submit(payload(3, "due:3")) == (digest_id, True)
+    notification_id, duplicate = await coalescer.submit(payload(2, "due:2"))
+    assert not duplicate and notification_id != digest_id
+    await coalescer.aclose()
+
+    # The last item takes the digest with it
+    assert await coalescer.service.delete_notifications_by_subscription_id(3) == 1
+    assert stored_digest(engine, digest_id) == (None, [])
+    assert stored_rows(engine) == 1
+
+
+@pytest.mark.anyio
+async def test_stats_can_be_read_from_another_thread_while_groups_change(make_coalescer):
+    coalescer = make_coalescer(window=0.01, max_group=3)
+    stop = threading.Event()
+    errors = []
+
+    def scrape():
+        while not stop.is_set():
+            try:
+                coalescer.stats()
+            except Exception as e:
+                errors.append(e)
+
+    scraper = threading.Thread(target=scrape)
+    scraper.start()
+    try:
+        await asyncio.gather(*(coalescer.submit(payload(i, user_id=f"user-{i % 50}")) for i in range(200)))
+    finally:
+        stop.set()
+        scraper.join()
+    await coalescer.aclose()
+    assert errors == []
+    assert coalescer.stats()["pending"] == 0
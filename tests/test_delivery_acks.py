@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.services.delivery_acks import DeliveryAckBuffer
+
+
+class Service:
+    """Records mark_notifications_delivered calls; each write takes `delay` and the first `failures` fail."""
+
+    def __init__(self, delay=0.0, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.writes = []
+
+    async def mark_notifications_delivered(self, notification_ids):
+        await asyncio.sleep(self.delay)
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        self.writes.append(notification_ids)
+        return len(notification_ids)
+
+
+async def until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.anyio
+async def test_full_batch_is_written_without_waiting_for_the_interval(logger):
+    service = Service()
+    acks = DeliveryAckBuffer(service, logger, max_batch=3, flush_interval=60)
+    for notification_id in (3, 1, 2):
+        acks.ack(notification_id)
+    await until(lambda: service.writes)
+    assert service.writes == [[1, 2, 3]]
+    await acks.aclose()
+
+
+@pytest.mark.anyio
+async def test_partial_batch_is_written_after_the_interval(logger):
+    service = Service()
+    acks = DeliveryAckBuffer(service, logger, max_batch=100, flush_interval=0.05)
+    acks.ack(1)
+    acks.ack(1)
+    await asyncio.sleep(0.01)
+    assert service.writes == []
+    await until(lambda: service.writes)
+    assert service.writes == [[1]]
+    await acks.aclose()
+
+
+@pytest.mark.anyio
+async def test_shutdown_waits_for_the_write_in_progress_and_flushes_the_rest(logger):
+    service = Service(delay=0.1)
+    acks = DeliveryAckBuffer(service, logger, max_batch=2, flush_interval=60)
+    acks.ack(1)
+    acks.ack(2)
+    # The background write of [1, 2] is under way when shutdown starts
+    await asyncio.sleep(0.02)
+    acks.ack(3)
+    await acks.aclose()
+
+    assert service.writes == [[1, 2], [3]]
+    with pytest.raises(RuntimeError):
+        acks.ack(4)
+
+
+@pytest.mark.anyio
+async def test_failed_write_keeps_its_ids_for_the_next_one(logger):
+    service = Service(failures=1)
+    acks = DeliveryAckBuffer(service, logger, max_batch=100, flush_interval=60)
+    acks.ack(1)
+    assert await acks.flush() == 0
+    acks.ack(2)
+    await acks.aclose()
+    assert service.writes == [[1, 2]]
+    assert acks.acked == 2
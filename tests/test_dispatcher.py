@@ -0,0 +1,224 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import insert, select, update
+
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.dispatcher import DeliveryDispatcher, TokenBucket
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM, NotificationStatus, NotificationType
+from app.services.providers import DeliveryOutcome, MailjetProvider, WebhookSmsProvider
+from app.utils.metrics_registry import MetricsRegistry
+from benchmarks.stub_providers import StubProviders
+
+
+class ScriptedStub(StubProviders):
+    """Fails the messages the script lists for each call, in order, instead of at random."""
+
+    def __init__(self, script=(), **kwargs):
+        super().__init__(latency=0, **kwargs)
+        self.script = list(script)
+
+    def _outcomes(self, messages):
+        return self.script.pop(0) if self.script else [False] * messages
+
+
+@pytest.fixture
+def make_stub():
+    stubs = []
+
+    def make(script=(), rate_limit=0.0):
+        stubs.append(ScriptedStub(script, rate_limit=rate_limit).start())
+        return stubs[-1]
+
+    yield make
+    for stub in stubs:
+        stub.stop()
+
+
+@pytest.fixture
+def service(session_factory, logger):
+    return ThreadedNotificationService(NotificationService(session_factory, logger))
+
+
+def make_dispatcher(service, logger, providers, rate_limits=None, **kwargs):
+    return DeliveryDispatcher(service, logger, providers, rate_limits or {}, MetricsRegistry(), **kwargs)
+
+
+def email(stub, max_batch=50):
+    return {NotificationType.email: MailjetProvider("key", "secret", "test@example.com", api_url=stub.url, max_batch=max_batch)}
+
+
+def sms(stub, max_batch=100):
+    return {NotificationType.sms: WebhookSmsProvider(stub.url + "sms", max_batch=max_batch)}
+
+
+def seed(engine, notification_type, count, recipient=True):
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(NotificationORM), [
+            {
+                "subscription_id": 1,
+                "user_id": f"user-{i % 3}",
+                "notification_type": notification_type,
+                "subject": "Upcoming Payment",
+                "message": "Your subscription renews tomorrow.",
+                "status": NotificationStatus.queued,
+                "recipient_email": f"user{i}@example.com" if recipient else None,
+                "recipient_phone": f"+1555{i:07d}" if recipient else None,
+                "created_at": now,
+                "updated_at": now,
+            }
+            for i in range(count)
+        ])
+
+
+def rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(
+                NotificationORM.notification_id,
+                NotificationORM.status,
+                NotificationORM.attempts,
+                NotificationORM.next_attempt_at,
+                NotificationORM.last_error,
+            ).order_by(NotificationORM.notification_id)
+        ).all()
+
+
+def make_due(engine):
+    with engine.begin() as conn:
+        conn.execute(update(NotificationORM).values(next_attempt_at=datetime.utcnow() - timedelta(seconds=1)))
+
+
+def test_backoff_doubles_with_jitter_up_to_the_cap(logger):
+    dispatcher = make_dispatcher(None, logger, {}, backoff_base=30.0, backoff_max=3600.0)
+    for attempts, full in ((1, 30.0), (2, 60.0), (3, 120.0), (7, 1920.0), (8, 3600.0), (20, 3600.0)):
+        delays = [dispatcher.backoff(attempts) for _ in range(50)]
+        assert all(full / 2 <= delay <= full for delay in delays)
+    # Jittered, so a failed batch doesn't come back all at once
+    assert len({dispatcher.backoff(1) for _ in range(10)}) > 1
+
+
+@pytest.mark.anyio
+async def test_retryable_failures_back_off_until_max_attempts_then_fail(service, engine, logger, make_stub):
+    # Below one message per second: every call is answered with 429
+    stub = make_stub(rate_limit=0.5)
+    seed(engine, NotificationType.email, 2)
+    dispatcher = make_dispatcher(service, logger, email(stub), max_attempts=3, backoff_base=60.0, backoff_max=600.0)
+
+    before = datetime.utcnow()
+    assert await dispatcher.dispatch_once() == 2
+    for _, status, attempts, next_attempt_at, last_error in rows(engine):
+        assert (status, attempts, last_error) == (NotificationStatus.queued, 1, "mailjet: HTTP 429")
+        assert before + timedelta(seconds=30) <= next_attempt_at <= datetime.utcnow() + timedelta(seconds=60)
+    # Backed off: nothing is due yet
+    assert await dispatcher.dispatch_once() == 0
+
+    make_due(engine)
+    assert await dispatcher.dispatch_once() == 2
+    assert {(status, attempts) for _, status, attempts, _, _ in rows(engine)} == {(NotificationStatus.queued, 2)}
+
+    make_due(engine)
+    assert await dispatcher.dispatch_once() == 2
+    assert {row[1:] for row in rows(engine)} == {(NotificationStatus.failed, 3, None, "mailjet: HTTP 429")}
+    make_due(engine)
+    assert await dispatcher.dispatch_once() == 0
+
+    assert stub.calls == 3
+    assert dispatcher.retried_total.value(type="email") == 4
+    assert dispatcher.failed_total.value(type="email") == 2
+
+
+@pytest.mark.anyio
+async def test_token_bucket_spaces_out_acquires():
+    bucket = TokenBucket(rate=100.0, burst=10.0)
+    started = time.monotonic()
+    await bucket.acquire(10)
+    assert time.monotonic() - started < 0.05
+    for _ in range(3):
+        await bucket.acquire(10)
+    assert time.monotonic() - started >= 0.29
+
+
+@pytest.mark.anyio
+async def test_rate_limit_keeps_batches_under_the_provider_quota(service, engine, logger, make_stub):
+    seed(engine, NotificationType.sms, 80)
+
+    # Without a limit the whole claim goes out at once and the provider throttles part of it
+    unlimited = make_stub(rate_limit=60)
+    await make_dispatcher(service, logger, sms(unlimited, max_batch=5), concurrency=4).dispatch_once()
+    assert unlimited.throttled > 0
+
+    make_due(engine)
+    with engine.begin() as conn:
+        conn.execute(update(NotificationORM).values(status=NotificationStatus.queued, attempts=0, delivered_at=None))
+    stub = make_stub(rate_limit=120)
+    dispatcher = make_dispatcher(
+        service, logger, sms(stub, max_batch=5), rate_limits={NotificationType.sms: 100.0}, concurrency=4
+    )
+    started = time.monotonic()
+    assert await dispatcher.dispatch_once() == 80
+    # One batch of burst, the other 75 messages at 100/s
+    assert time.monotonic() - started >= 0.74
+    assert stub.throttled == 0
+    assert {row[1] for row in rows(engine)} == {NotificationStatus.delivered}
+    assert stub.calls == 16
+
+
+@pytest.mark.anyio
+async def test_mailjet_400_sends_the_rest_of_the_batch_again(service, engine, logger, make_stub):
+    # The second message is rejected, which fails the whole call; the resend goes through
+    stub = make_stub(script=[[False, True, False, False]])
+    seed(engine, NotificationType.email, 4)
+    seed(engine, NotificationType.email, 1, recipient=False)
+    dispatcher = make_dispatcher(service, logger, email(stub))
+
+    assert await dispatcher.dispatch_once() == 5
+    assert stub.calls == 2
+    assert [(status, attempts, last_error) for _, status, attempts, _, last_error in rows(engine)] == [
+        (NotificationStatus.delivered, 1, None),
+        (NotificationStatus.failed, 1, "mailjet: invalid recipient"),
+        (NotificationStatus.delivered, 1, None),
+        (NotificationStatus.delivered, 1, None),
+        (NotificationStatus.failed, 1, "no recipient"),
+    ]
+    assert dispatcher.retried_total.value(type="email") == 0
+
+
+@pytest.mark.anyio
+async def test_partial_sms_batch_fails_only_the_rejected_messages(service, engine, logger, make_stub):
+    stub = make_stub(script=[[False, True, False]])
+    seed(engine, NotificationType.sms, 3)
+    dispatcher = make_dispatcher(service, logger, sms(stub))
+
+    assert await dispatcher.dispatch_once() == 3
+    assert stub.calls == 1
+    assert [row[1] for row in rows(engine)] == [
+        NotificationStatus.delivered, NotificationStatus.failed, NotificationStatus.delivered
+    ]
+    assert rows(engine)[1].last_error == "sms: invalid number"
+
+
+class ShortProvider:
+    """Answers for the first message of each batch only."""
+
+    name = "short"
+    max_batch = 10
+
+    def send(self, messages):
+        return [DeliveryOutcome(True)]
+
+
+@pytest.mark.anyio
+async def test_messages_without_a_result_are_retried(service, engine, logger):
+    seed(engine, NotificationType.email, 3)
+    dispatcher = make_dispatcher(service, logger, {NotificationType.email: ShortProvider()}, backoff_base=60.0)
+
+    assert await dispatcher.dispatch_once() == 3
+    assert [(status, last_error) for _, status, _, _, last_error in rows(engine)] == [
+        (NotificationStatus.delivered, None),
+        (NotificationStatus.queued, "no result from provider"),
+        (NotificationStatus.queued, "no result from provider"),
+    ]
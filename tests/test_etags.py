@@ -0,0 +1,77 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import router as notifications_router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.user_versions import UserVersions
+
+PAGES = [("/notifications", {"user_id": "user-1"}), ("/notifications/unread-count", {"user_id": "user-1"})]
+
+# Each kind of write, given the ids of user-1's two notifications (both in subscription 1)
+WRITES = {
+    "create": lambda http, ids: http.post(
+        "/notifications", json={"user_id": "user-1", "subscription_id": 2, "subject": "Renewal", "body": "Renewed."}
+    ),
+    "mark read": lambda http, ids: http.patch(f"/notifications/{ids[0]}/read", params={"user_id": "user-1"}),
+    "bulk read": lambda http, ids: http.patch(
+        "/notifications/read", params={"user_id": "user-1"}, json={"notification_ids": ids}
+    ),
+    "mark all read": lambda http, ids: http.patch("/notifications/read-all", params={"user_id": "user-1"}),
+    "delete": lambda http, ids: http.delete("/notifications/subscription/1"),
+}
+
+
+@pytest.fixture
+def make_client(session_factory, logger):
+    def make(etags=True):
+        app = FastAPI()
+        app.include_router(notifications_router)
+        service = NotificationService(session_factory, logger, versions=UserVersions(etags=etags))
+        ids = [
+            service.create_notification(NotificationRequest(
+                user_id="user-1", subscription_id=1, subject=f"Upcoming Payment {i}", body="Due today."
+            ))[0]
+            for i in range(2)
+        ]
+        app.state.notification_service = ThreadedNotificationService(service)
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test"), ids
+
+    return make
+
+
+async def get(http, page, etag=None):
+    path, params = page
+    return await http.get(path, params=params, headers={"If-None-Match": etag} if etag else {})
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("write", list(WRITES))
+async def test_unchanged_etag_is_304_until_a_write(make_client, write):
+    http, ids = make_client()
+    async with http:
+        etags = [(await get(http, page)).headers["ETag"] for page in PAGES]
+        for page, etag in zip(PAGES, etags):
+            response = await get(http, page, etag)
+            assert (response.status_code, response.headers["ETag"], response.content) == (304, etag, b"")
+
+        response = await WRITES[write](http, ids)
+        assert response.status_code < 300
+
+        for page, etag in zip(PAGES, etags):
+            response = await get(http, page, etag)
+            assert response.status_code == 200
+            assert response.headers["ETag"] != etag
+
+
+@pytest.mark.anyio
+async def test_etags_can_be_turned_off(make_client):
+    http, _ = make_client(etags=False)
+    async with http:
+        for page in PAGES:
+            response = await get(http, page, "*")
+            assert response.status_code == 200
+            assert "ETag" not in response.headers
+            assert response.headers["Cache-Control"] == "private, no-cache"
@@ -0,0 +1,179 @@
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import orjson
+import pytest
+
+from app.models.notification import NotificationRead, NotificationStatus, NotificationType
+from app.services.event_bus import EventBus, UnixSocketEventBus
+
+
+def notification(notification_id, user_id="user-1"):
+    return NotificationRead(
+        id=notification_id, subscription_id=1, user_id=user_id, notification_type=NotificationType.push,
+        subject="Upcoming Payment", message="Due today.", status=NotificationStatus.sent,
+        created_at=datetime.utcnow()
+    )
+
+
+class Peer:
+    """A bus plus what its process was told about other processes' writes."""
+
+    def __init__(self, socket_dir, logger):
+        self.changed = []
+        self.lost = 0
+        self.bus = UnixSocketEventBus(
+            socket_dir, logger, on_remote_change=self.changed.extend, on_lost_changes=self.on_lost,
+            replay_size=20, sync_interval=0.05
+        )
+
+    def on_lost(self):
+        self.lost += 1
+
+
+async def until(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def drop_next_event(bus):
+    """Make the transport lose the next event (not a sync) the bus sends."""
+    send = bus._send
+
+    def send_or_drop(data):
+        if orjson.loads(data)["kind"] == "sync":
+            send(data)
+        else:
+            bus._send = send
+
+    bus._send = send_or_drop
+
+
+@pytest.fixture
+def socket_dir():
+    # Unix socket paths are limited to ~100 bytes, too short for pytest's tmp_path
+    path = tempfile.mkdtemp(prefix="bus-", dir="/tmp")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+
+@pytest.fixture
+async def peers(socket_dir, logger):
+    a, b = Peer(socket_dir, logger), Peer(socket_dir, logger)
+    await a.bus.start()
+    await b.bus.start()
+    yield a, b
+    await a.bus.stop()
+    await b.bus.stop()
+
+
+def test_event_bus_transport_methods_are_abstract(logger):
+    with pytest.raises(TypeError):
+        EventBus(logger)
+
+
+@pytest.mark.anyio
+async def test_notification_published_on_one_bus_reaches_streams_on_the_other(peers):
+    a, b = peers
+    subscription = b.bus.subscribe("user-1")
+    b.bus.start_replay(0)
+
+    a.bus.publish("user-1", notification(1))
+
+    received = await subscription.get(timeout=2.0)
+    assert received.id == 1
+    assert [n.id for n in b.bus.replay("user-1", 0)] == [1]
+    assert b.lost == 0
+
+
+@pytest.mark.anyio
+async def test_changed_users_reach_the_other_bus(peers):
+    a, b = peers
+
+    a.bus.users_changed(["user-1", "user-2"])
+    b.bus.users_changed(["user-3"])
+
+    await until(lambda: b.changed == ["user-1", "user-2"] and a.changed == ["user-3"])
+    assert a.lost == b.lost == 0
+
+
+@pytest.mark.anyio
+async def test_lost_event_is_noticed_from_the_next_one(peers):
+    a, b = peers
+    b.bus.start_replay(0)
+    b.bus.publish("user-1", notification(1))
+    subscription = b.bus.subscribe("user-1")
+    drop_next_event(a.bus)
+    a.bus.users_changed(["user-1"])
+
+    a.bus.users_changed(["user-2"])
+
+    await until(lambda: b.changed == ["user-2"])
+    assert b.lost == 1
+    # The replay buffer can't vouch for anything any more, and open streams catch up from the DB
+    assert b.bus.replay("user-1", 0) is None
+    assert await subscription.get(timeout=1.0) is None
+    assert subscription.overflowed
+
+
+@pytest.mark.anyio
+async def test_lost_last_event_is_noticed_from_the_sync(peers):
+    a, b = peers
+    a.bus.users_changed(["user-1"])
+    await until(lambda: b.changed == ["user-1"])
+    drop_next_event(a.bus)
+    a.bus.users_changed(["user-2"])
+
+    # Nothing else is published; the periodic sync reveals the loss
+    await until(lambda: b.lost == 1)
+    assert b.changed == ["user-1"]
+
+
+def test_gap_in_sequence_numbers_counts_as_one_loss(logger):
+    peer = Peer("/nonexistent", logger)
+
+    def event(seq):
+        return orjson.dumps({"origin": "peer", "seq": seq, "kind": "changed", "user_ids": [f"user-{seq}"]})
+
+    peer.bus._receive(event(1))
+    peer.bus._receive(event(2))
+    peer.bus._receive(event(5))
+    peer.bus._receive(orjson.dumps({"origin": "peer", "seq": 5, "kind": "sync"}))
+
+    assert peer.changed == ["user-1", "user-2", "user-5"]
+    assert peer.lost == 1 and peer.bus.lost == 1
+
+
+@pytest.mark.anyio
+async def test_slow_transport_does_not_block_publishers(socket_dir, logger):
+    bus = UnixSocketEventBus(socket_dir, logger, send_queue_size=2, sync_interval=60)
+    sending, release = threading.Event(), threading.Event()
+    sent = []
+
+    def slow_send(data):
+        sending.set()
+        release.wait(timeout=5)
+        sent.append(orjson.loads(data)["seq"])
+
+    bus._send = slow_send
+    await bus.start()
+    try:
+        bus.users_changed(["user-1"])
+        await until(sending.is_set)
+        started = time.monotonic()
+        for i in range(2, 5):
+            bus.users_changed([f"user-{i}"])
+        # Queued (or dropped) without waiting for the transport
+        assert time.monotonic() - started < 0.5
+        assert bus.stats()["queued"] == 2 and bus.dropped == 1
+    finally:
+        release.set()
+        await bus.stop()
+    # In order; peers find the dropped event from the gap
+    assert sent == [1, 2, 3]
@@ -0,0 +1,165 @@
+import threading
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import func, select
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import router as notifications_router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services import notification_service as notification_service_module
+from app.services.idempotency_keys import IdempotencyKeyCache
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM, NotificationStatus as ORMNotificationStatus, NotificationType as ORMNotificationType
+
+
+def payload(i, key=None):
+    return NotificationRequest(
+        user_id=f"user-{i % 10}", subscription_id=i % 5 + 1, subject="Upcoming Payment", body="Due today.",
+        dedup_key=key
+    )
+
+
+def stored_rows(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(NotificationORM)).scalar()
+
+
+@pytest.fixture
+def index_lookups(monkeypatch):
+    """Counts the dedup_key lookups create_notification makes after an IntegrityError."""
+    calls = []
+    query = notification_service_module.existing_dedup_keys_query
+
+    def counting(keys):
+        calls.append(list(keys))
+        return query(keys)
+
+    monkeypatch.setattr(notification_service_module, "existing_dedup_keys_query", counting)
+    return calls
+
+
+@pytest.mark.parametrize("cache", [False, True])
+def test_same_key_returns_the_same_id(session_factory, engine, logger, cache):
+    service = NotificationService(session_factory, logger, idempotency_keys=IdempotencyKeyCache() if cache else None)
+
+    first_id, first_duplicate = service.create_notification(payload(1, "due:1:2024-01-15"))
+    second_id, second_duplicate = service.create_notification(payload(1, "due:1:2024-01-15"))
+
+    assert second_id == first_id
+    assert (first_duplicate, second_duplicate) == (False, True)
+    assert stored_rows(engine) == 1
+
+
+def test_repeat_unknown_to_the_cache_is_caught_by_the_unique_index(session_factory, engine, logger, index_lookups):
+    # Another worker (or this one before a restart) stored the key
+    first_id, _ = NotificationService(session_factory, logger).create_notification(payload(1, "k"))
+    service = NotificationService(session_factory, logger, idempotency_keys=IdempotencyKeyCache())
+
+    assert service.create_notification(payload(1, "k")) == (first_id, True)
+    assert index_lookups == [["k"]]
+    # The id found through the index is cached for the next repeat
+    assert service.create_notification(payload(1, "k")) == (first_id, True)
+    assert index_lookups == [["k"]]
+
+
+def test_concurrent_duplicates_store_one_row_per_key(session_factory, engine, logger, index_lookups):
+    threads, keys = 4, 20
+    service = NotificationService(session_factory, logger, idempotency_keys=IdempotencyKeyCache())
+    returned = [dict() for _ in range(threads)]
+    barrier = threading.Barrier(threads)
+
+    def submit(worker):
+        barrier.wait()
+        for k in range(keys):
+            returned[worker][k], _ = service.create_notification(payload(k, f"dup-{k}"))
+
+    workers = [threading.Thread(target=submit, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    with engine.connect() as conn:
+        stored = dict(conn.execute(select(NotificationORM.dedup_key, NotificationORM.notification_id)).all())
+    assert stored_rows(engine) == keys
+    assert all(ids[k] == stored[f"dup-{k}"] for ids in returned for k in range(keys))
+    # Only requests that raced past the cache reach the index; each looks up its own key
+    assert all(len(lookup) == 1 for lookup in index_lookups)
+
+
+def test_batch_mixes_new_and_existing_keys(session_factory, engine, logger):
+    service = NotificationService(session_factory, logger)
+    existing_id, _ = service.create_notification(payload(0, "k-0"))
+
+    results = service.create_notifications([payload(0, "k-0"), payload(1, "k-1"), payload(2), payload(3, "k-3")])
+
+    assert [r.index for r in results] == [0, 1, 2, 3]
+    assert results[0].id == existing_id and results[0].duplicate
+    assert all(r.id is not None and not r.duplicate and r.error is None for r in results[1:])
+    assert len({r.id for r in results}) == 4
+    assert stored_rows(engine) == 4
+
+    # The whole batch again: every keyed item is a duplicate of its first id
+    again = service.create_notifications([payload(0, "k-0"), payload(1, "k-1"), payload(3, "k-3")])
+    assert [(r.id, r.duplicate) for r in again] == [(results[i].id, True) for i in (0, 1, 3)]
+    assert stored_rows(engine) == 4
+
+
+def test_key_repeated_within_a_batch_is_inserted_once(session_factory, engine, logger, caplog):
+    service = NotificationService(session_factory, logger)
+
+    results = service.create_notifications(
+        [payload(0, "k-0"), payload(1, "k-1"), payload(2, "k-0"), payload(3), payload(4, "k-1")], chunk_size=2
+    )
+
+    assert [(r.id, r.duplicate) for r in results[2::2]] == [(results[0].id, True), (results[1].id, True)]
+    assert not results[3].duplicate
+    assert stored_rows(engine) == 3
+    # Nothing had to fall back to per-item inserts
+    assert "retrying per item" not in caplog.text
+
+
+@pytest.mark.anyio
+async def test_batch_response_counts_duplicates_apart_from_created(session_factory, logger):
+    app = FastAPI()
+    app.include_router(notifications_router)
+    app.state.notification_service = ThreadedNotificationService(NotificationService(session_factory, logger))
+    body = {"notifications": [payload(0, "k-0").model_dump(mode="json"), payload(1, "k-0").model_dump(mode="json")]}
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        response = await http.post("/notifications/batch", json=body)
+
+    assert response.status_code == 200
+    counts = {key: response.json()[key] for key in ("created", "duplicates", "failed")}
+    assert counts == {"created": 1, "duplicates": 1, "failed": 0}
+
+
+def test_keys_of_deleted_notifications_are_forgotten(session_factory, engine, logger):
+    service = NotificationService(session_factory, logger, idempotency_keys=IdempotencyKeyCache())
+    service.create_notification(payload(5, "due:5"))
+    service.create_notification(payload(6, "due:6"))
+
+    service.delete_notifications_by_subscription_id(payload(5).subscription_id)
+    service.purge_expired_chunk([(ORMNotificationType.push, ORMNotificationStatus.sent, datetime.utcnow() + timedelta(days=1))])
+
+    # Created again, as the database alone would
+    recreated = [service.create_notification(payload(i, f"due:{i}")) for i in (5, 6)]
+    assert [duplicate for _, duplicate in recreated] == [False, False]
+    assert stored_rows(engine) == 2
+
+
+def test_cache_forgets_every_key_of_a_notification():
+    cache = IdempotencyKeyCache(max_keys=3)
+    # A digest with two merged keys, then a key that moves to another row
+    cache.put_many([("a", 1), ("b", 1), ("c", 2)])
+    cache.put_many([("c", 3)])
+    cache.forget([1, 2])
+    assert [cache.get(key) for key in "abc"] == [None, None, 3]
+
+    # LRU eviction drops the reverse entries too
+    cache.put_many([("d", 4), ("e", 5), ("f", 6)])
+    assert cache.get("c") is None
+    assert set(cache._keys) == {4, 5, 6}
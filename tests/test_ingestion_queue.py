@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import func, select
+
+from app.models.notification import NotificationBatchItemResult, NotificationRequest
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.ingestion_queue import IngestionFlusher, IngestionQueue
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+
+
+def payload(i):
+    return NotificationRequest(user_id=f"user-{i % 3}", subscription_id=i, subject=f"Upcoming Payment {i}", body="Due today.")
+
+
+def stored(engine):
+    with engine.connect() as conn:
+        return conn.execute(
+            select(NotificationORM.subject, func.count()).group_by(NotificationORM.subject)
+        ).all()
+
+
+@pytest.fixture
+def queue_path(tmp_path):
+    return str(tmp_path / "ingestion-queue.db")
+
+
+@pytest.fixture
+def make_flusher(session_factory, logger):
+    def make(queue):
+        # A new process: no idempotency key cache, repeats are found by the unique index
+        return IngestionFlusher(queue, ThreadedNotificationService(NotificationService(session_factory, logger)), logger)
+
+    return make
+
+
+@pytest.mark.anyio
+async def test_entries_written_before_a_crash_are_replayed_without_duplicates(queue_path, make_flusher, engine):
+    queue = IngestionQueue(queue_path)
+    for i in range(5):
+        queue.append(payload(i))
+    flusher = make_flusher(queue)
+
+    def crash(seq, failed=None):
+        raise RuntimeError("killed before remove_through")
+
+    # The group commit reaches the database, the queue never hears about it
+    queue.remove_through = crash
+    with pytest.raises(RuntimeError):
+        await flusher.flush()
+    assert len(stored(engine)) == 5
+    queue.close()
+
+    # Restart: the same entries are still queued and replayed on start
+    queue = IngestionQueue(queue_path)
+    assert queue.depth() == 5
+    queue.append(payload(5))
+    flusher = make_flusher(queue)
+    flusher.start()
+    await flusher.stop()
+
+    assert queue.depth() == 0
+    assert sorted(stored(engine)) == [(f"Upcoming Payment {i}", 1) for i in range(6)]
+    queue.close()
+
+
+@pytest.mark.anyio
+async def test_rejected_entries_move_to_the_failed_table(queue_path, make_flusher, engine):
+    queue = IngestionQueue(queue_path)
+    keys = [queue.append(payload(i)) for i in range(3)]
+    flusher = make_flusher(queue)
+    create_notifications = flusher.service.create_notifications
+
+    async def reject_second(payloads, dedup_keys):
+        first, third = await create_notifications([payloads[0], payloads[2]], dedup_keys=[dedup_keys[0], dedup_keys[2]])
+        return [
+            first,
+            NotificationBatchItemResult(index=1, error="Data too long for column 'subject'"),
+            third.model_copy(update={"index": 2}),
+        ]
+
+    flusher.service.create_notifications = reject_second
+    assert await flusher.flush() == 3
+    assert (queue.depth(), queue.failed_depth()) == (0, 1)
+    assert flusher.stats() == {"flushed": 2, "failed": 1, "pending": 0, "dead_letters": 1}
+    failed_key, error = queue._conn.execute("SELECT ingest_key, error FROM failed").fetchone()
+    assert (failed_key, error) == (keys[1], "Data too long for column 'subject'")
+
+    # Once the cause is fixed the entry can go through again
+    flusher.service.create_notifications = create_notifications
+    assert queue.retry_failed() == 1
+    assert await flusher.flush() == 1
+    assert (queue.depth(), queue.failed_depth()) == (0, 0)
+    assert sorted(stored(engine)) == [(f"Upcoming Payment {i}", 1) for i in range(3)]
+    queue.close()
@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from pydantic import ValidationError
+
+from app.models.notification import NotificationRead, NotificationReadFields, NotificationRequest
+from app.resources.notifications import router as notifications_router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+
+
+@pytest.fixture
+def app(session_factory, logger):
+    app = FastAPI()
+    app.include_router(notifications_router)
+    service = NotificationService(session_factory, logger)
+    service.create_notification(NotificationRequest(
+        user_id="user-1", subscription_id=1, subject="Upcoming Payment", body="Due today."
+    ))
+    app.state.notification_service = ThreadedNotificationService(service)
+    return app
+
+
+def test_projection_model_has_every_notification_field():
+    assert set(NotificationReadFields.model_fields) == set(NotificationRead.model_fields)
+    required = {name for name, field in NotificationReadFields.model_fields.items() if field.is_required()}
+    assert required == {"id", "created_at"}
+
+
+def test_openapi_documents_full_and_projected_rows(app):
+    schema = app.openapi()
+    items = schema["paths"]["/notifications"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["items"]
+    assert {ref["$ref"].rsplit("/", 1)[1] for ref in items["anyOf"]} == {"NotificationRead", "NotificationReadFields"}
+    assert schema["components"]["schemas"]["NotificationReadFields"]["required"] == ["id", "created_at"]
+
+
+@pytest.mark.anyio
+async def test_projected_rows_match_the_projection_model(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        response = await http.get("/notifications", params={"user_id": "user-1", "fields": "subject,read_at"})
+
+    assert response.status_code == 200
+    [row] = response.json()
+    assert set(row) == {"id", "created_at", "subject", "read_at"}
+    assert NotificationReadFields.model_validate(row).model_fields_set == set(row)
+    # What the schema used to promise
+    with pytest.raises(ValidationError):
+        NotificationRead.model_validate(row)
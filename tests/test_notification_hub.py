@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.models.notification import NotificationRead, NotificationStatus, NotificationType
+from app.resources.notifications import stream_notifications
+from app.services.notification_hub import DeliveredIds, NotificationHub
+
+
+def notification(notification_id, user_id="user-1"):
+    return NotificationRead(
+        id=notification_id, subscription_id=1, user_id=user_id, notification_type=NotificationType.push,
+        subject="Upcoming Payment", message="Due today.", status=NotificationStatus.sent,
+        created_at=datetime.utcnow()
+    )
+
+
+class Acks:
+    def __init__(self):
+        self.acked = []
+
+    def ack(self, notification_id):
+        self.acked.append(notification_id)
+
+
+async def events(hub, user_id="user-1", last_event_id=None):
+    """The stream's events as (id, data) pairs, read until the test stops consuming."""
+    request = SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(
+        notification_service=SimpleNamespace(hub=hub), delivery_acks=Acks()
+    )))
+    response = await stream_notifications(user_id=user_id, request=request, last_event_id=last_event_id)
+    async for chunk in response.body_iterator:
+        fields = dict(line.split(": ", 1) for line in chunk.split("\n") if line and not line.startswith(":"))
+        yield int(fields["id"]) if "id" in fields else None, json.loads(fields["data"]) if "data" in fields else None
+
+
+def test_watermark_waits_for_ids_published_out_of_order():
+    hub = NotificationHub(settle_seconds=60)
+    hub.start_replay(10)
+    hub.publish("user-1", notification(12))
+    hub.publish("user-2", notification(13))
+    assert hub.replay_watermark() == 10
+    hub.publish("user-2", notification(11))
+    assert hub.replay_watermark() == 13
+
+
+def test_watermark_moves_past_a_gap_after_settle_seconds():
+    hub = NotificationHub(settle_seconds=0.05)
+    hub.start_replay(10)
+    hub.publish("user-1", notification(12))
+    assert hub.replay_watermark() == 10
+    time.sleep(0.1)
+    assert hub.replay_watermark() == 12
+    # Published after it was given up on; a stream still gets it, the watermark stays
+    hub.publish("user-1", notification(11))
+    assert hub.replay_watermark() == 12
+
+
+def test_delivered_ids_are_bounded():
+    delivered = DeliveredIds(2)
+    assert delivered.add(1) and delivered.add(2)
+    assert not delivered.add(1)
+    assert delivered.add(3)
+    # 1 has been forgotten
+    assert delivered.add(1)
+
+
+@pytest.mark.anyio
+async def test_stream_sends_notifications_committed_out_of_order():
+    hub = NotificationHub(settle_seconds=60)
+    hub.start_replay(10)
+    stream = events(hub)
+    assert await stream.__anext__() == (10, None)
+
+    hub.publish("user-1", notification(12))
+    event_id, data = await asyncio.wait_for(stream.__anext__(), 1)
+    # 11 hasn't been published yet, so a resume must not move past it
+    assert data["id"] == 12 and event_id == 10
+
+    hub.publish("user-1", notification(11))
+    event_id, data = await asyncio.wait_for(stream.__anext__(), 1)
+    assert data["id"] == 11 and event_id == 12
+    await stream.aclose()
+
+
+@pytest.mark.anyio
+async def test_resume_sends_what_committed_after_the_last_event():
+    hub = NotificationHub(replay_size=20, settle_seconds=60)
+    hub.start_replay(10)
+    stream = events(hub)
+    await stream.__anext__()
+    hub.publish("user-1", notification(12))
+    last_event_id, _ = await asyncio.wait_for(stream.__anext__(), 1)
+    await stream.aclose()
+
+    # 11 commits while the client is away
+    hub.publish("user-1", notification(11))
+    stream = events(hub, last_event_id=str(last_event_id))
+    await stream.__anext__()
+    received = [(await asyncio.wait_for(stream.__anext__(), 1))[1]["id"] for _ in range(2)]
+    await stream.aclose()
+    assert sorted(received) == [11, 12]
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from sqlalchemy import event, select
+
+from app.models.notification import NotificationRequest
+from app.services.notification_queries import bulk_inserted_ids
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+
+
+class MySQLConnection:
+    """What bulk_inserted_ids sees of a MySQL connection: no RETURNING, LAST_INSERT_ID() only."""
+
+    def __init__(self, auto_increment_increment):
+        self.dialect = SimpleNamespace(name="mysql")
+        self.info = {}
+        self.auto_increment_increment = auto_increment_increment
+        self.queries = []
+
+    def exec_driver_sql(self, sql):
+        self.queries.append(sql)
+        return SimpleNamespace(scalar=lambda: self.auto_increment_increment)
+
+
+def test_ids_follow_lastrowid_one_apart_by_default():
+    connection = MySQLConnection(1)
+    assert bulk_inserted_ids(connection, SimpleNamespace(lastrowid=41), 3) == [41, 42, 43]
+
+
+def test_ids_are_auto_increment_increment_apart():
+    # e.g. one of three primaries, each handing out every third id
+    connection = MySQLConnection(3)
+    assert bulk_inserted_ids(connection, SimpleNamespace(lastrowid=10), 4) == [10, 13, 16, 19]
+    assert bulk_inserted_ids(connection, SimpleNamespace(lastrowid=31), 2) == [31, 34]
+    # Read once per connection
+    assert connection.queries == ["SELECT @@auto_increment_increment"]
+
+
+def test_returning_dialects_use_the_returned_ids():
+    connection = SimpleNamespace(dialect=SimpleNamespace(name="postgresql"), info={})
+    result = SimpleNamespace(scalars=lambda: iter([7, 9, 8]))
+    assert bulk_inserted_ids(connection, result, 3) == [7, 9, 8]
+    assert "auto_increment_increment" not in connection.info
+
+
+def test_each_chunk_is_one_multi_row_insert(engine, session_factory, logger):
+    inserts = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO notifications"):
+            inserts.append(executemany)
+
+    service = NotificationService(session_factory, logger)
+    service.create_notification(NotificationRequest(user_id="user-0", subscription_id=1, subject="s", body="b"))
+    inserts.clear()
+    payloads = [
+        NotificationRequest(user_id=f"user-{i % 3}", subscription_id=i, subject=f"s{i}", body="b") for i in range(12)
+    ]
+    results = service.create_notifications(payloads, chunk_size=5)
+
+    assert inserts == [False] * 3
+    # The derived ids are the rows' own
+    with engine.connect() as conn:
+        stored = dict(conn.execute(select(NotificationORM.notification_id, NotificationORM.subject)).all())
+    assert [stored[result.id] for result in results] == [payload.subject for payload in payloads]
@@ -0,0 +1,116 @@
+import base64
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from sqlalchemy import update
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import router as notifications_router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def payload(user_id, i):
+    return NotificationRequest(user_id=user_id, subscription_id=1, subject=f"Upcoming Payment {i}", body="Due today.")
+
+
+@pytest.fixture
+def service(session_factory, logger):
+    return NotificationService(session_factory, logger)
+
+
+@pytest.fixture
+def http(service):
+    app = FastAPI()
+    app.include_router(notifications_router)
+    app.state.notification_service = ThreadedNotificationService(service)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def b64(raw):
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+async def all_pages(http, limit, between_pages=None, **params):
+    ids, cursor = [], None
+    async with http:
+        while True:
+            response = await http.get(
+                "/notifications", params={"user_id": "user-1", "limit": limit, **params, **({"cursor": cursor} if cursor else {})}
+            )
+            assert response.status_code == 200
+            ids.extend(row["id"] for row in response.json())
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                return ids
+            if between_pages is not None:
+                between_pages()
+
+
+def test_cursor_round_trip():
+    created_at = datetime(2024, 1, 15, 9, 30, 5, 123456)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    assert "=" not in encode_cursor(created_at, 42)
+
+
+@pytest.mark.anyio
+async def test_pages_cover_every_row_once_when_timestamps_tie(service, http):
+    # One batch: every row has the same created_at, so ids alone order them
+    ids = [r.id for r in service.create_notifications([payload("user-1", i) for i in range(23)])]
+    service.create_notifications([payload("user-2", i) for i in range(5)])
+    # A newer row arriving mid-way belongs before the first page, not in a later one
+    newer = []
+
+    def create_newer():
+        if not newer:
+            newer.append(service.create_notification(payload("user-1", 99))[0])
+
+    assert await all_pages(http, 5, between_pages=create_newer) == sorted(ids, reverse=True)
+
+
+@pytest.mark.anyio
+async def test_pages_follow_created_at_then_id(service, http, engine):
+    ids = [r.id for r in service.create_notifications([payload("user-1", i) for i in range(12)])]
+    # Timestamps against id order, three rows on each
+    base = datetime(2024, 1, 15, 9, 0, 0)
+    with engine.begin() as conn:
+        for i, notification_id in enumerate(ids):
+            conn.execute(
+                update(NotificationORM).where(NotificationORM.notification_id == notification_id).values(
+                    created_at=base - timedelta(minutes=i // 3), read_at=base if i % 2 else None
+                )
+            )
+    expected = sorted(ids, key=lambda n: (base - timedelta(minutes=ids.index(n) // 3), n), reverse=True)
+
+    assert await all_pages(http, 4) == expected
+
+
+@pytest.mark.anyio
+async def test_unread_pages_skip_read_rows(service, http):
+    ids = [r.id for r in service.create_notifications([payload("user-1", i) for i in range(10)])]
+    service.mark_notifications_read("user-1", ids[::3])
+    unread = [n for n in ids if n not in ids[::3]]
+
+    assert await all_pages(http, 3, unread_only="true") == sorted(unread, reverse=True)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor!",
+    encode_cursor(datetime(2024, 1, 15), 7)[:-3],
+    b64(b'{"created_at": "2024-01-15T00:00:00", "id": 7}'),
+    b64(b'["2024-01-15T00:00:00", 7, 8]'),
+    b64(b'["yesterday", 7]'),
+    b64(b'["2024-01-15T00:00:00", "7; DROP TABLE notifications"]'),
+    b64(b'["2024-01-15T00:00:00", 7.5]'),
+    b64(b'["2024-01-15T00:00:00", true]'),
+])
+async def test_malformed_or_tampered_cursor_is_400(http, cursor):
+    async with http:
+        response = await http.get("/notifications", params={"user_id": "user-1", "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json()["detail"].startswith("Invalid cursor")
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from app.models.notification import NotificationRequest
+from app.services.notification_service import NotificationService
+from app.services.recent_notifications import RecentNotificationsCache, _row_bytes
+
+
+def payload(user_id="user-1"):
+    return NotificationRequest(user_id=user_id, subscription_id=1, subject="Upcoming Payment", body="Due today.")
+
+
+def recounted(cache):
+    """stats() figures computed the slow way, from every cached row."""
+    rows = [n for entry in cache._entries.values() for n in entry.items]
+    return {"notifications": len(rows), "approx_bytes": sum(_row_bytes(n) for n in rows)}
+
+
+def test_running_byte_estimate_matches_a_recount(session_factory, logger):
+    cache = RecentNotificationsCache(max_users=2, depth=3)
+    service = NotificationService(session_factory, logger, recent_cache=cache)
+    service.create_notifications([payload("user-1"), payload("user-2")])
+    service.get_user_notifications("user-1", limit=3)
+    service.get_user_notifications("user-2", limit=3)
+
+    def check():
+        stats = cache.stats()
+        assert {key: stats[key] for key in ("notifications", "approx_bytes")} == recounted(cache)
+
+    check()
+    # Pushes the oldest row out of user-1's entry
+    ids = [r.id for r in service.create_notifications([payload("user-1") for _ in range(3)])]
+    check()
+    service.mark_notification_read(ids[0], "user-1")
+    service.mark_notification_delivered(ids[1])
+    check()
+    # Evicts user-2
+    service.get_user_notifications("user-3", limit=3)
+    check()
+    service.delete_notifications_by_subscription_id(1)
+    check()
+    assert cache.stats()["notifications"] == 0
+    service.get_user_notifications("user-1", limit=3)
+    cache.invalidate_all()
+    assert cache.stats()["approx_bytes"] == 0
+
+
+def test_cached_timestamps_match_the_stored_ones(session_factory, logger):
+    cache = RecentNotificationsCache()
+    service = NotificationService(session_factory, logger, recent_cache=cache)
+    service.get_user_notifications("user-1")
+    notification_id, _ = service.create_notification(payload())
+    service.mark_notification_read(notification_id, "user-1")
+    cached = service.get_user_notifications("user-1")
+
+    cache.invalidate(["user-1"])
+    stored = service.get_user_notifications("user-1")
+
+    assert cached == stored
+    # Whole seconds, like a MySQL DATETIME column
+    assert stored[0].created_at.microsecond == stored[0].read_at.microsecond == 0
+    assert stored[0].created_at <= datetime.utcnow()
@@ -0,0 +1,151 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+
+from app.models.notification import NotificationRequest
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM, NotificationStatus, NotificationType
+from app.services.retention import RetentionPolicy, RetentionPurger
+
+NOW = datetime(2024, 6, 1, 12, 0, 0)
+
+
+def cutoff_days(policy):
+    return {
+        (notification_type.value, notification_status.value): (NOW - cutoff).days
+        for notification_type, notification_status, cutoff in policy.cutoffs(NOW)
+    }
+
+
+def test_most_specific_key_wins():
+    policy = RetentionPolicy({"email/failed": 7, "email/*": 14, "*/failed": 30, "*/*": 365})
+    days = cutoff_days(policy)
+
+    assert days[("email", "failed")] == 7
+    assert days[("email", "delivered")] == 14
+    assert days[("sms", "failed")] == days[("push", "failed")] == 30
+    assert days[("sms", "delivered")] == days[("push", "queued")] == 365
+    assert len(days) == len(NotificationType) * len(NotificationStatus)
+
+
+def test_combinations_without_a_key_are_kept():
+    assert cutoff_days(RetentionPolicy({"*/delivered": 30})) == {
+        (notification_type.value, "delivered"): 30 for notification_type in NotificationType
+    }
+    assert not RetentionPolicy({})
+    assert RetentionPolicy({}).cutoffs(NOW) == []
+
+
+@pytest.mark.parametrize("key", ["delivered", "fax/*", "*/read", "email/failed/x", "/", "Email/failed"])
+def test_invalid_keys_are_rejected(key):
+    with pytest.raises(ValueError, match="Invalid retention key"):
+        RetentionPolicy({key: 30})
+
+
+@pytest.mark.parametrize("days", [0, -1, True, 1.5, "30", None])
+def test_invalid_ttls_are_rejected(days):
+    with pytest.raises(ValueError, match="Invalid retention TTL"):
+        RetentionPolicy({"*/delivered": days})
+
+
+class RecordingService:
+    """Passes purge_expired_chunk through, noting when each chunk finished and what it deleted."""
+
+    def __init__(self, service):
+        self.service = service
+        self.chunks = []
+
+    async def purge_expired_chunk(self, cutoffs, after_id, chunk_size):
+        deleted, last_id = await self.service.purge_expired_chunk(cutoffs, after_id, chunk_size)
+        self.chunks.append((time.monotonic(), after_id, deleted))
+        return deleted, last_id
+
+
+@pytest.fixture
+def service(session_factory, logger):
+    return ThreadedNotificationService(NotificationService(session_factory, logger))
+
+
+async def seed(service, engine, rows):
+    """Create one notification per (type, status, age in days); returns their ids."""
+    created = await service.create_notifications([
+        NotificationRequest(
+            user_id=f"user-{i % 2}", subscription_id=1, subject=f"Upcoming Payment {i}", body="Due today.",
+            notification_type=notification_type
+        )
+        for i, (notification_type, _, _) in enumerate(rows)
+    ])
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        for result, (_, notification_status, age) in zip(created, rows):
+            conn.execute(
+                update(NotificationORM).where(NotificationORM.notification_id == result.id).values(
+                    status=notification_status, created_at=now - timedelta(days=age)
+                )
+            )
+    return [result.id for result in created]
+
+
+def remaining(engine):
+    with engine.connect() as conn:
+        return set(conn.scalars(select(NotificationORM.notification_id)))
+
+
+@pytest.mark.anyio
+async def test_purge_deletes_only_expired_rows_in_chunks(service, engine, logger):
+    expired = [
+        ("push", "delivered", 40),
+        ("email", "delivered", 31),
+        ("email", "failed", 8),
+    ] * 2
+    kept = [
+        ("push", "delivered", 10),
+        ("email", "failed", 6),
+        ("sms", "failed", 8),
+        ("sms", "queued", 400),
+        ("push", "sent", 400),
+    ]
+    # Interleaved, so every chunk has to skip over rows it keeps
+    ids = await seed(service, engine, [row for pair in zip(expired, kept + kept[:1]) for row in pair])
+    kept_ids = set(ids[1::2])
+
+    recording = RecordingService(service)
+    policy = RetentionPolicy({"*/delivered": 30, "email/failed": 7})
+    purger = RetentionPurger(recording, logger, policy, chunk_size=3, pause=0.05)
+
+    assert await purger.purge() == 6
+    assert remaining(engine) == kept_ids
+    # Two full chunks, then one that finds nothing left and ends the pass
+    assert [deleted for _, _, deleted in recording.chunks] == [3, 3, 0]
+    after_ids = [after_id for _, after_id, _ in recording.chunks]
+    assert after_ids[0] == 0 and after_ids == sorted(set(after_ids))
+    # The pause separates chunks; none follows the last one
+    finished = [at for at, _, _ in recording.chunks]
+    assert all(later - earlier >= 0.05 for earlier, later in zip(finished, finished[1:]))
+    assert purger.deleted_total == 6
+
+    # A second pass has nothing to do
+    assert await purger.purge() == 0
+    assert remaining(engine) == kept_ids
+    assert [deleted for _, _, deleted in recording.chunks[3:]] == [0]
+
+
+@pytest.mark.anyio
+async def test_purge_stops_after_a_partial_chunk(service, engine, logger):
+    await seed(service, engine, [("push", "delivered", 40)] * 5)
+    recording = RecordingService(service)
+    purger = RetentionPurger(recording, logger, RetentionPolicy({"*/delivered": 30}), chunk_size=3, pause=0)
+
+    assert await purger.purge() == 5
+    assert [deleted for _, _, deleted in recording.chunks] == [3, 2]
+    assert remaining(engine) == set()
+
+
+@pytest.mark.anyio
+async def test_empty_policy_never_touches_the_database(logger):
+    recording = RecordingService(None)
+    assert await RetentionPurger(recording, logger, RetentionPolicy({})).purge() == 0
+    assert recording.chunks == []
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import Column, DateTime, Enum, Integer, MetaData, String, Table, Text, inspect, insert
+from sqlalchemy.exc import IntegrityError
+
+from app.services.orm_models import NotificationORM, NotificationStatus, NotificationType
+from app.utils.schema import SCHEMA_VERSION, add_column, create_index, read_schema_version, upgrade_schema
+
+# The notifications table as the service first created it, before any schema changes
+baseline = MetaData()
+Table(
+    "notifications",
+    baseline,
+    Column("notification_id", Integer, primary_key=True, autoincrement=True),
+    Column("subscription_id", Integer, nullable=False, index=True),
+    Column("user_id", String(36), nullable=False, index=True),
+    Column("notification_type", Enum(NotificationType), nullable=False),
+    Column("subject", String(255)),
+    Column("message", Text),
+    Column("status", Enum(NotificationStatus), index=True),
+    Column("recipient_email", String(255)),
+    Column("device_token", String(500)),
+    Column("read_at", DateTime),
+    Column("delivered_at", DateTime),
+    Column("created_at", DateTime),
+    Column("updated_at", DateTime),
+)
+
+
+def snapshot(engine):
+    inspector = inspect(engine)
+    return {
+        table: {
+            "columns": {c["name"]: (str(c["type"]), c["nullable"]) for c in inspector.get_columns(table)},
+            "indexes": {i["name"]: (tuple(i["column_names"]), bool(i["unique"])) for i in inspector.get_indexes(table)},
+            "unique": sorted(tuple(u["column_names"]) for u in inspector.get_unique_constraints(table)),
+        }
+        for table in inspector.get_table_names()
+    }
+
+
+def upgrade(engine):
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+
+
+def test_upgrade_from_baseline_matches_a_fresh_database(make_engine):
+    fresh = make_engine("fresh.db", schema=False)
+    upgrade(fresh)
+    old = make_engine("old.db", schema=False)
+    baseline.create_all(old)
+
+    upgrade(old)
+
+    assert snapshot(old) == snapshot(fresh)
+    with old.connect() as conn:
+        assert read_schema_version(conn) == SCHEMA_VERSION
+
+
+def test_upgrade_that_failed_partway_is_completed(make_engine):
+    fresh = make_engine("fresh.db", schema=False)
+    upgrade(fresh)
+    old = make_engine("old.db", schema=False)
+    baseline.create_all(old)
+    # Like MySQL, where each ALTER TABLE commits before the next statement fails
+    with old.begin() as conn:
+        for column in list(NotificationORM.__table__.columns)[:-4]:
+            add_column(conn, column)
+        create_index(conn, next(i for i in NotificationORM.__table__.indexes if i.name == "ix_notifications_user_created"))
+
+    upgrade(old)
+
+    assert snapshot(old) == snapshot(fresh)
+
+
+def test_upgraded_database_rejects_duplicate_dedup_keys(make_engine):
+    old = make_engine("old.db", schema=False)
+    baseline.create_all(old)
+    upgrade(old)
+    row = {
+        "subscription_id": 1, "user_id": "user-1", "notification_type": NotificationType.push,
+        "status": NotificationStatus.sent, "dedup_key": "due:1:2024-01-15",
+    }
+    with old.begin() as conn:
+        conn.execute(insert(NotificationORM), row)
+    with pytest.raises(IntegrityError), old.begin() as conn:
+        conn.execute(insert(NotificationORM), row)
+
+
+def test_upgrade_is_idempotent(make_engine):
+    engine = make_engine("db.db", schema=False)
+    upgrade(engine)
+    before = snapshot(engine)
+    upgrade(engine)
+    assert snapshot(engine) == before
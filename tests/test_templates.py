@@ -0,0 +1,104 @@
+import httpx
+import pytest
+from fastapi import FastAPI
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from app.models.notification import NotificationRequest
+from app.resources.notifications import router as notifications_router
+from app.services.async_notification_service import ThreadedNotificationService
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM
+from app.services.templates import DEFAULT_TEMPLATES, TemplateRegistry
+
+PARAMS = {"user_name": "Ada", "subscription_plan": "Netflix Premium", "billing_date": "2024-01-15", "price": 22.99}
+
+
+def templated(params=PARAMS, template_id="payment_due"):
+    return NotificationRequest(
+        user_id="user-1", subscription_id=1, subject="Upcoming Payment", template_id=template_id, template_params=params
+    )
+
+
+def test_validate_rejects_unknown_templates_and_missing_fields():
+    registry = TemplateRegistry()
+    registry.validate("payment_due", PARAMS)
+    # Keys the template doesn't use are allowed
+    registry.validate("payment_due", {**PARAMS, "currency": "USD"})
+
+    with pytest.raises(ValueError, match="Unknown template 'renewal'"):
+        registry.validate("renewal", PARAMS)
+    with pytest.raises(ValueError, match="needs billing_date, price$"):
+        registry.validate("payment_due", {"user_name": "Ada", "subscription_plan": "Netflix Premium"})
+    with pytest.raises(ValueError, match="needs billing_date, price, subscription_plan, user_name"):
+        registry.validate("payment_due", None)
+
+
+def test_pack_and_message_round_trip():
+    registry = TemplateRegistry()
+    packed = registry.pack("payment_due", {**PARAMS, "currency": "USD"})
+
+    # Values only, in the template's field order; the unused key is gone
+    assert packed == '["2024-01-15",22.99,"Netflix Premium","Ada"]'
+    assert registry.message("payment_due", packed, None) == DEFAULT_TEMPLATES["payment_due"].format(**PARAMS)
+    # Untemplated rows keep their own text
+    assert registry.message(None, None, "Due today.") == "Due today."
+
+
+def test_rendered_bodies_are_memoized():
+    registry = TemplateRegistry({"greeting": "Hi {name}"}, cache_size=1)
+    packed = registry.pack("greeting", {"name": "Ada"})
+    for _ in range(3):
+        assert registry.message("greeting", packed, None) == "Hi Ada"
+    registry.message("greeting", registry.pack("greeting", {"name": "Grace"}), None)
+
+    assert registry.stats() == {"templates": 1, "rendered": 1, "hits": 2, "misses": 2, "unknown": 0}
+
+
+def test_row_whose_template_is_gone_reads_with_no_message(session_factory, logger, engine):
+    notification_id, _ = NotificationService(session_factory, logger).create_notification(templated())
+    with engine.connect() as conn:
+        stored = conn.execute(
+            select(NotificationORM.message, NotificationORM.template_id, NotificationORM.template_params)
+        ).one()
+    # The rendered text is never stored
+    assert stored == (None, "payment_due", '["2024-01-15",22.99,"Netflix Premium","Ada"]')
+
+    # A later build that no longer registers payment_due
+    registry = TemplateRegistry({})
+    service = NotificationService(session_factory, logger, templates=registry)
+    (notification,) = service.get_user_notifications("user-1")
+    assert (notification.id, notification.subject, notification.message) == (notification_id, "Upcoming Payment", None)
+    assert registry.stats()["unknown"] == 1
+
+
+@pytest.mark.parametrize("fields", [
+    {"body": "Due today.", "template_id": "payment_due", "template_params": PARAMS},
+    {},
+    {"template_params": PARAMS},
+])
+def test_request_needs_exactly_one_of_body_and_template(fields):
+    with pytest.raises(ValidationError, match="Exactly one of body and template_id is required"):
+        NotificationRequest(user_id="user-1", subscription_id=1, subject="Upcoming Payment", **fields)
+
+
+@pytest.mark.anyio
+async def test_create_rejects_invalid_templates_with_400(session_factory, logger):
+    app = FastAPI()
+    app.include_router(notifications_router)
+    app.state.notification_service = ThreadedNotificationService(NotificationService(session_factory, logger))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as http:
+        response = await http.post("/notifications", json=templated().model_dump(mode="json"))
+        assert response.status_code == 201
+        (notification,) = (await http.get("/notifications", params={"user_id": "user-1"})).json()
+        assert notification["message"] == DEFAULT_TEMPLATES["payment_due"].format(**PARAMS)
+
+        response = await http.post("/notifications", json=templated(template_id="renewal").model_dump(mode="json"))
+        assert (response.status_code, response.json()["detail"]) == (400, "Unknown template 'renewal'")
+
+        response = await http.post(
+            "/notifications/batch",
+            json={"notifications": [templated().model_dump(mode="json"), templated({"user_name": "Ada"}).model_dump(mode="json")]},
+        )
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Item 1: Template 'payment_due' needs billing_date, price, subscription_plan"
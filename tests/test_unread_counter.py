@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert
+
+from app.models.notification import NotificationRequest
+from app.services import unread_counter as unread_counter_module
+from app.services.notification_queries import notification_values, unread_count_query
+from app.services.notification_service import NotificationService
+from app.services.orm_models import NotificationORM, NotificationStatus, NotificationType
+from app.services.templates import TemplateRegistry
+from app.services.unread_counter import UnreadCounterCache
+
+
+def payload(user_id="user-1", subscription_id=1):
+    return NotificationRequest(user_id=user_id, subscription_id=subscription_id, subject="Upcoming Payment", body="Due today.")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stands in for time.monotonic in the unread counter; advance with clock.now += seconds."""
+    fake = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(unread_counter_module, "time", SimpleNamespace(monotonic=lambda: fake.now))
+    return fake
+
+
+@pytest.fixture
+def counter(clock):
+    return UnreadCounterCache(max_users=100, reconcile_seconds=300.0)
+
+
+@pytest.fixture
+def service(session_factory, logger, counter):
+    return NotificationService(session_factory, logger, unread_counter=counter)
+
+
+def db_unread(engine, user_id="user-1"):
+    with engine.connect() as conn:
+        return conn.scalar(unread_count_query(user_id))
+
+
+def assert_served_from_cache(service, counter, engine, user_id="user-1"):
+    hits = counter.hits
+    assert service.get_unread_count(user_id) == db_unread(engine, user_id)
+    assert counter.hits == hits + 1
+
+
+def test_count_follows_every_write_without_rereading(service, counter, engine):
+    service.create_notification(payload())
+    assert service.get_unread_count("user-1") == 1
+    assert counter.misses == 1
+
+    service.create_notifications([payload(), payload(subscription_id=2), payload("user-2")])
+    assert_served_from_cache(service, counter, engine)
+
+    first, second, *_ = [n.id for n in service.get_user_notifications("user-1", limit=10)]
+    service.mark_notification_read(first, "user-1")
+    assert_served_from_cache(service, counter, engine)
+    # Marking it again changes nothing
+    service.mark_notification_read(first, "user-1")
+    assert_served_from_cache(service, counter, engine)
+
+    service.mark_notifications_read("user-1", [first, second])
+    assert_served_from_cache(service, counter, engine)
+
+    service.create_notification(payload(subscription_id=2))
+    service.mark_all_read("user-1")
+    assert_served_from_cache(service, counter, engine)
+    assert db_unread(engine) == 0
+
+    service.create_notification(payload(subscription_id=2))
+    assert_served_from_cache(service, counter, engine)
+    assert db_unread(engine) == 1
+
+
+def test_delete_invalidates_and_the_next_read_refills(service, counter, engine):
+    service.create_notifications([payload(), payload(), payload(subscription_id=2), payload("user-2", 2)])
+    assert service.get_unread_count("user-1") == 3
+
+    assert service.delete_notifications_by_subscription_id(1, chunk_size=1) == 2
+
+    misses = counter.misses
+    assert service.get_unread_count("user-1") == db_unread(engine) == 1
+    assert counter.misses == misses + 1
+    assert_served_from_cache(service, counter, engine)
+    assert service.get_unread_count("user-2") == db_unread(engine, "user-2") == 1
+
+
+def test_purge_invalidates_the_count(service, counter, engine):
+    service.create_notifications([payload(), payload()])
+    assert service.get_unread_count("user-1") == 2
+
+    cutoffs = [(NotificationType.push, NotificationStatus.sent, datetime.utcnow() + timedelta(days=1))]
+    deleted, _ = service.purge_expired_chunk(cutoffs)
+
+    assert deleted == 2
+    assert service.get_unread_count("user-1") == db_unread(engine) == 0
+
+
+def test_write_the_cache_did_not_see_is_reconciled(service, counter, clock, engine):
+    service.create_notification(payload())
+    assert service.get_unread_count("user-1") == 1
+
+    # Another process (or a manual fix) writes straight to the table
+    with engine.begin() as conn:
+        conn.execute(insert(NotificationORM), [notification_values(payload(), datetime.utcnow(), TemplateRegistry())])
+    assert service.get_unread_count("user-1") == 1
+
+    clock.now += 301
+    assert service.get_unread_count("user-1") == db_unread(engine) == 2
+    assert_served_from_cache(service, counter, engine)
+
+
+def test_fill_overlapping_a_write_is_not_stored(counter):
+    ticket = counter.begin_fill("user-1")
+    with counter.writing("user-1") as change:
+        change.delta = 1
+    # The count was read before the write committed; storing it would lose the write
+    counter.end_fill(ticket, 0)
+    assert counter.get("user-1") is None
+
+    ticket = counter.begin_fill("user-1")
+    counter.end_fill(ticket, 1)
+    assert counter.get("user-1") == 1
+
+
+def test_remote_invalidation_taints_fills_in_flight(counter):
+    counter.end_fill(counter.begin_fill("user-1"), 4)
+    ticket = counter.begin_fill("user-2")
+
+    counter.invalidate_all()
+    counter.end_fill(ticket, 2)
+
+    assert counter.get("user-1") is None
+    assert counter.get("user-2") is None